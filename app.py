@@ -1,96 +1,175 @@
-import asyncio
-import queue
-import threading
-from datetime import datetime, timezone, timedelta
+import argparse
+import hashlib
+import json
+import os
+import time
 
-from flask import Flask, flash, redirect, render_template, request, url_for
-from flask_apscheduler import APScheduler
+from flask import Flask, Response, flash, jsonify, make_response, redirect, render_template, request, session, url_for
 
 import database as db
-
-# Assuming news_agent_client.py exists and contains mcprun function
-# If not, you might need to mock this or provide the actual implementation.
-from news_agent_client import mcprun 
+import metrics
+import response_cache
+from report_render import html_etag, render_report
+from settings import config
 
 import sqlite3
 
-# --- Configuration ---
-task_queue = queue.Queue() # The queue for agent tasks
-
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'agent_news' # Change for production, use a strong, random key
 
-# --- Scheduler Setup ---
-scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
+# Importing this module only sets up the web app. The scheduler and the worker pool are started by main()
+# (python app.py runs all three roles in one process), or run on their own: report_scheduler.py, worker.py.
+# Make sure the tables exist, also when the web app is served by a WSGI server
+db.init_db()
+
+# Set by main() when this process also runs the scheduler / the workers
+report_scheduler = None
+worker_pool = None
+
+# --- Metrics ---
+JOBS = metrics.REGISTRY.gauge('news_jobs', 'Jobs in the queue by status; status="runnable" is the current queue depth.', ('status',))
+
+def collect_job_counts():
+    counts = db.get_job_counts()
+    for status in ('queued', 'running', 'done', 'failed', 'runnable'):
+        JOBS.set(counts.get(status, 0), status=status)
+
+metrics.REGISTRY.add_collector(collect_job_counts)
+
+# --- Live report progress ---
+REPORT_EVENTS_MAX_SECONDS = 300 # An event stream is closed (and reopened by the browser) after this long
+
+def news_source_targets(sub):
+    """The news sources of a subscription in the format the get_news_links tool expects."""
+    return [{"url": source['url'], "fetch_mode": source['fetch_mode']} for source in sub['news_sources']]
+
+
+# --- HTTP caching ---
+STATIC_MAX_AGE = 365 * 86400 # Fingerprinted static URLs change whenever the file does
+REPORT_MAX_AGE = 86400       # Completed reports never change; only a new page layout would reach browsers late
+
+def _code_version():
+    """Hash of the templates and static files, the same in every web process running the same code."""
+    digest = hashlib.sha1()
+    for folder in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+        for directory, _, files in sorted(os.walk(folder)):
+            for name in sorted(files):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(name.encode('utf-8') + f.read())
+    return digest.hexdigest()[:8]
+
+# Part of the page ETags, so a deploy with changed templates never answers 304 for a page rendered by the old code
+PAGE_ETAG_SALT = _code_version()
+
+# Rendered pages and compressed bodies by ETag (see cache_and_compress)
+page_cache = response_cache.ResponseCache(config['response_cache_max_entries'])
+_static_versions = {} # filename -> (mtime, content hash)
+
+def static_version(filename):
+    """Content hash of a static file, for cache-busting URLs; None if there is no such file."""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _static_versions.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = _static_versions[filename] = (mtime, hashlib.sha1(f.read()).hexdigest()[:10])
+    return cached[1]
 
-# --- Background Worker ---
-def agent_worker():
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """url_for('static', filename=...) adds ?v=<content hash>, so static files can be cached for a year."""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_version(values['filename'])
+        if version:
+            values['v'] = version
+
+def etag_matches(etag):
+    """True if the browser already has `etag`, as sent or as compressed by cache_and_compress."""
+    return any(request.if_none_match.contains(tag) for tag in (etag, f'{etag}-gzip', f'{etag}-br'))
+
+def not_modified(etag, cache_control):
+    response = Response(status=304)
+    # Send back the variant the browser has
+    response.set_etag(next(tag for tag in (etag, f'{etag}-gzip', f'{etag}-br') if request.if_none_match.contains(tag)))
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def cache_and_compress(response):
     """
-    Processes tasks from the queue one by one.
-    This runs in a separate thread to avoid blocking the Flask main thread.
+    Long-lived caching for fingerprinted static files, and gzip/brotli for text responses.
+    Bodies with a strong ETag are compressed once and kept in page_cache; the compressed variant gets
+    its own ETag (<etag>-gzip / <etag>-br), and a revalidation of it is answered with 304.
     """
-    print("Agent worker thread started.")
-    while True:
-        # Get task from the queue: report_id, prompt, news_urls
-        report_id, prompt, news_urls = task_queue.get() 
-        print(f"Worker picked up task for report ID: {report_id}")
-        try:
-            # Update status to 'running' in the database
-            db.update_report(report_id, 'running')
-            
-            # Run the asynchronous agent function (mcprun)
-            # asyncio.run is used here because mcprun is an async function
-            response = asyncio.run(mcprun(prompt, news_urls)) 
-            
-            # Update status to 'completed' with the generated content
-            db.update_report(report_id, 'completed', response)
-            print(f"Task for report ID: {report_id} completed successfully.")
-            
-        except Exception as e:
-            # If an error occurs, update the report status to 'failed'
-            error_message = f"Agent execution failed for report ID {report_id}: {str(e)}"
-            print(error_message)
-            db.update_report(report_id, 'failed', error_message)
-        finally:
-            # Mark the task as done in the queue
-            task_queue.task_done()
-
-# Start the worker in a separate thread, making it a daemon thread
-# so it exits when the main program exits.
-worker_thread = threading.Thread(target=agent_worker, daemon=True)
-worker_thread.start()
-
-
-# --- Scheduled Job ---
-@scheduler.task('cron', id='daily_news_job', minute='*') # This job runs every minute
-def schedule_daily_tasks():
+    if request.endpoint == 'static' and request.args.get('v'):
+        response.cache_control.no_cache = None # Flask's default for static files
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    if (response.status_code != 200 or response.mimetype not in response_cache.COMPRESSIBLE_TYPES
+            or response.is_streamed and not response.direct_passthrough # Server-sent events and other streams
+            or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = response_cache.best_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    etag, weak = response.get_etag()
+    strong = etag is not None and not weak
+    if strong and request.if_none_match.contains(f'{etag}-{encoding}'):
+        return not_modified(etag, response.headers.get('Cache-Control', 'no-cache'))
+
+    body = page_cache.get(etag, encoding) if strong else None
+    if body is None:
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < response_cache.MIN_COMPRESS_BYTES:
+            return response
+        body = response_cache.compress(data, encoding)
+        if strong:
+            page_cache.put(etag, encoding, body)
+    else:
+        response.close() # Releases a static file that was opened but is not read
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+# --- Dashboard ---
+# (version, JSON body, ETag) of the last dashboard served by this process
+_dashboard_json = (None, None, None)
+
+def dashboard_json():
     """
-    Checks every minute if any subscription's scheduled time has arrived.
-    Only schedules tasks for active (non-deleted) subscriptions.
+    The dashboard as a JSON body and its ETag, serialized once per dashboard version (see db.get_dashboard).
+    The ETag is a hash of the body, so every web process hands out the same ETag for the same data.
     """
-    with app.app_context(): # APScheduler jobs run outside the request context, so we need this.
-        now_time = datetime.now().strftime('%H:%M')
-        print(f"Scheduler checking for tasks at {now_time}...")
-        
-        # Get all active subscriptions (the database function now filters out deleted ones)
-        subscriptions = db.get_all_subscriptions_with_status()
-        
-        for sub in subscriptions:
-            # Check if the current time matches the subscription's schedule time
-            # The 'deleted_at' check is implicitly handled by get_all_subscriptions_with_status
-            if sub['schedule_time'] == now_time:
-                print(f"Scheduling task for subscription: {sub['name']}")
-                
-                # Get news URLs associated with this subscription
-                news_urls = [source['url'] for source in sub['news_sources']]
-                
-                # Create a new report entry in the database with 'queued' status
-                report_id = db.create_report_entry(sub['id'])
-                
-                # Add the task to the queue for the worker thread to process
-                task_queue.put((report_id, sub['prompt'], news_urls))
+    global _dashboard_json
+    version, subscriptions, news_sources = db.get_dashboard()
+    if _dashboard_json[0] != version:
+        body = json.dumps({
+            "version": version,
+            "subscriptions": [{
+                "id": sub['id'],
+                "name": sub['name'],
+                "prompt": sub['prompt'],
+                "schedule_time": sub['schedule_time'],
+                "news_sources": [{"id": source['id'], "name": source['name']} for source in sub['news_sources']],
+                "report_id": sub['report_id'],
+                "status": sub['status'],
+                "created_at": sub['created_at'].strftime('%Y-%m-%d %H:%M') if sub['created_at'] else None,
+            } for sub in subscriptions],
+            "news_sources": [{key: source[key] for key in ('id', 'name', 'url', 'fetch_mode')} for source in news_sources],
+        }, ensure_ascii=False)
+        _dashboard_json = (version, body, hashlib.sha1(body.encode('utf-8')).hexdigest()[:20])
+    return _dashboard_json
 
 
 # --- Flask Routes ---
@@ -99,10 +178,34 @@ def index():
     """
     Main dashboard showing all active subscriptions and their latest status,
     along with available news sources for modal forms.
+    Served from the cached dashboard read model; answers 304 when the browser already has the current page
+    (never while flash messages are waiting, those make the page one of a kind).
     """
-    subscriptions = db.get_all_subscriptions_with_status()
-    news_sources = db.get_all_news_sources() 
-    return render_template('index.html', subscriptions=subscriptions, news_sources=news_sources)
+    _, _, etag = dashboard_json()
+    page_etag = f'{etag}-{PAGE_ETAG_SALT}'
+    cacheable = '_flashes' not in session
+    if cacheable and etag_matches(page_etag):
+        return not_modified(page_etag, 'no-cache')
+
+    version, subscriptions, news_sources = db.get_dashboard()
+    response = make_response(render_template('index.html', subscriptions=subscriptions, news_sources=news_sources,
+                                             dashboard_version=version,
+                                             poll_interval=config['dashboard_poll_interval_seconds']))
+    if cacheable:
+        response.set_etag(page_etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    """Dashboard data as JSON. Supports If-None-Match: answers 304 without a body when nothing changed."""
+    _, body, etag = dashboard_json()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/add_subscription', methods=['POST'])
 def add_subscription():
@@ -118,6 +221,10 @@ def add_subscription():
         # Convert selected IDs to integers
         selected_news_source_ids = [int(sid) for sid in selected_news_source_ids]
         db.add_subscription(name, prompt, schedule_time, selected_news_source_ids)
+        # The new subscription may be due before the scheduler's next wake-up. A scheduler in another
+        # process notices it within scheduler_max_sleep_seconds.
+        if report_scheduler is not None:
+            report_scheduler.arm()
         flash(f'订阅计划 "{name}" 添加成功！', 'success')
         
     return redirect(url_for('index'))
@@ -128,12 +235,21 @@ def run_manual(subscription_id):
     sub = db.get_subscription_by_id(subscription_id)
     if sub and sub['deleted_at'] is None: 
 
-        news_urls = [source['url'] for source in sub['news_sources']]
-
-        report_id = db.create_report_entry(sub['id'])
+        news_urls = news_source_targets(sub)
 
-        task_queue.put((report_id, sub['prompt'], news_urls))
-        flash(f'"{sub["name"]}" 已加入队列。', 'info')
+        # Manual runs go ahead of scheduled ones; a subscription already in the queue is not run twice
+        _, result = db.enqueue_report_job(sub['id'], sub['prompt'], news_urls, config['job_max_attempts'],
+                                          db.JOB_PRIORITY_MANUAL, config['job_queue_max_depth'])
+        metrics.JOBS_ENQUEUED.inc(priority='manual', result=result)
+        if result == 'rejected':
+            flash('任务队列已满，请稍后再试。', 'error')
+        elif result == 'merged':
+            flash(f'"{sub["name"]}" 的报告已在队列中或正在生成，不会重复运行。', 'info')
+        else:
+            # Workers in other processes pick the job up on their next poll
+            if worker_pool is not None:
+                worker_pool.notify()
+            flash(f'"{sub["name"]}" 已加入队列。', 'info')
     else:
         flash('订阅计划未找到或已被删除。', 'error')
         
@@ -148,24 +264,142 @@ def delete_subscription(subscription_id):
 
 @app.route('/report/<int:report_id>')
 def view_report(report_id):
-    """Displays the content of a specific report."""
-    report = db.get_report_by_id(report_id)
-    if report:
-        return render_template('report.html', report=report)
-    else:
+    """
+    Displays the content of a specific report.
+    A completed report never changes: its page is built from the HTML rendered when it was completed,
+    kept in page_cache, and served with a strong ETag and a long max-age. A revalidation is answered
+    with 304 from the stored ETag alone, without loading the report.
+    """
+    state = db.get_report_etag(report_id)
+    if state is None:
         flash('报告未找到。', 'error')
         return redirect(url_for('index'))
+    status, content_etag = state
+    cache_control = f'public, max-age={REPORT_MAX_AGE}'
+    if status == 'completed' and content_etag:
+        etag = f'{content_etag}-{PAGE_ETAG_SALT}'
+        if etag_matches(etag):
+            return not_modified(etag, cache_control)
+        body = page_cache.get(etag)
+        if body is not None:
+            return _report_response(body, etag, cache_control)
+
+    report = db.get_report_by_id(report_id)
+    if report['status'] != 'completed':
+        # Queued, running (live progress page) or failed: rendered in the browser, never cached
+        response = make_response(render_template('report.html', report=report, report_html=None))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    report_html = report['content_html']
+    if report_html is None:
+        # Completed before reports were rendered on completion, or archived since
+        report_html = render_report(report['content'])
+        db.save_report_html(report_id, report_html, keep_html=not report['archived'])
+    etag = f'{html_etag(report_html)}-{PAGE_ETAG_SALT}'
+    body = render_template('report.html', report=report, report_html=report_html).encode('utf-8')
+    page_cache.put(etag, None, body)
+    return _report_response(body, etag, cache_control)
+
+def _report_response(body, etag, cache_control):
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/subscription/<int:subscription_id>/reports')
+def report_history(subscription_id):
+    """Past reports of one subscription, newest first, optionally filtered by a full-text search (?q=)."""
+    sub = db.get_subscription_by_id(subscription_id)
+    if not sub:
+        flash('订阅计划未找到。', 'error')
+        return redirect(url_for('index'))
+    query = request.args.get('q', '').strip()
+    before = request.args.get('before', type=int)
+    if query:
+        reports, next_before = db.search_reports(query, subscription_id, before, config['report_history_page_size'])
+    else:
+        reports, next_before = db.get_report_history(subscription_id, before, config['report_history_page_size'])
+    return render_template('history.html', subscription=sub, reports=reports, query=query, next_before=next_before)
+
+@app.route('/reports/search')
+def search_reports():
+    """Full-text search over the reports of all subscriptions (?q=), newest first."""
+    query = request.args.get('q', '').strip()
+    before = request.args.get('before', type=int)
+    reports, next_before = db.search_reports(query, None, before, config['report_history_page_size']) if query else ([], None)
+    return render_template('history.html', subscription=None, reports=reports, query=query, next_before=next_before)
+
+@app.route('/report/<int:report_id>/events')
+def report_events(report_id):
+    """
+    Server-Sent Events stream of a report's progress: an event whenever its stage or streamed
+    content changes, then a 'done' event once it is completed or failed. Long streams end after
+    REPORT_EVENTS_MAX_SECONDS; the browser reconnects and resumes from Last-Event-ID.
+    """
+    last_seq = request.headers.get('Last-Event-ID', type=int)
+    poll_interval = config['report_progress_interval_seconds']
+
+    def stream():
+        nonlocal last_seq
+        yield 'retry: 3000\n\n'
+        started = last_beat = time.monotonic()
+        while time.monotonic() - started < REPORT_EVENTS_MAX_SECONDS:
+            report = db.get_report_progress(report_id)
+            if report is None:
+                yield 'event: done\ndata: {"status": "missing"}\n\n'
+                return
+            finished = report['status'] in ('completed', 'failed')
+            if report['progress_seq'] != last_seq:
+                last_seq = report['progress_seq']
+                data = json.dumps({
+                    "status": report['status'],
+                    "progress": report['progress'],
+                    "content": report['content'] if finished else report['partial_content'],
+                }, ensure_ascii=False)
+                yield f"id: {last_seq}\nevent: progress\ndata: {data}\n\n"
+                last_beat = time.monotonic()
+            elif time.monotonic() - last_beat > 15:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                last_beat = time.monotonic()
+            if finished:
+                yield f"event: done\ndata: {json.dumps({'status': report['status']})}\n\n"
+                return
+            time.sleep(poll_interval)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/report/<int:report_id>/spans')
+def report_spans(report_id):
+    """Timed stages of a report as JSON, with the total time and count per stage."""
+    spans = db.get_report_spans(report_id)
+    summary = {}
+    for span in spans:
+        stage = summary.setdefault(span['stage'], {"count": 0, "seconds": 0.0})
+        stage['count'] += 1
+        stage['seconds'] = round(stage['seconds'] + span['duration_seconds'], 6)
+    return jsonify({"report_id": report_id, "summary": summary, "spans": spans})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: queue depth, worker utilization, stage latencies, token usage."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/add_news_source', methods=['POST'])
 def add_news_source_route():
     """Handles adding a new news source."""
     name = request.form['source_name']
     url = request.form['source_url']
+    fetch_mode = request.form.get('source_fetch_mode', 'auto')
     if not name or not url:
         flash('新闻源名称和URL是必填项！', 'error')
+    elif fetch_mode not in ('auto', 'http', 'browser'):
+        flash('无效的抓取方式。', 'error')
     else:
         try:
-            db.add_news_source(name, url)
+            db.add_news_source(name, url, fetch_mode)
             flash(f'新闻源 "{name}" 添加成功！', 'success')
         except sqlite3.IntegrityError:
             # Handle cases where name or URL already exists (UNIQUE constraint)
@@ -180,8 +414,44 @@ def delete_news_source_route(source_id):
     return redirect(url_for('index'))
 
 
+def main():
+    global report_scheduler, worker_pool
+    parser = argparse.ArgumentParser(description='News agent web app. Runs the web server, the scheduler and the workers.')
+    parser.add_argument('--roles', default='web,scheduler,worker',
+                        help='comma-separated roles to run in this process (default: all of web,scheduler,worker)')
+    parser.add_argument('--port', type=int, default=9039)
+    args = parser.parse_args()
+    roles = {role.strip() for role in args.roles.split(',') if role.strip()}
+    unknown = roles - {'web', 'scheduler', 'worker'}
+    if unknown or not roles:
+        parser.error(f"unknown roles: {', '.join(sorted(unknown))}" if unknown else 'no roles given')
+
+    # Imported here, so a web-only process never loads the agent (LLM client, MCP session) it doesn't use
+    if 'worker' in roles:
+        from worker import create_worker_pool
+        # The pool runs on a daemon thread; without the web role, the sleep loop below keeps the process alive
+        worker_pool = create_worker_pool()
+        worker_pool.start()
+    if 'scheduler' in roles:
+        from report_scheduler import ReportScheduler
+        report_scheduler = ReportScheduler(config['scheduler_lease_seconds'],
+                                           worker_pool.jobs_enqueued if worker_pool is not None else None)
+        report_scheduler.start()
+
+    try:
+        if 'web' in roles:
+            # use_reloader=False: the reloader would start a second process that runs the scheduler and worker
+            # roles again. Run the roles as separate processes instead (python report_scheduler.py / worker.py).
+            app.run('0.0.0.0', debug=True, use_reloader=False, port=args.port)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if report_scheduler is not None:
+            report_scheduler.shutdown()
+
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.init_db() # Ensure database is ready before running the app
-    # use_reloader=False is important for APScheduler to prevent jobs from running twice
-    app.run('0.0.0.0',debug=True, use_reloader=False, port=9039) 
+    main()
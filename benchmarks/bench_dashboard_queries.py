@@ -0,0 +1,118 @@
+"""
+Benchmark for the dashboard/scheduler read path (database.get_all_subscriptions_with_status).
+
+Builds a throwaway database with N subscriptions and M reports, then times the current
+implementation against the previous 1+N query version.
+
+    python benchmarks/bench_dashboard_queries.py --subscriptions 1000 --reports 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+
+def legacy_get_all_subscriptions_with_status():
+    """The previous implementation: MAX(created_at) over the whole history, then one query per subscription."""
+    conn = db.get_db()
+    rows = conn.execute('''
+        SELECT s.id, s.name, s.prompt, s.schedule_time, r.id as report_id, r.status, r.created_at, s.deleted_at
+        FROM subscriptions s
+        LEFT JOIN (
+            SELECT subscription_id, MAX(created_at) as max_created_at
+            FROM reports
+            GROUP BY subscription_id
+        ) latest_report ON s.id = latest_report.subscription_id
+        LEFT JOIN reports r ON s.id = r.subscription_id AND r.created_at = latest_report.max_created_at
+        WHERE s.deleted_at IS NULL
+        ORDER BY s.created_at DESC
+    ''').fetchall()
+    conn.close()
+    subscriptions = []
+    for row in rows:
+        sub = dict(row)
+        sub['news_sources'] = db.get_news_sources_for_subscription(sub['id'])
+        subscriptions.append(sub)
+    return subscriptions
+
+
+def populate(n_subscriptions, n_reports, n_sources, sources_per_subscription):
+    with db.transaction() as conn:
+        _populate(conn, n_subscriptions, n_reports, n_sources, sources_per_subscription)
+    with db.connection() as conn:
+        conn.execute('ANALYZE')
+
+
+def _populate(conn, n_subscriptions, n_reports, n_sources, sources_per_subscription):
+    conn.executemany('INSERT INTO news_sources (name, url) VALUES (?, ?)',
+                     [(f'source {i}', f'https://news{i}.example.com/') for i in range(n_sources)])
+    conn.executemany('INSERT INTO subscriptions (name, prompt, schedule_time) VALUES (?, ?, ?)',
+                     [(f'sub {i}', 'AI', f'{i % 24:02d}:{i % 60:02d}') for i in range(n_subscriptions)])
+    conn.executemany('INSERT INTO subscription_news_sources (subscription_id, news_source_id) VALUES (?, ?)',
+                     [(sub_id, source_id)
+                      for sub_id in range(1, n_subscriptions + 1)
+                      for source_id in random.sample(range(1, n_sources + 1), sources_per_subscription)])
+
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(n_reports):
+        created_at = (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+        batch.append((random.randint(1, n_subscriptions), 'x' * 200, 'completed', created_at))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO reports (subscription_id, content, status, created_at) VALUES (?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO reports (subscription_id, content, status, created_at) VALUES (?, ?, ?, ?)', batch)
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<10} runs={len(samples):<4} median={statistics.median(samples):9.2f} ms  p95={p95:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscriptions', type=int, default=1000)
+    parser.add_argument('--reports', type=int, default=1000000)
+    parser.add_argument('--sources', type=int, default=50)
+    parser.add_argument('--sources-per-subscription', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--legacy-repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE = os.path.join(tmp, 'bench.db')
+        db.init_db()
+        t0 = time.perf_counter()
+        populate(args.subscriptions, args.reports, args.sources, args.sources_per_subscription)
+        print(f"Populated {args.subscriptions} subscriptions / {args.reports} reports "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+        current = db.get_all_subscriptions_with_status()
+        legacy = legacy_get_all_subscriptions_with_status()
+        assert [s['id'] for s in current] == [s['id'] for s in legacy]
+
+        report('current', timed(db.get_all_subscriptions_with_status, args.repeat))
+        report('legacy', timed(legacy_get_all_subscriptions_with_status, args.legacy_repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Offline end-to-end benchmark of the report pipeline: scheduler -> job queue -> workers -> agent -> MCP.
+
+Starts the stand-in LLM and news MCP services from fake_services.py as subprocesses, points a
+throwaway config and database at them, creates N subscriptions over M news sources that are all
+due now, and runs the scheduled path (ReportScheduler, the worker pool, mcprun) until every report
+is finished. Needs no network access.
+
+    python benchmarks/bench_pipeline.py --subscriptions 50 --sources 10 --workers 8 --llm-latency 0.5
+
+With --worker-processes P the reports are generated by P separate worker.py processes (each with
+--workers concurrent agents) instead of a pool in this process, as in a multi-node deployment.
+Database time is then only measured for the scheduler.
+"""
+import argparse
+import functools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Database functions on the pipeline path; their wall time is summed as "DB time"
+DB_FUNCTIONS = ('enqueue_due_subscriptions', 'claim_job', 'renew_job_lease', 'update_report_progress',
+                'complete_job', 'fail_job', 'save_report_spans')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Service on port {port} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Service on port {port} did not start within {timeout}s")
+
+
+def start_worker_process(timeout=60):
+    """Starts worker.py on the benchmark's config and database, and waits until its pool is running."""
+    process = subprocess.Popen([sys.executable, '-u', os.path.join(ROOT, 'worker.py')], cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    ready = threading.Event()
+
+    def drain():
+        # Keep reading, so a chatty worker never blocks on a full pipe
+        for line in process.stdout:
+            if 'Agent worker pool' in line:
+                ready.set()
+
+    threading.Thread(target=drain, daemon=True).start()
+    if not ready.wait(timeout):
+        process.kill()
+        raise RuntimeError(f"worker.py did not start within {timeout}s")
+    return process
+
+
+def start_service(args):
+    script = os.path.join(ROOT, 'benchmarks', 'fake_services.py')
+    return subprocess.Popen([sys.executable, script] + [str(arg) for arg in args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class DbTimer:
+    """Wraps database functions to add up the time spent in them, from any thread."""
+
+    def __init__(self, db):
+        self.seconds = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        for name in DB_FUNCTIONS:
+            setattr(db, name, self._wrap(name, getattr(db, name)))
+
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+                    self.calls[name] = self.calls.get(name, 0) + 1
+        return timed
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscriptions', type=int, default=50)
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--sources-per-subscription', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=8, help='worker_concurrency')
+    parser.add_argument('--worker-processes', type=int, default=0,
+                        help='run the workers in this many worker.py processes (0 = a pool in this process)')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='seconds before each LLM response starts')
+    parser.add_argument('--tokens-per-second', type=float, default=200, help='LLM completion token rate')
+    parser.add_argument('--articles', type=int, default=5, help='articles the scripted agent reads per report')
+    parser.add_argument('--fetch-latency', type=float, default=0.2, help='seconds per simulated page load')
+    parser.add_argument('--timeout', type=float, default=600, help='give up after this many seconds')
+    args = parser.parse_args()
+
+    llm_port, mcp_port = free_port(), free_port()
+    services = [
+        start_service(['llm', '--port', llm_port, '--latency', args.llm_latency,
+                       '--tokens-per-second', args.tokens_per_second, '--articles', args.articles]),
+        start_service(['mcp', '--port', mcp_port, '--fetch-latency', args.fetch_latency]),
+    ]
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        wait_for_port(llm_port, services[0])
+        wait_for_port(mcp_port, services[1])
+
+        config_path = os.path.join(tmp.name, 'config.json')
+        with open(config_path, 'w', encoding='utf-8') as config_file:
+            json.dump({
+                "base_url": f"http://127.0.0.1:{llm_port}/v1",
+                "api_key": "benchmark",
+                "llm_model_name": "fake-news-agent",
+                "mcp_url": f"http://127.0.0.1:{mcp_port}/mcp",
+                "worker_concurrency": args.workers,
+                "job_poll_interval_seconds": 0.5,
+                "summary_cache_path": os.path.join(tmp.name, 'summary_cache.db'),
+            }, config_file)
+        os.environ['NEWS_AGENT_CONFIG'] = config_path
+
+        import database as db
+        db.DATABASE = os.environ['NEWS_AGENT_DB'] = os.path.join(tmp.name, 'bench.db')
+        timer = DbTimer(db)
+        db.init_db()
+        from report_scheduler import ReportScheduler
+        from settings import config
+
+        worker_pool = None
+        if args.worker_processes:
+            for _ in range(args.worker_processes):
+                services.append(start_worker_process())
+        else:
+            from worker import create_worker_pool
+            worker_pool = create_worker_pool()
+            worker_pool.start()
+
+        for i in range(args.sources):
+            db.add_news_source(f'source {i}', f'http://news{i}.bench.local/')
+        with db.connection() as conn:
+            source_ids = [row['id'] for row in conn.execute('SELECT id FROM news_sources ORDER BY id')]
+        for i in range(args.subscriptions):
+            picked = [source_ids[(i + k) % len(source_ids)] for k in range(args.sources_per_subscription)]
+            db.add_subscription(f'bench {i}', 'AI 大模型 芯片', '08:00', picked)
+        # Everything is due right now
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with db.transaction() as conn:
+            conn.execute('UPDATE subscriptions SET next_run_at = ?', (now,))
+
+        processes = f" in each of {args.worker_processes} processes" if args.worker_processes else ''
+        print(f"Running {args.subscriptions} reports over {args.sources} sources with {args.workers} workers{processes} "
+              f"(LLM latency {args.llm_latency}s, page latency {args.fetch_latency}s)...")
+        started = time.perf_counter()
+        # Takes the scheduler lease, then enqueues everything that is due right away
+        report_scheduler = ReportScheduler(config['scheduler_lease_seconds'],
+                                           worker_pool.jobs_enqueued if worker_pool is not None else None)
+        report_scheduler.start()
+        while True:
+            counts = db.get_job_counts()
+            finished = counts.get('done', 0) + counts.get('failed', 0)
+            if finished >= args.subscriptions:
+                break
+            if time.perf_counter() - started > args.timeout:
+                print(f"Timed out with {finished}/{args.subscriptions} reports finished.")
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        report_scheduler.shutdown()
+
+        latencies, tokens = [], 0
+        with db.connection() as conn:
+            report_ids = [row['id'] for row in conn.execute('SELECT id FROM reports')]
+        for report_id in report_ids:
+            spans = db.get_report_spans(report_id)
+            # Latency: from the moment the report became runnable until its last attempt finished
+            queued = [s for s in spans if s['stage'] == 'queue_wait']
+            jobs = [s for s in spans if s['stage'] == 'job']
+            if queued and jobs:
+                latencies.append(jobs[-1]['started_at'] + jobs[-1]['duration_seconds'] - queued[0]['started_at'])
+            tokens += sum(s['attrs'].get('prompt_tokens', 0) + s['attrs'].get('completion_tokens', 0)
+                          for s in spans if s['stage'] == 'llm_request')
+
+        print(f"finished   {finished}/{args.subscriptions} reports ({counts.get('failed', 0)} failed) in {elapsed:.1f}s")
+        print(f"throughput {finished / elapsed * 60:.1f} reports/min")
+        if latencies:
+            print(f"latency    p50={statistics.median(latencies):.2f}s  p95={percentile(latencies, 0.95):.2f}s  "
+                  f"max={max(latencies):.2f}s")
+        if finished:
+            print(f"tokens     {tokens / finished:.0f} per report")
+        total_db = sum(timer.seconds.values())
+        print(f"DB time    {total_db:.2f}s total, {total_db / max(finished, 1) * 1000:.1f} ms per report")
+        for name in DB_FUNCTIONS:
+            if timer.calls.get(name):
+                print(f"  {name:<26} calls={timer.calls[name]:<6} {timer.seconds[name] * 1000:9.1f} ms")
+    finally:
+        for service in services:
+            service.terminate()
+        for service in services:
+            service.wait()
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
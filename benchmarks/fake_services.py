@@ -0,0 +1,263 @@
+"""
+Stand-in services for offline benchmarks, so the pipeline can be measured without an LLM API or a browser.
+
+    python benchmarks/fake_services.py llm --port 18001 --latency 0.5 --tokens-per-second 200
+    python benchmarks/fake_services.py mcp --port 18002 --fetch-latency 0.2
+
+llm: an OpenAI-compatible /v1/chat/completions endpoint (plain and streaming) that plays a scripted
+news agent: it asks for the news links if they are not in the user message, reads a few articles with
+get_news_digest (or get_news_content when digests are turned off), then writes a Markdown report.
+Requests without tools are article summarization requests and get a short digest. Each response waits `latency` seconds, plus the
+time it takes to "generate" its completion tokens at `tokens-per-second`.
+
+mcp: a FastMCP server with the same tools as news_browser.py. Instead of loading real pages it builds
+synthetic news portals and articles per URL, and runs them through the same parser, link ranking and
+content extraction code as the real service.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import link_ranker
+from content_extractor import extract_article, format_article
+from http_fetcher import PageParser
+
+_URL = re.compile(r'https?://[^\s"\'\\\]\),，]+')
+
+TOPICS = ['人工智能', '大模型', '芯片', '新能源汽车', '机器人', '云计算', '半导体', '自动驾驶', '开源', '融资']
+
+
+# --- Fake LLM ---
+
+def _tool_call_names(messages):
+    """tool_call_id -> tool name, from the assistant messages so far."""
+    names = {}
+    for message in messages:
+        for call in message.get('tool_calls') or []:
+            names[call['id']] = call['function']['name']
+    return names
+
+
+def _message_text(message):
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        content = ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content
+
+
+def script_response(messages, articles, report_chars, tools=()):
+    """
+    The next step of the scripted agent: ('tool_calls', [(name, arguments), ...]) or ('text', report).
+    `tools` are the names of the tools offered in the request.
+    """
+    if not tools:
+        return 'text', build_digest(messages)
+    read_tool = 'get_news_digest' if 'get_news_digest' in tools else 'get_news_content'
+    last = messages[-1]
+    if last['role'] == 'tool':
+        names = _tool_call_names(messages)
+        tool = names.get(last.get('tool_call_id'))
+        if tool == 'get_news_links':
+            urls = [url for url in _URL.findall(_message_text(last)) if '/article/' in url]
+            return 'tool_calls', [(read_tool, {'url': url}) for url in urls[:articles]]
+        return 'text', build_report(messages, report_chars)
+
+    text = _message_text(last)
+    urls = _URL.findall(text)
+    article_urls = [url for url in urls if '/article/' in url]
+    if article_urls:
+        # Links were harvested before the run: read a few articles, spread over the sources
+        by_host = {}
+        for url in article_urls:
+            by_host.setdefault(url.split('/')[2], []).append(url)
+        picked = []
+        while len(picked) < articles and any(by_host.values()):
+            for urls_of_host in by_host.values():
+                if urls_of_host and len(picked) < articles:
+                    picked.append(urls_of_host.pop(0))
+        return 'tool_calls', [(read_tool, {'url': url}) for url in picked]
+    sources = [{"url": url} for url in dict.fromkeys(urls)]
+    keywords = text.split('\n')[0]
+    return 'tool_calls', [('get_news_links', {'urls': sources, 'keywords': keywords})]
+
+
+def build_report(messages, report_chars):
+    titles = re.findall(r'标题：(.+)', '\n'.join(_message_text(m) for m in messages if m['role'] == 'tool'))
+    lines = ['您好，今天是每日AI报：', '## 头条新闻']
+    for title in titles or ['今日暂无新闻']:
+        lines += [f'### {title}', '', '新闻简介', '这是一段根据文章内容生成的简介。' * 3, '', '---']
+    lines.append('## 今日总结')
+    report = '\n'.join(lines) + '\n'
+    filler = '今天的新闻反映了行业的快速发展，各方都在加大投入，竞争日趋激烈。'
+    while len(report) < report_chars:
+        report += filler
+    return report[:report_chars]
+
+
+def build_digest(messages, digest_chars=200):
+    article = _message_text(messages[-1])
+    digest = '本文摘要：' + article.split('\n')[0][:60] + '。' + '文章介绍了事件的经过、关键数据以及各方的观点和影响。' * 4
+    return digest[:digest_chars]
+
+
+def create_llm_app(latency, tokens_per_second, articles, report_chars):
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    async def chat_completions(request):
+        body = await request.json()
+        messages = body['messages']
+        tools = [tool['function']['name'] for tool in body.get('tools') or []]
+        kind, value = script_response(messages, articles, report_chars, tools)
+        prompt_tokens = sum(link_ranker.estimate_tokens(_message_text(m)) for m in messages)
+        if kind == 'text':
+            completion_tokens = link_ranker.estimate_tokens(value)
+            message = {"role": "assistant", "content": value}
+            finish_reason = 'stop'
+        else:
+            tool_calls = [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                           "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}}
+                          for name, arguments in value]
+            completion_tokens = sum(link_ranker.estimate_tokens(call['function']['arguments']) for call in tool_calls)
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            finish_reason = 'tool_calls'
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get('model', 'fake')}
+        generation_seconds = completion_tokens / tokens_per_second if tokens_per_second else 0
+
+        if not body.get('stream'):
+            await asyncio.sleep(latency + generation_seconds)
+            return JSONResponse(dict(base, object='chat.completion', usage=usage, choices=[
+                {"index": 0, "message": message, "finish_reason": finish_reason}]))
+
+        async def stream():
+            await asyncio.sleep(latency)
+
+            def chunk(delta, finish=None, **extra):
+                data = dict(base, object='chat.completion.chunk',
+                            choices=[{"index": 0, "delta": delta, "finish_reason": finish}], **extra)
+                return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+            if kind == 'text':
+                pieces = [value[i:i + 40] for i in range(0, len(value), 40)] or ['']
+                for i, piece in enumerate(pieces):
+                    yield chunk({"role": "assistant", "content": piece} if i == 0 else {"content": piece})
+                    await asyncio.sleep(generation_seconds / len(pieces))
+            else:
+                await asyncio.sleep(generation_seconds)
+                yield chunk({"role": "assistant", "tool_calls": [dict(call, index=i) for i, call in
+                                                                  enumerate(message['tool_calls'])]})
+            yield chunk({}, finish_reason)
+            yield f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[], usage=usage))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    return Starlette(routes=[Route('/v1/chat/completions', chat_completions, methods=['POST'])])
+
+
+# --- Fake news MCP server ---
+
+def _rng(url):
+    return random.Random(zlib.crc32(url.encode('utf-8')))
+
+
+def portal_html(source_url, articles_per_source):
+    """A synthetic news portal: navigation, article links (some dated today), a footer and an off-site link."""
+    rng = _rng(source_url)
+    today = time.strftime('%Y/%m/%d')
+    parts = ['<html><head><title>新闻门户</title></head><body><nav>']
+    parts += [f'<a href="/channel/{i}">频道导航第{i}个栏目</a>' for i in range(40)]
+    parts.append('</nav><main>')
+    for i in range(articles_per_source):
+        topic = rng.choice(TOPICS)
+        date = today if rng.random() < 0.5 else '2020/01/01'
+        parts.append(f'<a href="{source_url.rstrip("/")}/{date}/article/{i}.html">{topic}领域的最新进展与分析报道第{i}篇</a>')
+    parts.append('<a href="https://elsewhere.example.org/ad/1">站外广告链接标题很长很长</a></main>')
+    parts.append('<footer><a href="/about">关于我们网站介绍</a></footer></body></html>')
+    return ''.join(parts)
+
+
+def article_html(url, paragraphs):
+    rng = _rng(url)
+    topic = rng.choice(TOPICS)
+    body = ''.join(f'<p>{topic}相关的第{i}段正文内容，介绍了行业的最新动态、各方观点以及未来的发展趋势，'
+                   f'篇幅较长以模拟真实新闻。</p>' for i in range(paragraphs))
+    return (f'<html><head><title>{topic}新闻 - 新闻门户</title>'
+            f'<meta property="article:published_time" content="{time.strftime("%Y-%m-%dT%H:%M:%S")}"></head>'
+            f'<body><nav><a href="/">首页</a></nav><div class="article-content"><h1>{topic}领域的最新进展</h1>{body}'
+            f'</div><div class="related"><p><a href="/x">相关阅读一篇很长的推荐文章标题</a></p></div>'
+            f'<div id="comments"><p>网友评论：说得好！</p></div></body></html>')
+
+
+def create_mcp_server(fetch_latency, articles_per_source, paragraphs, link_token_budget, content_max_chars):
+    from fastmcp import FastMCP
+
+    mcp = FastMCP(name="fake_news")
+
+    @mcp.tool(name="get_news_links", description="从新闻网站中，获取新闻的链接。")
+    async def get_news_links(urls: list = None, keywords: str = None, max_tokens: int = None):
+        if urls is None:
+            return json.dumps({"error": "No news URLs provided."}, ensure_ascii=False)
+
+        async def load(url):
+            await asyncio.sleep(fetch_latency)
+            parser = PageParser(url)
+            parser.feed(portal_html(url, articles_per_source))
+            parser.close()
+            return [link for link in parser.links if len(link['title']) > 8]
+
+        results = await asyncio.gather(*(load(url_dict['url']) for url_dict in urls))
+        links_by_source = {url_dict['url']: links for url_dict, links in zip(urls, results)}
+        budget = link_token_budget if max_tokens is None else max_tokens
+        selected = link_ranker.select_links(links_by_source, keywords or '', budget)
+        return link_ranker.dumps_compact([link for links in selected.values() for link in links])
+
+    @mcp.tool(name="get_news_content", description="获取输入新闻链接的新闻内容")
+    async def get_news_content(url: str, fetch_mode: str = None):
+        await asyncio.sleep(fetch_latency)
+        article = await asyncio.to_thread(extract_article, article_html(url, paragraphs), content_max_chars)
+        return format_article(article)
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('service', choices=['llm', 'mcp'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--latency', type=float, default=0.5, help='llm: seconds before each response starts')
+    parser.add_argument('--tokens-per-second', type=float, default=200, help='llm: completion token rate (0 = instant)')
+    parser.add_argument('--articles', type=int, default=5, help='llm: articles read per report')
+    parser.add_argument('--report-chars', type=int, default=3000, help='llm: length of the final report')
+    parser.add_argument('--fetch-latency', type=float, default=0.2, help='mcp: seconds per simulated page load')
+    parser.add_argument('--articles-per-source', type=int, default=300, help='mcp: article links on each portal page')
+    parser.add_argument('--paragraphs', type=int, default=30, help='mcp: paragraphs per article')
+    parser.add_argument('--link-token-budget', type=int, default=3000)
+    parser.add_argument('--content-max-chars', type=int, default=6000)
+    args = parser.parse_args()
+
+    if args.service == 'llm':
+        import uvicorn
+        app = create_llm_app(args.latency, args.tokens_per_second, args.articles, args.report_chars)
+        uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+    else:
+        mcp = create_mcp_server(args.fetch_latency, args.articles_per_source, args.paragraphs,
+                                args.link_token_budget, args.content_max_chars)
+        mcp.run(transport="streamable-http", host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import re
+from html.parser import HTMLParser
+
+# Subtrees that never hold article text.
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'button', 'select', 'textarea',
+             'nav', 'header', 'footer', 'aside'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+             'track', 'wbr'}
+BLOCK_TAGS = {'address', 'article', 'blockquote', 'dd', 'div', 'dl', 'dt', 'figure', 'h1', 'h2', 'h3', 'h4',
+              'h5', 'h6', 'li', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul'}
+# Blocks whose text is emitted as one paragraph of the article.
+TEXT_TAGS = {'p', 'pre', 'blockquote', 'h2', 'h3', 'h4'}
+
+POSITIVE_HINTS = re.compile(r'article|body|content|entry|main|page|post|text|story|detail|rich', re.I)
+NEGATIVE_HINTS = re.compile(r'comment|reply|footer|footnote|related|recommend|share|social|sidebar|widget|advert|'
+                            r'promo|sponsor|breadcrumb|copyright|author-?info|subscribe|popup|modal|'
+                            r'(?<![a-z])(?:ads?|hot|nav|menu|meta|rank|tags?)(?![a-z])', re.I)
+
+PUBLISHED_META = ('article:published_time', 'og:release_date', 'publishdate', 'publish_date', 'pubdate',
+                  'publish-date', 'publication_date', 'date', 'dc.date.issued', 'sailthru.date')
+_DATE_TEXT = re.compile(r'(20\d{2})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*日?(?:\s*(\d{1,2}:\d{2}(?::\d{2})?))?')
+_LD_PUBLISHED = re.compile(r'"datePublished"\s*:\s*"([^"]+)"')
+_TITLE_SEPARATORS = re.compile(r'\s+[-|_–—]\s+|\s*[|_]\s*')
+_WHITESPACE = re.compile(r'\s+')
+_COMMAS = re.compile(r'[,，、。;；]')
+
+TRUNCATED_MARK = '……（正文已截断）'
+
+
+class _Node:
+    __slots__ = ('tag', 'hints', 'parent', 'children')
+
+    def __init__(self, tag, hints, parent):
+        self.tag = tag
+        self.hints = hints # class + id, for the positive/negative patterns
+        self.parent = parent
+        self.children = [] # _Node or str
+
+
+class _TreeBuilder(HTMLParser):
+    """
+    Builds a minimal element tree of the page body (boilerplate subtrees dropped) and collects
+    the <title>, <meta> and <time> values used for the title and publish time.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node('root', '', None)
+        self.meta = {}
+        self.title = ''
+        self.times = []
+        self._current = self.root
+        self._skip_depth = 0
+        self._in_title = False
+        self._h1_node = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or attrs.get('itemprop') or '').lower()
+            if key and attrs.get('content'):
+                self.meta.setdefault(key, attrs['content'].strip())
+            return
+        if tag == 'time' and attrs.get('datetime'):
+            self.times.append(attrs['datetime'].strip())
+        if tag == 'title':
+            self._in_title = True
+        if self._skip_depth:
+            if tag in SKIP_TAGS:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS:
+            self._skip_depth = 1
+            return
+        if tag in VOID_TAGS:
+            if tag == 'br':
+                self._current.children.append('\n')
+            return
+        # A block start implicitly closes an open <p>
+        if tag in BLOCK_TAGS and self._current.tag == 'p':
+            self._current = self._current.parent
+        node = _Node(tag, f"{attrs.get('class') or ''} {attrs.get('id') or ''}", self._current)
+        self._current.children.append(node)
+        self._current = node
+        if tag == 'h1' and self._h1_node is None:
+            self._h1_node = node
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if self._skip_depth:
+            if tag in SKIP_TAGS:
+                self._skip_depth -= 1
+            return
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if not self._skip_depth:
+            self._current.children.append(data)
+
+
+def _text(node):
+    """Whitespace-normalized text under a node, gathered into one list and joined once."""
+    parts = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        else:
+            stack.extend(reversed(item.children))
+    return _WHITESPACE.sub(' ', ''.join(parts)).strip()
+
+
+def _link_text_length(node):
+    total = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, _Node):
+            if item.tag == 'a':
+                total += len(_text(item))
+            else:
+                stack.extend(item.children)
+    return total
+
+
+def _class_weight(node):
+    weight = 0
+    if node.hints.strip():
+        if NEGATIVE_HINTS.search(node.hints):
+            weight -= 25
+        if POSITIVE_HINTS.search(node.hints):
+            weight += 25
+    return weight
+
+
+def _is_text_block(node):
+    """<p>-like blocks, plus <div>s that hold text directly instead of wrapping it in <p>."""
+    if node.tag in TEXT_TAGS:
+        return True
+    return node.tag in ('div', 'section') and not any(
+        isinstance(child, _Node) and child.tag in BLOCK_TAGS for child in node.children)
+
+
+def _iter_nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed([child for child in node.children if isinstance(child, _Node)]))
+
+
+def _top_candidate(root):
+    """Readability-style scoring: every text block scores its parent and, at half weight, its grandparent."""
+    scores = {}
+    for node in _iter_nodes(root):
+        if node.tag not in ('p', 'pre', 'td') and not (node.tag == 'div' and _is_text_block(node)):
+            continue
+        text = _text(node)
+        if len(text) < 25:
+            continue
+        score = 1 + len(_COMMAS.findall(text)) + min(len(text) // 100, 3)
+        for ancestor, share in ((node.parent, 1.0), (node.parent.parent if node.parent else None, 0.5)):
+            if ancestor is None or ancestor.tag == 'root':
+                continue
+            if ancestor not in scores:
+                base = {'div': 5, 'article': 10, 'section': 3, 'pre': 3, 'td': 3, 'blockquote': 3}.get(ancestor.tag, 0)
+                scores[ancestor] = base + _class_weight(ancestor)
+            scores[ancestor] += score * share
+
+    best, best_score = None, 0
+    for node, score in scores.items():
+        text_length = len(_text(node)) or 1
+        score *= 1 - min(_link_text_length(node) / text_length, 1)
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def _paragraphs(container):
+    """Text blocks of the chosen container, skipping boilerplate-looking and link-heavy blocks."""
+    paragraphs = []
+    stack = [container]
+    while stack:
+        node = stack.pop()
+        if node is not container and NEGATIVE_HINTS.search(node.hints) and not POSITIVE_HINTS.search(node.hints):
+            continue
+        if _is_text_block(node):
+            text = _text(node)
+            if text and _link_text_length(node) <= len(text) * 0.5 and (not paragraphs or paragraphs[-1] != text):
+                paragraphs.append(text)
+            continue
+        stack.extend(reversed([child for child in node.children if isinstance(child, _Node)]))
+    return paragraphs
+
+
+def _title(builder):
+    for key in ('og:title', 'twitter:title', 'headline'):
+        if builder.meta.get(key):
+            return builder.meta[key]
+    if builder._h1_node is not None:
+        h1 = _text(builder._h1_node)
+        if h1:
+            return h1
+    title = _WHITESPACE.sub(' ', builder.title).strip()
+    # "Headline - Site name": keep the headline
+    head = _TITLE_SEPARATORS.split(title)[0].strip()
+    return head if len(head) >= 6 else title
+
+
+def _published(builder, html, body_text):
+    for key in PUBLISHED_META:
+        if builder.meta.get(key):
+            return builder.meta[key]
+    if builder.meta.get('datepublished'):
+        return builder.meta['datepublished']
+    match = _LD_PUBLISHED.search(html)
+    if match:
+        return match.group(1)
+    if builder.times:
+        return builder.times[0]
+    match = _DATE_TEXT.search(body_text[:2000])
+    if match:
+        year, month, day, clock = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}" + (f" {clock}" if clock else '')
+    return ''
+
+
+def _cap(paragraphs, max_chars):
+    """Keeps whole paragraphs up to `max_chars` characters, cutting the last one if needed."""
+    if not max_chars:
+        return paragraphs, False
+    kept = []
+    used = 0
+    for paragraph in paragraphs:
+        if used + len(paragraph) > max_chars:
+            remaining = max_chars - used
+            if remaining > 50:
+                kept.append(paragraph[:remaining])
+            return kept, True
+        kept.append(paragraph)
+        used += len(paragraph) + 1
+    return kept, False
+
+
+def extract_article(html, max_chars=0):
+    """
+    Finds the main article block of a news page and returns
+    {"title": ..., "published": ..., "text": ...}, with the text capped at `max_chars` characters (0 = no cap).
+    Comments, related-article teasers, share bars and other boilerplate are left out.
+    CPU-bound; call it from a worker thread.
+    """
+    builder = _TreeBuilder()
+    builder.feed(html or '')
+    builder.close()
+
+    container = _top_candidate(builder.root)
+    paragraphs = _paragraphs(container) if container is not None else []
+    if sum(len(p) for p in paragraphs) < 200:
+        # Scoring found no convincing block: fall back to every paragraph on the page
+        paragraphs = [text for text in (_text(node) for node in _iter_nodes(builder.root) if node.tag == 'p') if text]
+
+    paragraphs, truncated = _cap(paragraphs, max_chars)
+    text = '\n'.join(paragraphs)
+    if truncated:
+        text += TRUNCATED_MARK
+    return {
+        "title": _title(builder),
+        "published": _published(builder, html or '', text),
+        "text": text,
+    }
+
+
+def format_article(article):
+    """Text returned to the model: title and publish time on top, then the article body."""
+    if isinstance(article, str):
+        return article # Cached by an older version, before articles had a title
+    header = [f"标题：{article['title']}"] if article.get('title') else []
+    if article.get('published'):
+        header.append(f"发布时间：{article['published']}")
+    return '\n'.join(header + [article.get('text', '')]) if header else article.get('text', '')
@@ -1,20 +1,129 @@
+import json
+import os
+import re
 import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timezone, timedelta
 
-DATABASE = 'news_app.db'
+from report_render import html_etag, render_report
+
+# Can be overridden with NEWS_AGENT_DB, so web, scheduler and worker processes started separately share one file
+DATABASE = os.environ.get('NEWS_AGENT_DB', 'news_app.db')
+
+# Applied to every new connection. WAL lets readers (Flask requests) run while a writer (worker,
+# scheduler) commits; busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL', # Safe with WAL; only the last commits can be lost on power failure
+    'PRAGMA foreign_keys = ON', # Makes the ON DELETE CASCADE clauses in the schema take effect
+    'PRAGMA busy_timeout = 10000',
+    'PRAGMA cache_size = -16000', # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456', # 256 MB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Words for the report search index: runs of latin letters/digits, and CJK text as overlapping character pairs,
+# since Chinese has no spaces for FTS5's tokenizer to split on
+_SEARCH_TOKEN = re.compile(r'[0-9a-z]+|[\u3400-\u9fff\uf900-\ufaff]+')
+
+def search_terms(text):
+    """Space-separated index terms of a text: '芯片产业 AI' -> '芯片 片产 产业 ai'. Registered as an SQL function."""
+    terms = []
+    for token in _SEARCH_TOKEN.findall((text or '').lower()):
+        if token[0] <= 'z' or len(token) == 1:
+            terms.append(token)
+        else:
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return ' '.join(terms)
 
 def get_db():
     """
-    Establishes a connection to the SQLite database.
+    Establishes a new connection to the SQLite database with the standard pragmas applied.
     Sets row_factory to sqlite3.Row to allow accessing columns by name.
+    The connection is in autocommit mode; use `transaction()` to group writes.
     """
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, timeout=10, isolation_level=None, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    # Used by the triggers that keep the report search index in sync
+    conn.create_function('search_terms', 1, search_terms, deterministic=True)
     return conn
 
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections. Flask request threads, the scheduler and the workers
+    borrow a connection for one operation and hand it back, instead of paying for a new
+    connection (and its pragmas) on every call.
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return get_db()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            # Never hand out a connection with a half-finished transaction
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool():
+    # One pool per database file and process: DATABASE can be changed (benchmarks, tests),
+    # and SQLite connections must not be shared with a forked child.
+    key = (DATABASE, os.getpid())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool()
+        return pool
+
+@contextmanager
+def connection():
+    """Borrows a pooled connection for reads (autocommit)."""
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    Borrows a pooled connection and wraps the block in one transaction, committed at the end
+    or rolled back on error. `immediate=True` takes the write lock up front (BEGIN IMMEDIATE),
+    needed when a row is read and then updated based on what was read.
+    """
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
 def init_db():
     """Initializes the database and creates tables if they don't exist."""
     conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
     cursor = conn.cursor()
     
 
@@ -61,45 +170,239 @@ def init_db():
         FOREIGN KEY (subscription_id) REFERENCES subscriptions (id)
     )
     ''')
+
+    # Durable job queue. Each queued report has exactly one job row holding everything a worker needs to run it.
+    # Workers claim jobs with a lease; a job whose lease has expired (crashed or stuck worker) can be claimed again.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id INTEGER NOT NULL UNIQUE,
+        payload TEXT NOT NULL, -- JSON: {"prompt": ..., "news_urls": [...]}
+        status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        available_at REAL NOT NULL, -- Unix time after which the job may be claimed (used for retry backoff)
+        lease_owner TEXT, -- Worker ID currently holding the job
+        lease_expires_at REAL, -- Unix time, the job is up for grabs again after this
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (report_id) REFERENCES reports (id)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at)')
+
+    # Timed stages of each report attempt (queue wait, model setup, MCP tool calls, LLM requests, DB writes)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS report_spans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id INTEGER NOT NULL,
+        attempt INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        started_at REAL NOT NULL, -- Unix time
+        duration_seconds REAL NOT NULL,
+        attrs TEXT, -- JSON, e.g. {"tool": ..., "url": ..., "bytes": ...} or {"prompt_tokens": ..., "completion_tokens": ...}
+        FOREIGN KEY (report_id) REFERENCES reports (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_spans_report ON report_spans (report_id)')
+
+    # Report archive: content of reports older than the retention window, zlib-compressed. The reports row
+    # stays (with content NULL), so history and links keep working while the hot table only holds metadata.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS report_archive (
+        report_id INTEGER PRIMARY KEY,
+        content BLOB NOT NULL, -- zlib-compressed UTF-8
+        archived_at REAL NOT NULL, -- Unix time
+        FOREIGN KEY (report_id) REFERENCES reports (id) ON DELETE CASCADE
+    )
+    ''')
+
+    # Full-text search over report content. Contentless (only the index is stored), rowid = report ID.
+    # The triggers index a report when its content is written; archiving sets content to NULL and keeps the entry.
+    fts_exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'reports_fts'").fetchone()
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(terms, content='')")
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reports_fts_insert AFTER INSERT ON reports WHEN new.content IS NOT NULL BEGIN
+        INSERT INTO reports_fts (rowid, terms) VALUES (new.id, search_terms(new.content));
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reports_fts_update AFTER UPDATE OF content ON reports WHEN new.content IS NOT NULL BEGIN
+        INSERT INTO reports_fts (reports_fts, rowid, terms)
+            SELECT 'delete', old.id, search_terms(old.content) WHERE old.content IS NOT NULL;
+        INSERT INTO reports_fts (rowid, terms) VALUES (new.id, search_terms(new.content));
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reports_fts_delete AFTER DELETE ON reports WHEN old.content IS NOT NULL BEGIN
+        INSERT INTO reports_fts (reports_fts, rowid, terms) VALUES ('delete', old.id, search_terms(old.content));
+    END
+    ''')
+    if not fts_exists:
+        # Reports written by an older version
+        cursor.execute('INSERT INTO reports_fts (rowid, terms) SELECT id, search_terms(content) FROM reports WHERE content IS NOT NULL')
+
+    # News each subscription has already been given, so the next report only covers what is new.
+    # Only hashes are stored: url_key is a short hash of the normalized URL, content_hash (when the article
+    # was read) a hash of its text. Rows older than the configured age are ignored and pruned.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS seen_articles (
+        subscription_id INTEGER NOT NULL,
+        url_key TEXT NOT NULL,
+        content_hash TEXT,
+        first_seen_at REAL NOT NULL, -- Unix time
+        last_seen_at REAL NOT NULL, -- Unix time the link was last on the source page during a report
+        PRIMARY KEY (subscription_id, url_key)
+    ) WITHOUT ROWID
+    ''')
+
+    # Indexes. CREATE INDEX IF NOT EXISTS also adds them to databases created by an older version.
+    # The dashboard reads subscriptions.latest_report_id now, so the (subscription_id, created_at) index
+    # that served the latest-report lookup only slows down report inserts
+    cursor.execute('DROP INDEX IF EXISTS idx_reports_subscription_created')
+    # Report history of one subscription, newest first, paged by report ID
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_subscription_id ON reports (subscription_id, id)')
+    # Reports not archived yet by age, so archiving only touches the rows it moves
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_unarchived ON reports (created_at) WHERE content IS NOT NULL')
+    # Reverse lookup for ON DELETE CASCADE when a news source is deleted
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscription_news_sources_source ON subscription_news_sources (news_source_id)')
+
+    # Columns added after the first release, for databases created by an older version
+    # fetch_mode: how news_browser.py loads this source, 'auto' (HTTP first, browser if needed), 'http' or 'browser'
+    _add_column_if_missing(cursor, 'news_sources', 'fetch_mode', "TEXT NOT NULL DEFAULT 'auto'")
+    # next_run_at: local time ('YYYY-MM-DD HH:MM:SS') of the subscription's next scheduled run
+    _add_column_if_missing(cursor, 'subscriptions', 'next_run_at', 'TEXT')
+    # scheduled_for: the scheduled run a report belongs to, NULL for manual runs
+    _add_column_if_missing(cursor, 'reports', 'scheduled_for', 'TEXT')
+    # Live progress of a running report: current stage, the model output streamed so far,
+    # and a counter bumped on every write so readers can tell whether anything changed
+    _add_column_if_missing(cursor, 'reports', 'progress', 'TEXT')
+    _add_column_if_missing(cursor, 'reports', 'partial_content', 'TEXT')
+    _add_column_if_missing(cursor, 'reports', 'progress_seq', 'INTEGER NOT NULL DEFAULT 0')
+    # content_html: a completed report rendered to sanitized HTML (report_render.py), and its ETag.
+    # Reports completed before these columns existed are rendered when first viewed (see save_report_html).
+    _add_column_if_missing(cursor, 'reports', 'content_html', 'TEXT')
+    _add_column_if_missing(cursor, 'reports', 'content_etag', 'TEXT')
+    # latest_report_id: the subscription's newest report, kept up to date by a trigger so the dashboard
+    # never has to look through the report history
+    _add_column_if_missing(cursor, 'subscriptions', 'latest_report_id', 'INTEGER')
+    # deferred_run_at: the scheduled run a subscription is waiting to enqueue while the queue is full
+    # (see enqueue_due_subscriptions), so the run keeps its own scheduled_for however long admission takes
+    _add_column_if_missing(cursor, 'subscriptions', 'deferred_run_at', 'TEXT')
+    # no_new_news: 1 for a completed report whose news sources had nothing the subscription hadn't seen,
+    # so the agent was not run (incremental mode, see news_agent_client.mcprun)
+    _add_column_if_missing(cursor, 'reports', 'no_new_news', 'INTEGER NOT NULL DEFAULT 0')
+    # priority: JOB_PRIORITY_MANUAL or JOB_PRIORITY_SCHEDULED; workers always claim the highest first
+    _add_column_if_missing(cursor, 'jobs', 'priority', 'INTEGER NOT NULL DEFAULT 0')
+    # Queued jobs in claim order, and the queue depth of each priority class for admission control
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queued_priority ON jobs (priority, available_at) WHERE status = 'queued'")
+    # The queued or running report of a subscription, if any, which new runs are merged into
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_active ON reports (subscription_id) WHERE status IN ('queued', 'running')")
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS subscriptions_latest_report AFTER INSERT ON reports BEGIN
+        UPDATE subscriptions SET latest_report_id = new.id WHERE id = new.subscription_id;
+    END
+    ''')
+    cursor.execute('''
+        UPDATE subscriptions SET latest_report_id = (SELECT MAX(id) FROM reports WHERE subscription_id = subscriptions.id)
+        WHERE latest_report_id IS NULL
+    ''')
+
+    # Dashboard read model version: bumped by triggers on every write that changes what the dashboard shows,
+    # so each web process can keep the dashboard data cached until the version moves (see get_dashboard)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO dashboard_version (id, version) VALUES (1, 1)')
+    for name, event in (
+        ('subscriptions_insert', 'INSERT ON subscriptions'),
+        ('subscriptions_update', 'UPDATE OF name, prompt, schedule_time, deleted_at, latest_report_id ON subscriptions'),
+        ('news_sources_insert', 'INSERT ON news_sources'),
+        ('news_sources_update', 'UPDATE ON news_sources'),
+        ('news_sources_delete', 'DELETE ON news_sources'),
+        ('subscription_news_sources_insert', 'INSERT ON subscription_news_sources'),
+        ('subscription_news_sources_delete', 'DELETE ON subscription_news_sources'),
+        ('reports_status', 'UPDATE OF status ON reports'),
+    ):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS dashboard_{name} AFTER {event} BEGIN
+                UPDATE dashboard_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    # Named leases held by one process at a time, e.g. 'scheduler' for the scheduler leader (see acquire_lease)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL -- Unix time; an expired lease can be taken over by another holder
+        ) WITHOUT ROWID
+    ''')
+
+    # The scheduler only ever looks at subscriptions that are due
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_next_run ON subscriptions (next_run_at) WHERE deleted_at IS NULL')
+    # One report per scheduled run: enqueueing the same run twice is a no-op
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_subscription_scheduled
+        ON reports (subscription_id, scheduled_for) WHERE scheduled_for IS NOT NULL
+    ''')
+    # Subscriptions created before next_run_at existed
+    now = datetime.now()
+    for sub in cursor.execute('SELECT id, schedule_time FROM subscriptions WHERE next_run_at IS NULL').fetchall():
+        cursor.execute('UPDATE subscriptions SET next_run_at = ? WHERE id = ?',
+                       (next_occurrence(sub['schedule_time'], now), sub['id']))
     conn.commit()
     conn.close()
     print("Database initialized.")
 
+def _add_column_if_missing(cursor, table, column, definition):
+    """Adds a column to an existing table unless it is already there (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    columns = [row['name'] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def next_occurrence(schedule_time, after):
+    """
+    Returns the first daily run of `schedule_time` ('HH:MM') strictly after the datetime `after`,
+    formatted as the 'YYYY-MM-DD HH:MM:SS' string stored in subscriptions.next_run_at.
+    """
+    hour, minute = (int(part) for part in schedule_time.split(':'))
+    run = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= after:
+        run += timedelta(days=1)
+    return run.strftime('%Y-%m-%d %H:%M:%S')
+
 def add_subscription(name, prompt, schedule_time, news_source_ids):
     """
     Adds a new subscription plan to the database and links it to selected news sources.
     """
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO subscriptions (name, prompt, schedule_time) VALUES (?, ?, ?)',
-                 (name, prompt, schedule_time))
-    subscription_id = cursor.lastrowid
-
-    # Link the new subscription to its selected news sources
-    for source_id in news_source_ids:
-        cursor.execute('INSERT INTO subscription_news_sources (subscription_id, news_source_id) VALUES (?, ?)',
-                       (subscription_id, source_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.execute('INSERT INTO subscriptions (name, prompt, schedule_time, next_run_at) VALUES (?, ?, ?, ?)',
+                              (name, prompt, schedule_time, next_occurrence(schedule_time, datetime.now())))
+        subscription_id = cursor.lastrowid
+
+        # Link the new subscription to its selected news sources
+        conn.executemany('INSERT INTO subscription_news_sources (subscription_id, news_source_id) VALUES (?, ?)',
+                         [(subscription_id, source_id) for source_id in news_source_ids])
 
 def delete_subscription(sub_id):
     """
     Soft deletes a subscription by setting the 'deleted_at' timestamp to the current time.
     This keeps the record in the database but marks it as inactive.
     """
-    conn = get_db()
-    # Use datetime.now() to get the current timestamp for soft deletion
-    conn.execute('UPDATE subscriptions SET deleted_at = ? WHERE id = ?', 
-                (datetime.now(), sub_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        # Use datetime.now() to get the current timestamp for soft deletion
+        conn.execute('UPDATE subscriptions SET deleted_at = ? WHERE id = ?', 
+                    (datetime.now(), sub_id))
+        conn.execute('DELETE FROM seen_articles WHERE subscription_id = ?', (sub_id,))
 
-def add_news_source(name, url):
+def add_news_source(name, url, fetch_mode='auto'):
     """Adds a new news source to the database."""
-    conn = get_db()
-    conn.execute('INSERT INTO news_sources (name, url) VALUES (?, ?)', (name, url))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('INSERT INTO news_sources (name, url, fetch_mode) VALUES (?, ?, ?)', (name, url, fetch_mode))
 
 def delete_news_source(source_id):
     """
@@ -107,59 +410,59 @@ def delete_news_source(source_id):
     Note: ON DELETE CASCADE in subscription_news_sources table will handle
     deleting associated entries in that junction table.
     """
-    conn = get_db()
-    conn.execute('DELETE FROM news_sources WHERE id = ?', (source_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('DELETE FROM news_sources WHERE id = ?', (source_id,))
 
 def get_all_news_sources():
     """Retrieves all news sources from the database, ordered by name."""
-    conn = get_db()
-    sources = conn.execute('SELECT * FROM news_sources ORDER BY name').fetchall()
-    conn.close()
-    return sources
+    with connection() as conn:
+        return conn.execute('SELECT * FROM news_sources ORDER BY name').fetchall()
 
 def get_news_sources_for_subscription(subscription_id):
     """Retrieves all news sources linked to a specific subscription."""
-    conn = get_db()
-    sources = conn.execute('''
-        SELECT ns.id, ns.name, ns.url
-        FROM news_sources ns
-        JOIN subscription_news_sources sns ON ns.id = sns.news_source_id
-        WHERE sns.subscription_id = ?
-    ''', (subscription_id,)).fetchall()
-    conn.close()
-    return sources
+    with connection() as conn:
+        return conn.execute('''
+            SELECT ns.id, ns.name, ns.url, ns.fetch_mode
+            FROM news_sources ns
+            JOIN subscription_news_sources sns ON ns.id = sns.news_source_id
+            WHERE sns.subscription_id = ?
+        ''', (subscription_id,)).fetchall()
 
-def get_all_subscriptions_with_status():
+def get_all_subscriptions_with_status(conn=None):
     """
     Retrieves all active (non-soft-deleted) subscriptions along with their latest report status.
     Handles parsing of timestamps, including fractional seconds.
+    Runs on `conn` when given, e.g. to read inside the caller's snapshot.
     """
-    conn = get_db()
-    rows = conn.execute('''
-        SELECT 
-            s.id, 
-            s.name, 
-            s.prompt, 
-            s.schedule_time, 
-            r.id as report_id,
-            r.status, 
-            r.created_at,
-            s.deleted_at
-        FROM subscriptions s
-        LEFT JOIN (
+    with (nullcontext(conn) if conn is not None else connection()) as conn:
+        # The latest report of each subscription is stored in latest_report_id,
+        # so this is one primary key lookup per subscription no matter how large the reports history grows.
+        rows = conn.execute('''
             SELECT 
-                subscription_id, 
-                MAX(created_at) as max_created_at
-            FROM reports
-            GROUP BY subscription_id
-        ) latest_report ON s.id = latest_report.subscription_id
-        LEFT JOIN reports r ON s.id = r.subscription_id AND r.created_at = latest_report.max_created_at
-        WHERE s.deleted_at IS NULL -- Crucial: Only retrieve subscriptions that are NOT soft-deleted
-        ORDER BY s.created_at DESC
-    ''').fetchall()
-    conn.close()
+                s.id, 
+                s.name, 
+                s.prompt, 
+                s.schedule_time, 
+                r.id as report_id,
+                r.status, 
+                r.created_at,
+                s.deleted_at
+            FROM subscriptions s
+            LEFT JOIN reports r ON r.id = s.latest_report_id
+            WHERE s.deleted_at IS NULL -- Crucial: Only retrieve subscriptions that are NOT soft-deleted
+            ORDER BY s.created_at DESC
+        ''').fetchall()
+
+        # News sources of all active subscriptions in one query, instead of one query per subscription
+        sources_by_subscription = {}
+        for source in conn.execute('''
+            SELECT sns.subscription_id, ns.id, ns.name, ns.url, ns.fetch_mode
+            FROM subscription_news_sources sns
+            JOIN news_sources ns ON ns.id = sns.news_source_id
+            JOIN subscriptions s ON s.id = sns.subscription_id
+            WHERE s.deleted_at IS NULL
+        ''').fetchall():
+            sources_by_subscription.setdefault(source['subscription_id'], []).append(source)
     
     subscriptions = []
     for row in rows:
@@ -177,17 +480,49 @@ def get_all_subscriptions_with_status():
             sub['deleted_at'] = datetime.strptime(str(sub['deleted_at']).split('.')[0], '%Y-%m-%d %H:%M:%S')
             sub['deleted_at'] = sub['deleted_at'].replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=8)))
         
-        # Fetch news sources for each subscription
-        sub['news_sources'] = get_news_sources_for_subscription(sub['id'])
+        sub['news_sources'] = sources_by_subscription.get(sub['id'], [])
         subscriptions.append(sub)
         
     return subscriptions
 
+# Dashboard read model of this process: (version, subscriptions, news sources)
+_dashboard = (None, None, None)
+_dashboard_lock = threading.Lock()
+
+def get_dashboard_version():
+    with connection() as conn:
+        return conn.execute('SELECT version FROM dashboard_version WHERE id = 1').fetchone()['version']
+
+def get_dashboard():
+    """
+    Data of the dashboard as (version, subscriptions, news_sources). Rebuilt only when the dashboard
+    version has moved since the last call, i.e. after a write that changes what the dashboard shows,
+    by any process; otherwise each call costs one primary key lookup, however many tabs poll it.
+    """
+    global _dashboard
+    version = get_dashboard_version()
+    if _dashboard[0] == version:
+        return _dashboard
+    with _dashboard_lock:
+        # Another request may have rebuilt it while this one waited
+        if _dashboard[0] == version:
+            return _dashboard
+        # Read the version again with the data: a write committed in between then shows up as a newer version
+        with connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                version = conn.execute('SELECT version FROM dashboard_version WHERE id = 1').fetchone()['version']
+                subscriptions = get_all_subscriptions_with_status(conn)
+                news_sources = [dict(row) for row in conn.execute('SELECT * FROM news_sources ORDER BY name').fetchall()]
+            finally:
+                conn.execute('COMMIT')
+        _dashboard = (version, subscriptions, news_sources)
+        return _dashboard
+
 def get_subscription_by_id(sub_id):
     """Retrieves a single subscription by its ID."""
-    conn = get_db()
-    sub = conn.execute('SELECT * FROM subscriptions WHERE id = ?', (sub_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        sub = conn.execute('SELECT * FROM subscriptions WHERE id = ?', (sub_id,)).fetchone()
     if sub:
         sub = dict(sub)
         # Also fetch associated news sources for this single subscription
@@ -198,40 +533,450 @@ def get_subscription_by_id(sub_id):
             sub['deleted_at'] = sub['deleted_at'].replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=8)))
     return sub
 
-def create_report_entry(subscription_id):
-    """Creates a new report entry in the database with 'queued' status."""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO reports (subscription_id, status) VALUES (?, ?)', 
-                   (subscription_id, 'queued'))
+def get_report_etag(report_id):
+    """(status, content_etag) of a report without loading its content, for answering revalidations; None if missing."""
+    with connection() as conn:
+        row = conn.execute('SELECT status, content_etag FROM reports WHERE id = ?', (report_id,)).fetchone()
+    return (row['status'], row['content_etag']) if row else None
+
+def save_report_html(report_id, html, keep_html=True):
+    """
+    Stores the rendered HTML of a completed report that was saved before reports were rendered on completion.
+    For archived reports only the ETag is kept (`keep_html=False`), the HTML would undo the archive's savings.
+    """
+    with transaction() as conn:
+        conn.execute("UPDATE reports SET content_html = ?, content_etag = ? WHERE id = ? AND status = 'completed'",
+                     (html if keep_html else None, html_etag(html), report_id))
+
+
+# --- Durable job queue ---
+
+def _news_source_targets(conn, subscription_id):
+    # The subscription's news sources in the format the get_news_links tool expects
+    return [{"url": source['url'], "fetch_mode": source['fetch_mode']} for source in conn.execute('''
+        SELECT ns.url, ns.fetch_mode FROM news_sources ns
+        JOIN subscription_news_sources sns ON ns.id = sns.news_source_id
+        WHERE sns.subscription_id = ?
+    ''', (subscription_id,)).fetchall()]
+
+# Job priority classes: workers claim manual ("run now") jobs before any scheduled job
+JOB_PRIORITY_SCHEDULED = 0
+JOB_PRIORITY_MANUAL = 10
+
+def _insert_report_job(conn, subscription_id, prompt, news_urls, max_attempts, scheduled_for=None,
+                       priority=JOB_PRIORITY_SCHEDULED):
+    # For scheduled runs the unique index on (subscription_id, scheduled_for) makes this idempotent:
+    # returns None instead of creating a second report for the same run.
+    cursor = conn.execute('INSERT OR IGNORE INTO reports (subscription_id, status, scheduled_for) VALUES (?, ?, ?)', 
+                          (subscription_id, 'queued', scheduled_for))
+    if cursor.rowcount == 0:
+        return None
     report_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    payload = json.dumps({"prompt": prompt, "news_urls": news_urls}, ensure_ascii=False)
+    conn.execute('INSERT INTO jobs (report_id, payload, max_attempts, available_at, priority) VALUES (?, ?, ?, ?, ?)',
+                 (report_id, payload, max_attempts, time.time(), priority))
     return report_id
 
-def update_report(report_id, status, content=None):
-    """Updates the status and optionally content of an existing report."""
-    conn = get_db()
-    if content:
-        conn.execute('UPDATE reports SET status = ?, content = ? WHERE id = ?', 
-                     (status, content, report_id))
-    else:
-        conn.execute('UPDATE reports SET status = ? WHERE id = ?', (status, report_id))
-    conn.commit()
-    conn.close()
+def _active_job(conn, subscription_id):
+    """The queued or running job of a subscription (idx_reports_active), or None."""
+    return conn.execute('''
+        SELECT j.id, j.report_id, j.status, j.priority FROM reports r
+        JOIN jobs j ON j.report_id = r.id
+        WHERE r.subscription_id = ? AND r.status IN ('queued', 'running') AND j.status IN ('queued', 'running')
+        LIMIT 1
+    ''', (subscription_id,)).fetchone()
+
+def _queue_depth(conn, priority):
+    """Queued jobs of one priority class, including those waiting for a retry."""
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ?",
+                        (priority,)).fetchone()[0]
+
+def enqueue_report_job(subscription_id, prompt, news_urls, max_attempts=3, priority=JOB_PRIORITY_SCHEDULED, max_depth=0):
+    """
+    Creates a 'queued' report and its job in a single transaction, so a report can never
+    exist without a job to produce it.
+
+    A subscription has at most one report in the queue: if it already has a queued or running job,
+    the run is merged into it (a queued job is raised to `priority`) and no new report is created.
+    With `max_depth`, a run is rejected when its priority class already has that many queued jobs.
+    Returns (report_id, result), result being 'queued', 'merged' or 'rejected' (report_id None).
+    """
+    with transaction(immediate=True) as conn:
+        active = _active_job(conn, subscription_id)
+        if active is not None:
+            if active['status'] == 'queued' and active['priority'] < priority:
+                conn.execute('UPDATE jobs SET priority = ? WHERE id = ?', (priority, active['id']))
+            return active['report_id'], 'merged'
+        if max_depth and _queue_depth(conn, priority) >= max_depth:
+            return None, 'rejected'
+        return _insert_report_job(conn, subscription_id, prompt, news_urls, max_attempts, priority=priority), 'queued'
+
+def claim_job(worker_id, lease_seconds):
+    """
+    Atomically claims the runnable job with the highest priority for `worker_id`, the oldest first
+    within a priority class, so manual runs never wait behind a scheduled batch.
+    A job is runnable when it is queued and its backoff has passed, or when it is running
+    but its lease has expired. Safe to call from several processes sharing the database file.
+    An expired job that has used up its attempts is marked failed instead of being run again.
+    Returns a dict with the job and its decoded payload, or None if nothing is runnable.
+    """
+    now = time.time()
+    # Cheap read first, so idle workers polling the queue don't contend for the write lock
+    with connection() as conn:
+        runnable = conn.execute('''
+            SELECT 1 FROM jobs
+            WHERE (status = 'queued' AND available_at <= ?)
+               OR (status = 'running' AND lease_expires_at < ?)
+            LIMIT 1
+        ''', (now, now)).fetchone()
+    if runnable is None:
+        return None
 
+    # BEGIN IMMEDIATE takes the write lock up front, so two workers can never select the same row.
+    with transaction(immediate=True) as conn:
+        while True:
+            row = conn.execute('''
+                SELECT * FROM jobs
+                WHERE (status = 'queued' AND available_at <= ?)
+                   OR (status = 'running' AND lease_expires_at < ?)
+                ORDER BY priority DESC, available_at, id
+                LIMIT 1
+            ''', (now, now)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == 'queued' or row['attempts'] < row['max_attempts']:
+                break
+            # The lease expired without fail_job being called: the attempt crashed or hung its worker.
+            # A job that keeps doing that would otherwise be re-run forever.
+            _abandon_job(conn, row)
+        conn.execute('''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?
+            WHERE id = ?
+        ''', (worker_id, now + lease_seconds, row['id']))
+        conn.execute('''
+            UPDATE reports SET status = 'running', progress = NULL, partial_content = NULL, progress_seq = progress_seq + 1
+            WHERE id = ?
+        ''', (row['report_id'],))
+        subscription_id = conn.execute('SELECT subscription_id FROM reports WHERE id = ?',
+                                       (row['report_id'],)).fetchone()['subscription_id']
+
+    job = dict(row)
+    job['attempts'] += 1
+    job['subscription_id'] = subscription_id
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+def _abandon_job(conn, job):
+    error_message = f"任务在 {job['attempts']} 次尝试后被放弃：执行任务的工作进程崩溃或无响应。"
+    print(f"Abandoning job {job['id']} (report ID: {job['report_id']}) after {job['attempts']} attempts.")
+    conn.execute('''
+        UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL, last_error = ?
+        WHERE id = ?
+    ''', (error_message, job['id']))
+    conn.execute('''
+        UPDATE reports SET status = 'failed', content = ?, progress = NULL, partial_content = NULL,
+            progress_seq = progress_seq + 1
+        WHERE id = ?
+    ''', (error_message, job['report_id']))
+
+def renew_job_lease(job_id, worker_id, lease_seconds):
+    """Extends the lease on a running job. Returns False if the worker no longer owns it."""
+    with transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE jobs SET lease_expires_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+        ''', (time.time() + lease_seconds, job_id, worker_id))
+        return cursor.rowcount == 1
+
+def complete_job(job_id, worker_id, content, seen_articles=None, seen_max_age_seconds=None, no_new_news=False):
+    """
+    Marks a job done and stores the report content.
+    `seen_articles` ((url_key, content_hash) pairs) are added to the subscription's seen-articles index
+    in the same transaction, so only a report that was actually saved marks its news as seen.
+    `no_new_news` flags a report completed without running the agent because nothing was new.
+    The content is rendered to HTML here, once, before the write lock is taken; report pages serve it as is.
+    Ignored (returns False) if the lease was lost and another worker took the job over.
+    """
+    html = render_report(content)
+    with transaction(immediate=True) as conn:
+        job = conn.execute('''
+            SELECT jobs.report_id, reports.subscription_id FROM jobs JOIN reports ON reports.id = jobs.report_id
+            WHERE jobs.id = ? AND jobs.lease_owner = ? AND jobs.status = 'running'
+        ''', (job_id, worker_id)).fetchone()
+        if job is None:
+            return False
+        if seen_articles:
+            _record_seen_articles(conn, job['subscription_id'], seen_articles, seen_max_age_seconds)
+        conn.execute("UPDATE jobs SET status = 'done', lease_expires_at = NULL WHERE id = ?", (job_id,))
+        conn.execute('''
+            UPDATE reports SET status = 'completed', content = ?, content_html = ?, content_etag = ?, progress = NULL,
+                partial_content = NULL, progress_seq = progress_seq + 1, no_new_news = ?
+            WHERE id = ?
+        ''', (content, html, html_etag(html), int(no_new_news), job['report_id']))
+        return True
+
+def _record_seen_articles(conn, subscription_id, seen_articles, max_age_seconds=None):
+    now = time.time()
+    conn.executemany('''
+        INSERT INTO seen_articles (subscription_id, url_key, content_hash, first_seen_at, last_seen_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (subscription_id, url_key) DO UPDATE SET
+            last_seen_at = excluded.last_seen_at,
+            content_hash = COALESCE(excluded.content_hash, seen_articles.content_hash)
+    ''', [(subscription_id, url_key, content_hash, now, now) for url_key, content_hash in seen_articles])
+    if max_age_seconds:
+        # Only this subscription's rows, so pruning is a range scan on the primary key
+        conn.execute('DELETE FROM seen_articles WHERE subscription_id = ? AND last_seen_at < ?',
+                     (subscription_id, now - max_age_seconds))
+
+def get_seen_articles(subscription_id, max_age_seconds=None):
+    """The subscription's seen-articles index as {url_key: content_hash or None}, without rows older than `max_age_seconds`."""
+    cutoff = time.time() - max_age_seconds if max_age_seconds else 0
+    with connection() as conn:
+        return {row['url_key']: row['content_hash'] for row in conn.execute(
+            'SELECT url_key, content_hash FROM seen_articles WHERE subscription_id = ? AND last_seen_at >= ?',
+            (subscription_id, cutoff))}
+
+def update_report_progress(job_id, worker_id, progress, partial_content):
+    """
+    Stores the live progress of a running report. Ignored (returns False) if the worker
+    no longer holds the job's lease, so a stale worker can't overwrite a newer attempt.
+    """
+    with transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE reports SET progress = ?, partial_content = ?, progress_seq = progress_seq + 1
+            WHERE id = (SELECT report_id FROM jobs WHERE id = ? AND lease_owner = ? AND status = 'running')
+        ''', (progress, partial_content, job_id, worker_id))
+        return cursor.rowcount == 1
+
+def get_report_progress(report_id):
+    """Status and live progress of a report, for the report page's event stream. None if it doesn't exist."""
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT status, progress, partial_content, content, progress_seq FROM reports WHERE id = ?
+        ''', (report_id,)).fetchone()
+    return dict(row) if row else None
+
+def fail_job(job_id, worker_id, error_message, retry_base_seconds):
+    """
+    Records a failed attempt. If attempts are left, the job goes back to the queue with
+    exponential backoff and its report returns to 'queued'; otherwise both are marked 'failed'.
+    Returns True if the job will be retried.
+    """
+    with transaction(immediate=True) as conn:
+        job = conn.execute("SELECT * FROM jobs WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                           (job_id, worker_id)).fetchone()
+        if job is None:
+            return False
+
+        will_retry = job['attempts'] < job['max_attempts']
+        if will_retry:
+            delay = retry_base_seconds * (2 ** (job['attempts'] - 1))
+            conn.execute('''
+                UPDATE jobs SET status = 'queued', available_at = ?, lease_owner = NULL, lease_expires_at = NULL, last_error = ?
+                WHERE id = ?
+            ''', (time.time() + delay, error_message, job_id))
+            conn.execute('''
+                UPDATE reports SET status = 'queued', progress = ?, partial_content = NULL, progress_seq = progress_seq + 1
+                WHERE id = ?
+            ''', (f"第 {job['attempts']} 次尝试失败，稍后重试", job['report_id']))
+        else:
+            conn.execute('''
+                UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL, last_error = ?
+                WHERE id = ?
+            ''', (error_message, job_id))
+            conn.execute('''
+                UPDATE reports SET status = 'failed', content = ?, progress = NULL, partial_content = NULL,
+                    progress_seq = progress_seq + 1
+                WHERE id = ?
+            ''', (error_message, job['report_id']))
+        return will_retry
+
+def recover_orphaned_jobs(max_attempts=3):
+    """
+    Run at startup. Puts jobs whose lease has expired back in the queue (or fails them, when they
+    have used up their attempts), and creates jobs for
+    'queued'/'running' reports left over from before the job queue existed, rebuilding their
+    payload from the subscription. Returns the number of recovered reports.
+    """
+    now = time.time()
+    with transaction(immediate=True) as conn:
+        abandoned = conn.execute('''
+            SELECT * FROM jobs WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts
+        ''', (now,)).fetchall()
+        for job in abandoned:
+            _abandon_job(conn, job)
+        cursor = conn.execute('''
+            UPDATE jobs SET status = 'queued', available_at = ?, lease_owner = NULL, lease_expires_at = NULL
+            WHERE status = 'running' AND lease_expires_at < ?
+        ''', (now, now))
+        recovered = cursor.rowcount
+        conn.execute('''
+            UPDATE reports SET status = 'queued'
+            WHERE status = 'running' AND id IN (SELECT report_id FROM jobs WHERE status = 'queued')
+        ''')
+
+        orphans = conn.execute('''
+            SELECT r.id, r.subscription_id, s.prompt
+            FROM reports r
+            JOIN subscriptions s ON s.id = r.subscription_id
+            LEFT JOIN jobs j ON j.report_id = r.id
+            WHERE r.status IN ('queued', 'running') AND j.id IS NULL
+        ''').fetchall()
+        for orphan in orphans:
+            news_urls = _news_source_targets(conn, orphan['subscription_id'])
+            payload = json.dumps({"prompt": orphan['prompt'], "news_urls": news_urls}, ensure_ascii=False)
+            conn.execute('INSERT INTO jobs (report_id, payload, max_attempts, available_at) VALUES (?, ?, ?, ?)',
+                         (orphan['id'], payload, max_attempts, now))
+            conn.execute("UPDATE reports SET status = 'queued' WHERE id = ?", (orphan['id'],))
+    return recovered + len(orphans)
+
+
+# --- Scheduling ---
+
+def enqueue_due_subscriptions(now, missed_run_policy='once', grace_seconds=300, max_attempts=3, max_depth=0):
+    """
+    Enqueues a report for every active subscription whose next_run_at has passed, and moves
+    next_run_at to the following day. Only due subscriptions are read (idx_subscriptions_next_run),
+    and everything happens in one write transaction, so concurrent schedulers cannot both fire a run.
+
+    A run more than `grace_seconds` late (e.g. the process was down) is handled by `missed_run_policy`:
+    'once' enqueues a single catch-up run for the most recent missed time, 'skip' drops it.
+    A subscription whose report is still queued or running gets no second one; the run is merged into it.
+    With `max_depth`, runs beyond that many queued scheduled jobs are deferred: the subscription stays due
+    (next_run_at is set to `now` once) and remembers the run in deferred_run_at, so a later call enqueues it
+    with its original scheduled_for and waiting for admission never counts as a missed run.
+    Returns the list of (report_id, subscription name, news_urls) that were enqueued.
+    """
+    now_text = now.strftime('%Y-%m-%d %H:%M:%S')
+    enqueued = []
+    with transaction(immediate=True) as conn:
+        depth = _queue_depth(conn, JOB_PRIORITY_SCHEDULED) if max_depth else 0
+        due = conn.execute('''
+            SELECT id, name, prompt, schedule_time, next_run_at, deferred_run_at FROM subscriptions
+            WHERE deleted_at IS NULL AND next_run_at <= ?
+            ORDER BY next_run_at
+        ''', (now_text,)).fetchall()
+        for sub in due:
+            next_run_at = next_occurrence(sub['schedule_time'], now)
+            scheduled_for = sub['deferred_run_at']
+            if scheduled_for is None:
+                scheduled_for = sub['next_run_at']
+                lateness = (now - datetime.strptime(scheduled_for, '%Y-%m-%d %H:%M:%S')).total_seconds()
+                if lateness > grace_seconds:
+                    if missed_run_policy == 'skip':
+                        print(f"Skipping missed run of subscription {sub['name']} scheduled for {scheduled_for}")
+                        conn.execute('UPDATE subscriptions SET next_run_at = ? WHERE id = ?', (next_run_at, sub['id']))
+                        continue
+                    # Catch up once, for the latest time the subscription should have run
+                    latest = datetime.strptime(next_run_at, '%Y-%m-%d %H:%M:%S') - timedelta(days=1)
+                    scheduled_for = latest.strftime('%Y-%m-%d %H:%M:%S')
+
+            if _active_job(conn, sub['id']) is not None:
+                print(f"Subscription {sub['name']} still has a report in the queue, merging its run scheduled for {scheduled_for}")
+                conn.execute('UPDATE subscriptions SET next_run_at = ?, deferred_run_at = NULL WHERE id = ?',
+                             (next_run_at, sub['id']))
+                continue
+            if max_depth and depth >= max_depth:
+                # Admission control: the queue is full, try again once it has drained
+                if sub['deferred_run_at'] is None:
+                    conn.execute('UPDATE subscriptions SET next_run_at = ?, deferred_run_at = ? WHERE id = ?',
+                                 (now_text, scheduled_for, sub['id']))
+                continue
+            conn.execute('UPDATE subscriptions SET next_run_at = ?, deferred_run_at = NULL WHERE id = ?',
+                         (next_run_at, sub['id']))
+            news_urls = _news_source_targets(conn, sub['id'])
+            report_id = _insert_report_job(conn, sub['id'], sub['prompt'], news_urls, max_attempts, scheduled_for)
+            if report_id is not None:
+                enqueued.append((report_id, sub['name'], news_urls))
+                depth += 1
+    return enqueued
+
+def get_next_run_at():
+    """Returns the earliest next_run_at of all active subscriptions as a datetime, or None."""
+    with connection() as conn:
+        row = conn.execute('SELECT MIN(next_run_at) FROM subscriptions WHERE deleted_at IS NULL').fetchone()
+    return datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') if row[0] else None
+
+
+def acquire_lease(name, holder, lease_seconds):
+    """
+    Takes or renews the lease `name` for `holder` until `lease_seconds` from now.
+    Succeeds when nobody holds the lease, when `holder` already holds it, or when the previous
+    holder let it expire. Returns True if `holder` holds the lease afterwards.
+    """
+    now = time.time()
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+        ''', (name, holder, now + lease_seconds, now))
+        return cursor.rowcount == 1
+
+def release_lease(name, holder):
+    """Gives up the lease `name` if `holder` still holds it, so another process can take it over right away."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+
+
+def save_report_spans(report_id, attempt, spans):
+    """Stores the spans of one report attempt (see metrics.SpanRecorder) in a single transaction."""
+    if not spans:
+        return
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO report_spans (report_id, attempt, stage, started_at, duration_seconds, attrs)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(report_id, attempt, span['stage'], span['started_at'], span['duration_seconds'],
+               json.dumps(span['attrs'], ensure_ascii=False)) for span in spans])
+
+def get_report_spans(report_id):
+    """All spans of a report, in the order they started."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT attempt, stage, started_at, duration_seconds, attrs FROM report_spans
+            WHERE report_id = ? ORDER BY attempt, started_at, id
+        ''', (report_id,)).fetchall()
+    spans = []
+    for row in rows:
+        span = dict(row)
+        span['attrs'] = json.loads(span['attrs']) if span['attrs'] else {}
+        spans.append(span)
+    return spans
+
+def get_job_counts():
+    """Number of jobs per status, plus how many queued jobs are runnable right now (queue depth)."""
+    with connection() as conn:
+        counts = {row['status']: row['count'] for row in conn.execute(
+            'SELECT status, COUNT(*) AS count FROM jobs GROUP BY status').fetchall()}
+        counts['runnable'] = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND available_at <= ?", (time.time(),)).fetchone()[0]
+    return counts
+
+def _parse_created_at(value):
+    # created_at is UTC from CURRENT_TIMESTAMP; shown in UTC+8 like the rest of the app
+    created_at = datetime.strptime(value.split('.')[0], '%Y-%m-%d %H:%M:%S')
+    return created_at.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=8)))
 
 def get_report_by_id(report_id):
-    """Retrieves a single report by its ID, joining with subscription name."""
-    conn = get_db()
-    row = conn.execute('SELECT r.*, s.name FROM reports r JOIN subscriptions s ON r.subscription_id = s.id WHERE r.id = ?', 
-                          (report_id,)).fetchone()
-    conn.close()
+    """Retrieves a single report by its ID, joining with subscription name. Archived content is decompressed."""
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT r.*, s.name, a.content AS archived_content FROM reports r
+            JOIN subscriptions s ON r.subscription_id = s.id
+            LEFT JOIN report_archive a ON a.report_id = r.id
+            WHERE r.id = ?
+        ''', (report_id,)).fetchone()
     
     if not row:
         return None
 
     report = dict(row) # Convert sqlite3.Row to a mutable dictionary
+    archived_content = report.pop('archived_content')
+    report['archived'] = report['content'] is None and archived_content is not None
+    if report['archived']:
+        report['content'] = zlib.decompress(archived_content).decode('utf-8')
     if report['created_at']:
         # Parse 'created_at' timestamp, handling potential fractional seconds
         report['created_at'] = datetime.strptime(report['created_at'].split('.')[0], '%Y-%m-%d %H:%M:%S')
@@ -239,6 +984,113 @@ def get_report_by_id(report_id):
         
     return report
 
+def get_report_history(subscription_id, before=None, limit=20):
+    """
+    One page of a subscription's reports, newest first, without their content.
+    Keyset pagination: pass the returned `next_before` as `before` for the next page, so every page
+    is a seek on idx_reports_subscription_id no matter how deep into the history it is.
+    Returns (reports, next_before), next_before is None on the last page.
+    """
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT id, status, created_at, scheduled_for, no_new_news FROM reports
+            WHERE subscription_id = ? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (subscription_id, before if before is not None else 2 ** 63 - 1, limit + 1)).fetchall()
+    reports = [dict(row) for row in rows[:limit]]
+    for report in reports:
+        report['created_at'] = _parse_created_at(report['created_at'])
+    next_before = reports[-1]['id'] if len(rows) > limit else None
+    return reports, next_before
+
+def _fts_query(query):
+    # Every word of the query must appear; a word is matched as a phrase of its index terms,
+    # the last term as a prefix ('open' finds 'openai', a single Chinese character finds words starting with it)
+    phrases = []
+    for word in query.split():
+        terms = search_terms(word)
+        if terms:
+            phrases.append(f'"{terms}"*')
+    return ' AND '.join(phrases)
+
+def _snippet(content, query, width=60):
+    text = ' '.join(content.split())
+    lowered = text.lower()
+    positions = [lowered.find(word.lower()) for word in query.split()]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - width // 2) if positions else 0
+    return ('…' if start else '') + text[start:start + width * 2] + ('…' if start + width * 2 < len(text) else '')
+
+def search_reports(query, subscription_id=None, before=None, limit=20):
+    """
+    Full-text search over report content, archived reports included, newest first.
+    Optionally limited to one subscription; paginated like get_report_history.
+    Returns (results, next_before); each result has the report ID, status, creation time,
+    subscription name and a snippet of the content around the first match.
+    """
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return [], None
+    params = [fts_query, before if before is not None else 2 ** 63 - 1]
+    subscription_filter = ''
+    if subscription_id is not None:
+        subscription_filter = 'AND r.subscription_id = ?'
+        params.append(subscription_id)
+    params.append(limit + 1)
+    with connection() as conn:
+        rows = conn.execute(f'''
+            SELECT r.id, r.subscription_id, r.status, r.created_at, r.content, s.name, a.content AS archived_content
+            FROM reports_fts f
+            JOIN reports r ON r.id = f.rowid
+            JOIN subscriptions s ON s.id = r.subscription_id
+            LEFT JOIN report_archive a ON a.report_id = r.id
+            WHERE reports_fts MATCH ? AND f.rowid < ? {subscription_filter}
+            ORDER BY f.rowid DESC
+            LIMIT ?
+        ''', params).fetchall()
+    results = []
+    for row in rows[:limit]:
+        result = dict(row)
+        archived_content = result.pop('archived_content')
+        content = result.pop('content')
+        if content is None and archived_content is not None:
+            content = zlib.decompress(archived_content).decode('utf-8')
+        result['snippet'] = _snippet(content or '', query)
+        result['created_at'] = _parse_created_at(result['created_at'])
+        results.append(result)
+    next_before = results[-1]['id'] if len(rows) > limit else None
+    return results, next_before
+
+def archive_old_reports(retention_days, batch_size=200):
+    """
+    Moves the content of reports older than `retention_days` into report_archive, compressed
+    (only finished reports have content). Their rendered HTML is dropped and rendered again when viewed.
+    Works oldest first in small transactions, so it never holds the write lock for long.
+    Returns the number of reports archived.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    archived = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute('''
+                SELECT id, content FROM reports
+                WHERE content IS NOT NULL AND created_at < ?
+                ORDER BY created_at
+                LIMIT ?
+            ''', (cutoff, batch_size)).fetchall()
+        if not rows:
+            return archived
+        now = time.time()
+        compressed = [(row['id'], zlib.compress(row['content'].encode('utf-8'), 6), now) for row in rows]
+        with transaction(immediate=True) as conn:
+            conn.executemany('INSERT OR REPLACE INTO report_archive (report_id, content, archived_at) VALUES (?, ?, ?)',
+                             compressed)
+            # The ETag stays, so browsers can still revalidate an archived report without it being unpacked
+            conn.executemany('UPDATE reports SET content = NULL, content_html = NULL, partial_content = NULL WHERE id = ? AND content IS NOT NULL',
+                             [(row['id'],) for row in rows])
+        archived += len(rows)
+
 if __name__ == '__main__':
     # If this file is run directly, it will initialize the database.
     init_db()
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+class Throttled(Exception):
+    """A site answered 429 or 5xx: back off from its host before trying again."""
+
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f"{url} returned status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delay in seconds or an HTTP date), None if missing or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Host:
+    __slots__ = ('semaphore', 'lock', 'rate', 'tokens', 'refilled_at', 'blocked_until', 'backoff', 'active')
+
+    def __init__(self, max_concurrency, rate, burst):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.lock = asyncio.Lock() # Waiters for a token are served in arrival order
+        self.rate = rate
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = 0.0
+        self.active = 0
+
+
+class HostLimiter:
+    """
+    Politeness scheduler for page loads, one lane per host.
+
+    Each host gets at most `max_concurrency` loads at a time and a token bucket of `rate` loads per
+    second (bursts of up to `burst`). A load waits for its host's slot before it borrows a browser tab,
+    so a slow or throttled host only ever ties up its own few slots, while the tab pool keeps serving
+    other hosts in turn.
+
+    Backoff is adaptive (AIMD): a 429/5xx answer or an empty page blocks the host for a doubling
+    delay (at least the server's Retry-After) and halves its rate; every successful load shrinks the
+    delay and adds back a tenth of the configured rate.
+    """
+
+    def __init__(self, max_concurrency, rate, burst, max_backoff_seconds, min_backoff_seconds=1.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_backoff_seconds = max_backoff_seconds
+        self.min_backoff_seconds = min_backoff_seconds
+        self._hosts = {}
+        self.stats = {"throttled": 0, "waited_seconds": 0.0}
+
+    @staticmethod
+    def host_of(url):
+        return urlsplit(url).netloc.lower()
+
+    def _host(self, url):
+        host = self.host_of(url)
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.max_concurrency, self.rate, self.burst)
+        return state
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """
+        `async with host_limiter.slot(url):` waits until the URL's host may be loaded again,
+        holding one of its concurrency slots for the duration of the block. Yields the seconds waited.
+        """
+        state = self._host(url)
+        started = time.monotonic()
+        async with state.semaphore:
+            async with state.lock:
+                await self._take_token(state)
+            waited = time.monotonic() - started
+            self.stats['waited_seconds'] += waited
+            state.active += 1
+            try:
+                yield waited
+            finally:
+                state.active -= 1
+
+    async def _take_token(self, state):
+        while True:
+            now = time.monotonic()
+            if now < state.blocked_until:
+                await asyncio.sleep(state.blocked_until - now)
+                continue
+            if state.rate <= 0:
+                return # No rate limit, only the concurrency limit
+            state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * state.rate)
+            state.refilled_at = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return
+            await asyncio.sleep((1 - state.tokens) / state.rate)
+
+    def throttled(self, url, retry_after=None):
+        """The host pushed back (429/5xx or an empty page): block it for a while and slow it down."""
+        state = self._host(url)
+        state.backoff = min(self.max_backoff_seconds, max(self.min_backoff_seconds, state.backoff * 2))
+        delay = max(state.backoff, min(retry_after or 0, self.max_backoff_seconds))
+        state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+        if self.rate > 0:
+            state.rate = max(self.rate / 16, state.rate / 2)
+        state.tokens = 0
+        self.stats['throttled'] += 1
+        return delay
+
+    def succeeded(self, url):
+        state = self._host(url)
+        state.backoff = state.backoff / 2 if state.backoff >= self.min_backoff_seconds * 2 else 0.0
+        if self.rate > 0:
+            state.rate = min(self.rate, state.rate + self.rate / 10)
+
+    def snapshot(self):
+        """Hosts that are slowed down, blocked or busy right now, for monitoring."""
+        now = time.monotonic()
+        return {
+            host: {
+                "active": state.active,
+                "rate": round(state.rate, 3),
+                "backoff_seconds": round(state.backoff, 3),
+                "blocked_for_seconds": round(max(0.0, state.blocked_until - now), 3),
+            }
+            for host, state in self._hosts.items()
+            if state.active or state.backoff or state.rate < self.rate or state.blocked_until > now
+        }
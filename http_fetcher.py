@@ -0,0 +1,189 @@
+import re
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from host_limiter import Throttled, parse_retry_after
+
+# Browser-like headers; some news sites return a stripped page or 403 to unknown clients.
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+}
+
+# Containers typically used by client-side rendered apps, left empty in the server HTML.
+SPA_ROOT_IDS = {'app', 'root', '__next', '__nuxt'}
+
+# Page chrome; links inside are site navigation rather than news.
+NAV_TAGS = ('nav', 'header', 'footer', 'aside')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class PageParser(HTMLParser):
+    """
+    Streaming HTML parser: collects <a> links and <p> text as chunks are fed in,
+    so a page never has to be held in memory as a DOM tree.
+    """
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links = [] # [{"title": ..., "url": ...}]
+        self.paragraphs = []
+        self.body_text_chars = 0
+        self.has_spa_root = False
+        self.noscript_mentions_js = False
+        self.html = None # Raw page, only kept when fetch(keep_html=True)
+        self._skip_depth = 0 # Inside <script>/<style>
+        self._nav_depth = 0 # Inside <nav>/<header>/<footer>/<aside>
+        self._in_noscript = False
+        self._anchor_href = None
+        self._anchor_text = []
+        self._p_depth = 0
+        self._p_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'template'):
+            self._skip_depth += 1
+        elif tag == 'noscript':
+            self._in_noscript = True
+        elif tag in NAV_TAGS:
+            self._nav_depth += 1
+        elif tag == 'a':
+            href = dict(attrs).get('href')
+            self._anchor_href = href
+            self._anchor_text = []
+        elif tag == 'p':
+            self._p_depth += 1
+            if self._p_depth == 1:
+                self._p_text = []
+        elif tag == 'div' and dict(attrs).get('id') in SPA_ROOT_IDS:
+            self.has_spa_root = True
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'template'):
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'noscript':
+            self._in_noscript = False
+        elif tag in NAV_TAGS:
+            self._nav_depth = max(0, self._nav_depth - 1)
+        elif tag == 'a' and self._anchor_href is not None:
+            self._add_link(self._anchor_href, ''.join(self._anchor_text))
+            self._anchor_href = None
+        elif tag == 'p' and self._p_depth:
+            self._p_depth -= 1
+            if self._p_depth == 0:
+                text = _WHITESPACE.sub(' ', ''.join(self._p_text)).strip()
+                if text:
+                    self.paragraphs.append(text)
+
+    def handle_data(self, data):
+        if self._in_noscript:
+            if 'javascript' in data.lower():
+                self.noscript_mentions_js = True
+            return
+        if self._skip_depth:
+            return
+        self.body_text_chars += len(data.strip())
+        if self._anchor_href is not None:
+            self._anchor_text.append(data)
+        if self._p_depth:
+            self._p_text.append(data)
+
+    def _add_link(self, href, text):
+        href = href.strip()
+        if not href or href.startswith(('javascript:', 'mailto:', 'tel:', '#')):
+            return
+        link = {
+            "title": _WHITESPACE.sub(' ', text).strip(),
+            "url": urljoin(self.base_url, href),
+        }
+        if self._nav_depth:
+            link["nav"] = True # Dropped by link_ranker
+        self.links.append(link)
+
+
+class HttpFetcher:
+    """
+    Fast path for server-rendered news pages: one pooled keep-alive HTTP client with compression,
+    parsing the response while it streams in. Pages that look like they need JavaScript are reported
+    as such, and their host is remembered so later requests go straight to the browser.
+    """
+
+    def __init__(self, timeout, max_connections, max_page_bytes, min_links, min_content_chars,
+                 js_host_ttl_seconds=3600):
+        self.max_page_bytes = max_page_bytes
+        self.min_links = min_links
+        self.min_content_chars = min_content_chars
+        self.js_host_ttl_seconds = js_host_ttl_seconds
+        self._js_hosts = {} # (kind, host) -> time until which such pages go straight to the browser
+        self._client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def fetch(self, url, keep_html=False):
+        """
+        Downloads and parses a page. Returns a PageParser, or None if the response is not a usable
+        HTML page (error status, non-HTML content type). With keep_html the raw page is kept in `.html`.
+        Raises Throttled on 429 and 5xx answers.
+        """
+        async with self._client.stream('GET', url) as response:
+            if response.status_code == 429 or response.status_code >= 500:
+                # The site is rate limiting us or overloaded: the browser would fare no better
+                raise Throttled(url, response.status_code, parse_retry_after(response.headers.get('retry-after')))
+            if response.status_code != 200:
+                print(f"HTTP 抓取 {url} 返回状态码 {response.status_code}")
+                return None
+            if 'html' not in response.headers.get('content-type', 'text/html'):
+                return None
+            parser = PageParser(str(response.url))
+            received = 0
+            chunks = []
+            async for chunk in response.aiter_text():
+                parser.feed(chunk)
+                if keep_html:
+                    chunks.append(chunk)
+                received += len(chunk)
+                if received > self.max_page_bytes:
+                    break
+            parser.close()
+            if keep_html:
+                parser.html = ''.join(chunks)
+            return parser
+
+    def needs_browser(self, kind, page):
+        """Heuristic: does this HTTP result look incomplete compared to a rendered page?"""
+        if page is None:
+            return True
+        if page.has_spa_root and page.body_text_chars < self.min_content_chars:
+            return True
+        if page.noscript_mentions_js and page.body_text_chars < self.min_content_chars:
+            return True
+        if kind == 'links':
+            return sum(1 for link in page.links if len(link['title']) > 8 and not link.get('nav')) < self.min_links
+        return sum(len(p) for p in page.paragraphs) < self.min_content_chars
+
+    def is_js_host(self, kind, url):
+        """True if pages of this kind on this host recently needed the browser."""
+        key = (kind, urlsplit(url).netloc.lower())
+        until = self._js_hosts.get(key)
+        if until is None:
+            return False
+        if until < time.time():
+            del self._js_hosts[key]
+            return False
+        return True
+
+    def mark_js_host(self, kind, url):
+        self._js_hosts[(kind, urlsplit(url).netloc.lower())] = time.time() + self.js_host_ttl_seconds
+
+    async def aclose(self):
+        await self._client.aclose()
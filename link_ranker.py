@@ -0,0 +1,177 @@
+import json
+import math
+import re
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from page_cache import normalize_url
+
+# Anchor texts of site navigation, account and boilerplate links; never news.
+NAV_TITLES = {
+    '首页', '主页', '登录', '注册', '退出', '更多', '查看更多', '加载更多', '下一页', '上一页', '返回顶部',
+    '关于我们', '联系我们', '加入我们', '广告服务', '隐私政策', '用户协议', '服务条款', '版权声明', '网站地图',
+    '意见反馈', '帮助中心', '下载客户端', '下载app', '免责声明', '投诉举报', '商务合作',
+    'home', 'login', 'log in', 'sign in', 'sign up', 'register', 'more', 'next', 'previous',
+    'about', 'about us', 'contact', 'contact us', 'privacy policy', 'terms of service', 'sitemap',
+}
+
+# Path segments of channel, tag, account and utility pages.
+NAV_PATH_SEGMENTS = {
+    'login', 'signin', 'signup', 'register', 'account', 'user', 'users', 'search', 'tag', 'tags',
+    'category', 'categories', 'topic', 'topics', 'about', 'contact', 'help', 'privacy', 'terms',
+    'download', 'app', 'sitemap', 'feedback', 'author', 'authors',
+}
+
+# Second-level labels under which registrations happen one level deeper (news.sina.com.cn -> sina.com.cn).
+_SHARED_SLDS = {'com', 'net', 'org', 'gov', 'edu', 'co', 'ac'}
+
+FRESH_TITLE_HINTS = ('刚刚', '今日', '今天', '分钟前', '小时前', '最新', '快讯', 'breaking', 'live')
+
+_URL_DATE = re.compile(r'(20\d{2})[-/_]?([01]\d)[-/_]?([0-3]\d)')
+_ARTICLE_PATH = re.compile(r'\d{4,}|\.s?html?$|/(article|articles|news|p|detail|story|a)/')
+_CJK_RUN = re.compile(r'[一-鿿]+')
+_WORD = re.compile(r'[a-z0-9]{2,}')
+_CJK_CHAR = re.compile(r'[　-〿一-鿿＀-￯]')
+
+
+def site_of(url):
+    """Registrable domain of a URL, e.g. 'finance.sina.com.cn' -> 'sina.com.cn'."""
+    host = urlsplit(url).hostname or ''
+    labels = host.split('.')
+    if len(labels) >= 3 and labels[-2] in _SHARED_SLDS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def tokenize(text):
+    """Lower-cased latin words plus CJK character bigrams, enough for keyword overlap without a segmenter."""
+    text = (text or '').lower()
+    tokens = set(_WORD.findall(text))
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def estimate_tokens(text):
+    """Rough LLM token count: about one token per CJK character and per four other characters."""
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def dumps_compact(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def is_nav_link(link, source_url):
+    """Navigation, footer, account and channel links, as far as title, URL and page position tell."""
+    if link.get('nav'):
+        return True
+    title = (link.get('title') or '').strip().lower()
+    if title in NAV_TITLES:
+        return True
+    parts = urlsplit(link['url'])
+    segments = [segment for segment in parts.path.lower().split('/') if segment]
+    if not segments:
+        return True # Home page of some site
+    if NAV_PATH_SEGMENTS.intersection(segments):
+        return True
+    return normalize_url(link['url']) == normalize_url(source_url)
+
+
+def score_link(link, keyword_tokens, now):
+    """Higher is better: keyword overlap with the subscription prompt, recency hints and article-like URLs."""
+    title = link.get('title') or ''
+    url = link['url']
+    score = 0.0
+
+    if keyword_tokens:
+        score += 2.0 * min(len(keyword_tokens & tokenize(title)), 3)
+
+    match = _URL_DATE.search(urlsplit(url).path)
+    if match:
+        try:
+            age_days = (now - datetime(*map(int, match.groups()))).days
+        except ValueError:
+            age_days = None
+        if age_days is not None:
+            if age_days <= 1:
+                score += 2.0
+            elif age_days <= 3:
+                score += 1.0
+            elif age_days > 7:
+                score -= 2.0
+    if any(hint in title.lower() for hint in FRESH_TITLE_HINTS):
+        score += 1.0
+
+    if _ARTICLE_PATH.search(urlsplit(url).path.lower()):
+        score += 1.0
+    if 12 <= len(title) <= 80:
+        score += 0.5
+    return score
+
+
+def rank_links(links, source_url, keywords='', now=None):
+    """
+    Filters one source's links and orders them best first.
+
+    Links are deduped by canonical URL; navigation/footer links and links to other sites are dropped.
+    Ties keep page order, which usually follows prominence on the page.
+    """
+    now = now or datetime.now()
+    keyword_tokens = tokenize(keywords)
+    source_site = site_of(source_url)
+    seen = set()
+    scored = []
+    for position, link in enumerate(links):
+        url = link.get('url')
+        if not url or not url.startswith(('http://', 'https://')):
+            continue
+        canonical = normalize_url(url)
+        if canonical in seen:
+            continue
+        seen.add(canonical)
+        if site_of(url) != source_site or is_nav_link(link, source_url):
+            continue
+        scored.append((-score_link(link, keyword_tokens, now), position,
+                       {"title": (link.get('title') or '').strip(), "url": url}))
+    scored.sort(key=lambda item: item[:2])
+    return [link for _, _, link in scored]
+
+
+def fit_budget(ranked_by_source, token_budget, max_per_source=None):
+    """
+    Picks links round-robin across sources, best first, until the serialized size reaches `token_budget`,
+    so every source keeps its top stories. Also drops URLs already picked for an earlier source.
+    `ranked_by_source` is {source_url: ranked links}; the result has the same shape. A budget of 0 means no limit.
+    """
+    selected = {source: [] for source in ranked_by_source}
+    seen = set()
+    used = 2 # Surrounding brackets
+    depth = 0
+    while True:
+        progressed = False
+        for source, links in ranked_by_source.items():
+            if depth >= len(links) or (max_per_source and len(selected[source]) >= max_per_source):
+                continue
+            progressed = True
+            link = links[depth]
+            canonical = normalize_url(link['url'])
+            if canonical in seen:
+                continue
+            cost = estimate_tokens(dumps_compact(link)) + 1
+            if token_budget and used + cost > token_budget:
+                return selected
+            seen.add(canonical)
+            used += cost
+            selected[source].append(link)
+        if not progressed:
+            return selected
+        depth += 1
+
+
+def select_links(links_by_source, keywords='', token_budget=0, max_per_source=None, now=None):
+    """rank_links for every source, then fit_budget across them."""
+    ranked = {source: rank_links(links, source, keywords, now) for source, links in links_by_source.items()}
+    return fit_budget(ranked, token_budget, max_per_source)
@@ -0,0 +1,238 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from a cache hit up to a long agent run.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {} # tuple of label values -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+    def samples(self):
+        """(name, [(label, value), ...], value) for every series, in the text exposition format."""
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', labels + [('le', _format_value(float(bound)))], cumulative))
+            samples.append((f'{self.name}_bucket', labels + [('le', '+Inf')], count))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+
+class Registry:
+    """
+    A minimal Prometheus-style metrics registry. Collectors registered with add_collector are called
+    right before rendering, for values that are cheaper to read on demand (queue depth, cache sizes).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Content type of Registry.render() output
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the output
+
+
+def serve(port, host='0.0.0.0'):
+    """
+    Serves GET /metrics on a daemon thread, for processes without a Flask app (worker.py, report_scheduler.py).
+    Returns the server; it stops when the process exits.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+JOBS_ENQUEUED = REGISTRY.counter(
+    'news_jobs_enqueued_total', 'Report runs by priority class (manual/scheduled) and result (queued/merged/rejected).',
+    ('priority', 'result'))
+
+STAGE_SECONDS = REGISTRY.histogram('news_pipeline_stage_seconds', 'Duration of report pipeline stages.', ('stage',))
+
+
+# --- Per-report spans ---
+
+# The SpanRecorder of the report attempt running in the current task, if any
+current_spans = ContextVar('current_spans', default=None)
+
+
+class SpanRecorder:
+    """Spans of one report attempt, kept in memory and saved with the report when the attempt ends."""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, stage, started_at, duration, **attrs):
+        self.spans.append({
+            "stage": stage,
+            "started_at": started_at,
+            "duration_seconds": round(duration, 6),
+            "attrs": attrs,
+        })
+
+
+def record_span(stage, started_at, duration, **attrs):
+    """Observes the stage histogram and, inside a report attempt, adds a span to it."""
+    STAGE_SECONDS.observe(duration, stage=stage)
+    recorder = current_spans.get()
+    if recorder is not None:
+        recorder.record(stage, started_at, duration, **attrs)
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    `with span('db_write', op='complete_job') as attrs:` times the block as one span.
+    Attributes known only at the end (bytes, tokens) can be added to `attrs` inside the block.
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        record_span(stage, started_at, time.perf_counter() - started, **attrs)
@@ -1,49 +1,218 @@
 from pydantic_ai import Agent
 from pydantic_ai.mcp import MCPServerStreamableHTTP
+from pydantic_ai.messages import FunctionToolCallEvent, PartDeltaEvent, PartStartEvent, TextPart, TextPartDelta
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.profiles._json_schema import InlineDefsJsonSchemaTransformer
 from pydantic_ai.profiles.openai import OpenAIModelProfile
 from pydantic_ai.providers.openai import OpenAIProvider
 import asyncio
+import hashlib
 import json
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import httpx
 
 
 from datetime import datetime
 
-with open('config.json', 'r') as config_file:
-    config = json.load(config_file)
+import link_ranker
+import metrics
+from page_cache import normalize_url
+from settings import config
+from summary_cache import SummaryCache
+
+
+MCP_CALL_SECONDS = metrics.REGISTRY.histogram('news_mcp_call_seconds', 'MCP tool call latency.', ('tool',))
+MCP_RESPONSE_BYTES = metrics.REGISTRY.counter('news_mcp_response_bytes_total', 'Bytes returned by MCP tool calls.', ('tool',))
+LLM_TOKENS = metrics.REGISTRY.counter('news_llm_tokens_total', 'LLM tokens used, by kind (prompt/completion).', ('kind',))
+SUMMARY_CACHE = metrics.REGISTRY.counter(
+    'news_summary_cache_total', 'Article digests requested by the agent, by result (hit/shared/miss).', ('result',))
+NEW_LINKS = metrics.REGISTRY.counter(
+    'news_seen_links_total', 'Harvested links checked against the seen-articles index, by result (new/seen).', ('result',))
+AGENT_RUNTIME = metrics.REGISTRY.gauge(
+    'news_agent_runtime',
+    'Reused agent runtime: runs, cold_setup_seconds, setup_seconds_saved and open mcp_sessions, by stat.', ('stat',))
+LINK_HARVEST_SOURCES = metrics.REGISTRY.counter(
+    'news_link_harvest_sources_total',
+    'News sources requested from the link harvester, by result (cached/shared/fetched).', ('result',))
+
+
+class InstrumentedMCPServer(MCPServerStreamableHTTP):
+    """MCP 连接，每次工具调用都记录耗时、目标 URL 和返回的字节数（Agent 和链接采集阶段的调用都经过这里）。"""
+
+    async def call_tool(self, tool_name, arguments, metadata=None):
+        urls = arguments.get('urls')
+        url = arguments.get('url') or (', '.join(u.get('url', '') for u in urls if isinstance(u, dict)) if urls else '')
+        with metrics.span('mcp_tool', tool=tool_name, url=url) as attrs:
+            started = time.perf_counter()
+            try:
+                result = await super().call_tool(tool_name, arguments, metadata)
+            finally:
+                MCP_CALL_SECONDS.observe(time.perf_counter() - started, tool=tool_name)
+            size = len(result.encode('utf-8')) if isinstance(result, str) else len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+            attrs['bytes'] = size
+            MCP_RESPONSE_BYTES.inc(size, tool=tool_name)
+            seen = current_seen.get()
+            if seen is not None and tool_name == 'get_news_content' and isinstance(result, str) and url:
+                seen.read(url, _split_article(result)[1])
+            return result
+
 
-async def mcprun(question: str, news_urls: list = None) -> str: # Added news_urls parameter
+# 当前报告的 SeenArticles（增量模式下由 mcprun 设置），工具调用在同一上下文中运行，可以记录读过的文章
+current_seen = ContextVar('current_seen', default=None)
+
+
+class SeenArticles:
+    """
+    一个订阅的已读新闻索引在一次报告中的视图。known 来自数据库（{url_key: content_hash}），
+    filter() 去掉以前报告中已经出现过的链接，entries() 是报告完成后要写回索引的记录：
+    Agent 读过（或总结过）的文章及其内容哈希、报告中引用了的新链接，
+    以及仍出现在新闻源页面上的旧链接（刷新时间，避免按时间清理后又被当成新链接）。
+    交给 Agent 但既没有读也没有引用的链接不记录，下次报告仍会作为新链接提供。
     """
-    使用 Pydantic-AI Agent 运行 MCP 服务器并处理问题。
-    每次调用 agent 都会重新创建上下文，不保留历史（确保不传入旧的 message_history）
 
-    Args:
-        question (str): 需要 Agent 处理的问题。
-        news_urls (list): A list of URLs to fetch news from.
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self.known_content = {content_hash for content_hash in self.known.values() if content_hash}
+        self._entries = {} # url_key -> content_hash or None
+        self._offered = {} # url_key -> url，交给 Agent 的新链接
+        self.nothing_new = False # 所有新闻源都没有新链接，报告没有运行 Agent
 
-    Returns:
-        str: Agent 的处理结果。
+    @staticmethod
+    def url_key(url):
+        return hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=8).hexdigest()
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def filter(self, links):
+        """返回没有出现在以前报告中的链接。"""
+        new = []
+        for link in links:
+            key = self.url_key(link['url'])
+            if key in self.known:
+                self._entries.setdefault(key, None)
+            else:
+                new.append(link)
+        NEW_LINKS.inc(len(new), result='new')
+        NEW_LINKS.inc(len(links) - len(new), result='seen')
+        return new
+
+    def offer(self, links):
+        """记录交给 Agent 的新链接；只有被读过或在报告中引用的才会写回索引（见 entries()）。"""
+        for link in links:
+            self._offered.setdefault(self.url_key(link['url']), link['url'])
+
+    def read(self, url, text):
+        """记录 Agent 读过的文章及其内容哈希。"""
+        self._entries[self.url_key(url)] = self.content_hash(text)
+
+    def entries(self, report=None):
+        """要写回索引的 (url_key, content_hash) 记录；传入报告内容时，加上报告中引用了的新链接。"""
+        entries = dict(self._entries)
+        if report:
+            for key, url in self._offered.items():
+                if url in report:
+                    entries.setdefault(key, None)
+        return list(entries.items())
+
+
+class LinkHarvester:
+    """
+    新闻链接采集阶段：在 Agent 运行之前，每个新闻源的链接只抓取一次，结果在有效期内由所有使用该新闻源的报告共享。
+    同一时间到期的多个订阅引用同一个新闻源时，抓取工作量只与不同新闻源的数量有关，而不是订阅数 × 新闻源数。
     """
 
+    def __init__(self, mcp_session, ttl_seconds, max_links_per_source, token_budget):
+        self.mcp_session = mcp_session # 返回已连接 MCP 服务的异步上下文管理器
+        self.ttl_seconds = ttl_seconds
+        self.max_links_per_source = max_links_per_source
+        self.token_budget = token_budget
+        self._results = {} # url -> (fetched_at, links)
+        self._inflight = {} # url -> asyncio.Future
 
-    model = OpenAIModel(
-        config.get("llm_model_name"),
-        provider=OpenAIProvider(
-            base_url=config.get("base_url"),
-            api_key=config.get("api_key"),
-        ),
-        profile=OpenAIModelProfile(
-            json_schema_transformer=InlineDefsJsonSchemaTransformer,
-            openai_supports_strict_tool_definition=False
-        )
-    )
-    nowtime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    async def harvest(self, sources, keywords='', seen=None):
+        """
+        返回 {新闻源url: 链接列表}，链接按与 keywords（订阅的关键词）的相关度和时效性排序，并限制在 token 预算内。
+        共享的是未排序的原始链接，每个报告按自己的关键词筛选。有效期内的结果直接复用，正在抓取的新闻源等待同一次抓取，
+        其余新闻源在同一个 MCP 会话中并行抓取。抓取失败的新闻源不出现在结果中。
+        传入 seen（SeenArticles）时，先去掉订阅以前已经看过的链接再排序和截断，token 预算只花在新链接上。
+        """
+        now = time.time()
+        pending = {}
+        missing = []
+        for source in sources:
+            url = source['url']
+            if url in pending:
+                continue
+            cached = self._results.get(url)
+            if cached is not None and now - cached[0] <= self.ttl_seconds:
+                pending[url] = cached[1]
+                LINK_HARVEST_SOURCES.inc(result='cached')
+            elif url in self._inflight:
+                pending[url] = self._inflight[url]
+                LINK_HARVEST_SOURCES.inc(result='shared')
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[url] = pending[url] = future
+                missing.append(source)
+                LINK_HARVEST_SOURCES.inc(result='fetched')
+
+        with metrics.span('link_harvest', sources=len(pending), fetched=len(missing)) as attrs:
+            if missing:
+                await self._fetch(missing)
+
+            harvested = {}
+            for url, value in pending.items():
+                links = await asyncio.shield(value) if isinstance(value, asyncio.Future) else value
+                if links:
+                    harvested[url] = seen.filter(links) if seen is not None else links
+            selected = link_ranker.select_links(harvested, keywords, self.token_budget, self.max_links_per_source)
+            attrs['links'] = sum(len(links) for links in selected.values())
+            if seen is not None:
+                seen.offer([link for links in selected.values() for link in links])
+            return selected
+
+    async def _fetch(self, sources):
+        async def fetch_one(server, source):
+            try:
+                # max_tokens=0：只过滤导航/站外链接，不截断，按关键词排序和截断在报告各自的 harvest() 中进行
+                result = await server.call_tool('get_news_links', {'urls': [source], 'max_tokens': 0})
+                links = result if isinstance(result, list) else []
+            except Exception as e:
+                print(f"采集新闻源 {source['url']} 的链接失败：{e}")
+                links = []
+            if links:
+                self._results[source['url']] = (time.time(), links)
+            self._inflight.pop(source['url']).set_result(links)
+
+        try:
+            async with self.mcp_session() as server:
+                await asyncio.gather(*(fetch_one(server, source) for source in sources))
+        except Exception as e:
+            print(f"连接 MCP 服务采集链接失败：{e}")
+        finally:
+            # 连接失败或被取消时，让等待同一新闻源的其他报告拿到空结果，而不是一直等待
+            for source in sources:
+                future = self._inflight.pop(source['url'], None)
+                if future is not None and not future.done():
+                    future.set_result([])
 
 
+def build_system_prompt(links_harvested):
+    """生成系统提示词。链接已由采集阶段给出时，提示 Agent 不必再获取链接。"""
+    nowtime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if links_harvested:
+        first_step = "新闻链接已经在用户消息中给出，不需要再调用工具获取新闻链接。"
+    else:
+        first_step = "首先，你需要调用工具获取所有的新闻链接。"
+
     systemprompt = f'''
     你是一个新闻整理助手，可以精准调用mcp工具，获取并整理用户所关心的新闻内容。现在的时间是{nowtime}
-    首先，你需要调用工具获取所有的新闻链接。
+    {first_step}
     用户会输出一些关键词，这些代表了用户所关心的内容。
     你需要整理出【头条新闻】（你认为最重要、所有人都特别关心的新闻、链接和500字简介）和【特别关注】（用户输入的关键词相关的新闻、链接和简介），今日总结（给所有你今天读过的新闻做一个1000字左右的总评）三个项目。
     根据整理需求，查询相关新闻详情，最后进行整理。总共列出5条左右不重复的新闻，按重要程度排序。尽可能每个输入的主域名都有新闻。
@@ -89,28 +258,382 @@ async def mcprun(question: str, news_urls: list = None) -> str: # Added news_url
 
     ==========================
     '''
+    return systemprompt
 
 
-    initial_message = f"{question}"
-    if news_urls:
-        initial_message += f"\n请从以下新闻源获取新闻：{news_urls}"
+async def _visible_tools(ctx, tool_defs):
+    hidden = set()
+    # 链接已经采集好时不再向模型提供 get_news_links，避免重复抓取并节省输入 token
+    if ctx.deps and ctx.deps.get('links_harvested'):
+        hidden.add('get_news_links')
+    # 启用摘要缓存时，模型通过 get_news_digest 读取新闻摘要，不再读取新闻全文
+    if config['summary_cache_enabled']:
+        hidden.add('get_news_content')
+    return [tool_def for tool_def in tool_defs if tool_def.name not in hidden]
+
+
+def build_summary_prompt():
+    return (f"你是一个新闻摘要助手。请用不超过{config['summary_max_chars']}字的中文概括用户给出的新闻正文，"
+            "保留事件主体、关键事实和数据、时间以及影响。只输出摘要，不要添加标题、评论或其他说明。")
+
 
-    server = MCPServerStreamableHTTP('http://127.0.0.1:9017/mcp')
-    agent = Agent(model,system_prompt=systemprompt, mcp_servers=[server])
+def _split_article(content):
+    """把 get_news_content 的结果拆成标题/发布时间行和正文。"""
+    lines = content.split('\n')
+    header = []
+    while lines and lines[0].startswith(('标题：', '发布时间：')):
+        header.append(lines.pop(0))
+    return header, '\n'.join(lines)
+
+
+class _McpSession:
+    """
+    一个 MCP 会话及使用它的 Agent。会话必须在同一个任务中进入和退出，因此由一个专门的后台任务持有，直到 close()。
+    """
+
+    def __init__(self, mcp_server, agent):
+        self.mcp_server = mcp_server
+        self.agent = agent
+        self.active = 0 # 正在使用会话的报告/采集数
+        self.stale = False
+        self._task = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+
+    @property
+    def alive(self):
+        return not self.stale and self._task is not None and not self._task.done()
+
+    async def open(self):
+        self._task = asyncio.create_task(self._hold())
+        ready = asyncio.create_task(self._ready.wait())
+        await asyncio.wait({ready, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if self._task.done():
+            ready.cancel()
+            self._task.result() # 连接失败：抛出原始异常
+
+    async def _hold(self):
+        async with self.mcp_server:
+            self._ready.set()
+            await self._stop.wait()
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class AgentRuntime:
+    """
+    长期存活的 Agent 运行时：模型客户端（带连接池和 keep-alive 的 httpx 客户端）、MCP 会话和 Agent 只创建一次，
+    之后所有报告复用，不再为每个报告重新建立连接池、TLS 连接和 MCP 会话。每次运行仍然使用全新的消息历史。
+
+    使用会话时出错，会话就被标记为失效：之后的报告马上拿到新建的会话，旧会话等最后一个使用者归还后再关闭，
+    不会打断仍在使用它的报告，也不用等到完全没有报告在运行。
+
+    运行时与创建它的事件循环绑定；在另一个事件循环中使用时（例如多次 asyncio.run）会自动重建。
+    """
+
+    def __init__(self):
+        self.model = None
+        self.summary_agent = None
+        self.setup_seconds = None # 最近一次冷启动的初始化耗时
+        self.runs = 0
+        self.setup_seconds_saved = 0.0
+        self._http_client = None
+        self._loop = None
+        self._start_lock = None
+        self._current = None # 新的报告使用的会话
+        self._retiring = set() # 已失效、还有报告在使用的会话
+
+    async def _acquire(self):
+        """借出当前的 MCP 会话（首次使用、事件循环变化或会话失效时先建立新会话），返回 (会话, 是否冷启动)。"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._start_lock = asyncio.Lock()
+            self.model = None
+            self._current = None
+            self._retiring = set()
+        async with self._start_lock:
+            cold = False
+            started = time.perf_counter()
+            if self.model is None:
+                self._build_model()
+                cold = True
+            if self._current is None or not self._current.alive:
+                if self._current is not None:
+                    await self._retire(self._current)
+                session = self._new_session()
+                await session.open()
+                self._current = session
+                cold = True
+            if cold:
+                self.setup_seconds = time.perf_counter() - started
+                print(f"Agent 运行时初始化完成，耗时 {self.setup_seconds:.2f}s")
+            self._current.active += 1
+            return self._current, cold
+
+    async def _release(self, session):
+        session.active -= 1
+        if session.active == 0 and session in self._retiring:
+            self._retiring.discard(session)
+            await session.close()
+
+    async def _retire(self, session):
+        session.stale = True
+        if session.active:
+            self._retiring.add(session) # 最后一个使用者归还时关闭
+        else:
+            await session.close()
+
+    def _build_model(self):
+        # 一个共享的 httpx 客户端：连接池和 keep-alive 连接在报告之间复用
+        self._http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config['llm_timeout_seconds'], connect=10),
+            limits=httpx.Limits(max_connections=config['llm_max_connections'],
+                                max_keepalive_connections=config['llm_max_connections']),
+        )
+        self.model = OpenAIModel(
+            config.get("llm_model_name"),
+            provider=OpenAIProvider(
+                base_url=config.get("base_url"),
+                api_key=config.get("api_key"),
+                http_client=self._http_client,
+            ),
+            profile=OpenAIModelProfile(
+                json_schema_transformer=InlineDefsJsonSchemaTransformer,
+                openai_supports_strict_tool_definition=False
+            )
+        )
+        # 新闻摘要由单独的 Agent 生成：没有工具，也不带报告的消息历史，不依赖 MCP 会话
+        self.summary_agent = Agent(self.model, system_prompt=build_summary_prompt()) if config['summary_cache_enabled'] else None
+
+    def _new_session(self):
+        mcp_server = InstrumentedMCPServer(config['mcp_url'])
+        agent = Agent(self.model, mcp_servers=[mcp_server], prepare_tools=_visible_tools)
+
+        @agent.system_prompt
+        def system_prompt(ctx):
+            # 每次运行都重新生成，保证时间和首个步骤的说明是最新的
+            return build_system_prompt(bool(ctx.deps and ctx.deps.get('links_harvested')))
+
+        if config['summary_cache_enabled']:
+            @agent.tool_plain
+            async def get_news_digest(url: str, fetch_mode: str = None) -> str:
+                """获取新闻链接的内容摘要（包含标题、发布时间和要点）。
+
+                Args:
+                    url: 新闻链接
+                    fetch_mode: 新闻链接带有的 fetch_mode，没有时不传
+                """
+                return await self._news_digest(mcp_server, url, fetch_mode)
+
+        return _McpSession(mcp_server, agent)
+
+    async def _news_digest(self, mcp_server, url, fetch_mode=None):
+        arguments = {'url': url, 'fetch_mode': fetch_mode} if fetch_mode else {'url': url}
+        content = await mcp_server.call_tool('get_news_content', arguments)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        header, body = _split_article(content)
+        seen = current_seen.get()
+        if seen is not None and body and seen.content_hash(body) in seen.known_content:
+            # 内容与以前报告中读过的某篇文章相同（同一篇文章换了链接或被转载），不再总结
+            return '\n'.join(header + ['这篇新闻的内容已经在之前的报告中出现过，请不要重复报道。'])
+        if len(body) < config['summary_min_chars']:
+            # 正文很短（或获取失败）时直接返回，总结反而更贵
+            return content
+
+        async def summarize(text):
+            with metrics.span('llm_request', model=config.get('llm_model_name'), purpose='article_summary') as attrs:
+                result = await self.summary_agent.run(text)
+                usage = result.usage()
+                attrs['prompt_tokens'] = usage.request_tokens or 0
+                attrs['completion_tokens'] = usage.response_tokens or 0
+            LLM_TOKENS.inc(attrs['prompt_tokens'], kind='prompt')
+            LLM_TOKENS.inc(attrs['completion_tokens'], kind='completion')
+            return result.output.strip()
+
+        with metrics.span('article_summary', url=url) as attrs:
+            summary, result = await summary_cache.get_or_create(url, body, summarize)
+            attrs['result'] = result
+        SUMMARY_CACHE.inc(result=result)
+        return '\n'.join(header + [summary]) if summary else content
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        借用运行时，返回 (Agent, 是否冷启动)。借用期间使用的 MCP 会话不会被关闭；
+        借用中出错时会话被标记为失效，之后的借用者会拿到新会话。
+        """
+        session, cold = await self._acquire()
+        try:
+            yield session.agent, cold
+        except Exception:
+            session.stale = True
+            raise
+        finally:
+            await self._release(session)
+
+    @asynccontextmanager
+    async def mcp_session(self):
+        """借用持久的 MCP 会话（供链接采集阶段直接调用工具）。"""
+        session, cold = await self._acquire()
+        try:
+            yield session.mcp_server
+        except Exception:
+            session.stale = True
+            raise
+        finally:
+            await self._release(session)
+
+    def record_run(self, cold):
+        self.runs += 1
+        if not cold and self.setup_seconds:
+            self.setup_seconds_saved += self.setup_seconds
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "cold_setup_seconds": round(self.setup_seconds or 0.0, 4),
+            "setup_seconds_saved": round(self.setup_seconds_saved, 4),
+            "mcp_sessions": len(self._retiring) + (1 if self._current is not None and self._current.alive else 0),
+        }
+
+    async def close(self):
+        sessions = list(self._retiring) + ([self._current] if self._current is not None else [])
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self.model = None
+        self._current = None
+        self._retiring = set()
+
+
+agent_runtime = AgentRuntime()
+
+def collect_agent_metrics():
+    for stat, value in agent_runtime.stats().items():
+        AGENT_RUNTIME.set(value, stat=stat)
+
+metrics.REGISTRY.add_collector(collect_agent_metrics)
+
+summary_cache = SummaryCache(config['summary_cache_path'], config['summary_cache_ttl_seconds'],
+                             config['summary_cache_max_entries'])
+
+link_harvester = LinkHarvester(
+    agent_runtime.mcp_session,
+    config['link_harvest_ttl_seconds'],
+    config['link_harvest_max_links_per_source'],
+    config['link_token_budget'],
+)
+
+
+async def _stream_node(node, agent_run, progress):
+    """把一个 Agent 节点的模型输出文本增量和工具调用实时交给 progress。"""
+    if Agent.is_model_request_node(node):
+        progress.stage("模型正在生成")
+        progress.start_text() # 每次模型回复重新开始，最后一次回复就是报告正文
+        async with node.stream(agent_run.ctx) as request_stream:
+            async for event in request_stream:
+                if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                    progress.append_text(event.part.content)
+                elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                    progress.append_text(event.delta.content_delta)
+    elif Agent.is_call_tools_node(node):
+        async with node.stream(agent_run.ctx) as handle_stream:
+            async for event in handle_stream:
+                if isinstance(event, FunctionToolCallEvent):
+                    args = event.part.args_as_dict()
+                    target = args.get('url') or ', '.join(u.get('url', '') for u in args.get('urls') or [] if isinstance(u, dict))
+                    progress.stage(f"调用工具 {event.part.tool_name}" + (f"：{target}" if target else ''))
+
+
+def _record_llm_request(response, started_at, started):
+    usage = response.usage
+    prompt_tokens = usage.request_tokens or 0
+    completion_tokens = usage.response_tokens or 0
+    LLM_TOKENS.inc(prompt_tokens, kind='prompt')
+    LLM_TOKENS.inc(completion_tokens, kind='completion')
+    metrics.record_span('llm_request', started_at, time.perf_counter() - started, model=response.model_name,
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+async def mcprun(question: str, news_urls: list = None, progress=None, seen=None) -> str: # Added news_urls parameter
+    """
+    使用 Pydantic-AI Agent 运行 MCP 服务器并处理问题。
+    模型客户端、MCP 会话和 Agent 由 agent_runtime 复用；每次调用都会重新创建上下文，
+    不保留历史（确保不传入旧的 message_history）
+
+    Args:
+        question (str): 需要 Agent 处理的问题。
+        news_urls (list): The news sources to fetch news from, as {"url": ..., "fetch_mode": ...} dicts.
+        progress: 可选，接收实时进度的对象，需提供 stage(message)、start_text() 和 append_text(delta) 三个方法。
+            传入时模型输出按 token 流式返回，工具调用也会实时报告。
+        seen: 可选，订阅的 SeenArticles。传入时只把以前报告中没有出现过的新闻链接交给 Agent，
+            运行结束后由调用方通过 seen.entries(报告内容) 写回已读索引。没有新链接时不运行 Agent，
+            并设置 seen.nothing_new。
+
+    Returns:
+        str: Agent 的处理结果。
+    """
+    # 新闻源为 {"url": ..., "fetch_mode": ...} 字典，旧任务中可能仍是纯 URL 字符串
+    sources = [source if isinstance(source, dict) else {"url": source} for source in news_urls or []]
+
+    # 先统一采集新闻链接；所有新闻源都采集成功时，Agent 直接使用这些链接，不再调用 get_news_links
+    if progress is not None and sources:
+        progress.stage("正在采集新闻链接")
+    harvested = await link_harvester.harvest(sources, question, seen) if sources and config['link_harvest_enabled'] else {}
+    links_harvested = bool(sources) and all(source['url'] in harvested for source in sources)
+    if links_harvested and seen is not None and not any(harvested.values()):
+        # 增量模式下所有新闻源都没有新链接：不必运行 Agent
+        print("自上次报告以来没有新的新闻链接，跳过 Agent。")
+        seen.nothing_new = True
+        return "自上次报告以来，订阅的新闻源没有新的新闻。"
+
+    initial_message = f"{question}"
+    if links_harvested:
+        # 紧凑 JSON，减少输入 token
+        links_text = link_ranker.dumps_compact([{"source": url, "links": links} for url, links in harvested.items()])
+        initial_message += f"\n以下是各新闻源的新闻链接：{links_text}"
+    elif sources:
+        initial_message += (f"\n请从以下新闻源获取新闻（调用 get_news_links 时把我的关键词作为 keywords 传入）："
+                            f"{json.dumps(sources, ensure_ascii=False)}")
 
     nodes = []
+    seen_token = current_seen.set(seen)
     try:
-        async with agent.run_mcp_servers(): # 启动 MCP 服务
-            async with agent.iter(initial_message) as agent_run: # Pass initial_message
+        setup_started_at, setup_started = time.time(), time.perf_counter()
+        async with agent_runtime.session() as (agent, cold):
+            metrics.record_span('model_setup', setup_started_at, time.perf_counter() - setup_started, cold=cold)
+            if not cold and agent_runtime.setup_seconds:
+                print(f"复用 Agent 运行时，节省初始化约 {agent_runtime.setup_seconds:.2f}s")
+            async with agent.iter(initial_message, deps={"links_harvested": links_harvested}) as agent_run: # Pass initial_message
+                request_started = None
                 async for node in agent_run:
                     print(f"Agent Node: {node}")
                     nodes.append(node)
+                    if Agent.is_model_request_node(node):
+                        request_started = (time.time(), time.perf_counter())
+                    elif Agent.is_call_tools_node(node) and request_started is not None:
+                        # 从模型请求节点开始到得到模型回复，即一次 LLM 请求
+                        _record_llm_request(node.model_response, *request_started)
+                        request_started = None
+                    if progress is not None:
+                        await _stream_node(node, agent_run, progress)
                     #print(f"所有 Agent Nodes: {nodes}")
-            if hasattr(agent_run, 'result') and hasattr(agent_run.result, 'output'):
-                return agent_run.result.output
-            else:
-                print("Agent 运行结果或输出为空。")
-                return "未能获取 Agent 的响应。"
+            agent_runtime.record_run(cold)
+            usage = agent_run.usage()
+            print(f"本次报告共调用模型 {usage.requests} 次，输入 {usage.request_tokens or 0} tokens，输出 {usage.response_tokens or 0} tokens")
+        if hasattr(agent_run, 'result') and hasattr(agent_run.result, 'output'):
+            return agent_run.result.output
+        else:
+            print("Agent 运行结果或输出为空。")
+            return "未能获取 Agent 的响应。"
     except Exception as e:
+        # 向上抛出，由工作池决定重试或将报告标记为 failed；使用的 MCP 会话已被标记为失效，下一个报告重新建立
         print(f"运行 MCP Agent 时发生错误: {e}")
-        return f"运行 Agent 过程中发生错误: {str(e)}"
\ No newline at end of file
+        raise
+    finally:
+        current_seen.reset(seen_token)
@@ -1,7 +1,21 @@
 from DrissionPage import Chromium,ChromiumOptions
+import asyncio
 import time
 import json
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 from fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+import link_ranker
+import metrics
+from content_extractor import extract_article, format_article
+from host_limiter import HostLimiter, Throttled
+from http_fetcher import HttpFetcher
+from page_cache import PageCache
+from tab_pool import TabPool
+from settings import config
 
 
 
@@ -11,8 +25,155 @@ co = ChromiumOptions()
 #我用的是edge，如果想用别的浏览器，请改变这里的路径
 #co.set_browser_path('C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe')
 
-# 启动或接管浏览器，并获取标签页对象
-tab = Chromium(addr_or_opts=co).latest_tab
+# 启动或接管浏览器
+browser = Chromium(addr_or_opts=co)
+
+
+tab_pool = TabPool(browser, config['browser_tab_pool_size'], config['browser_tab_max_uses'])
+
+# 页面缓存：相同的新闻源/文章在有效期内直接返回缓存，不再打开浏览器
+page_cache = PageCache(
+    config['page_cache_path'],
+    config['page_cache_max_entries'],
+    {"links": config['links_cache_ttl_seconds'], "content": config['content_cache_ttl_seconds']},
+)
+
+# 轻量 HTTP 抓取：服务端渲染的页面不必打开浏览器
+http_fetcher = HttpFetcher(
+    config['http_timeout_seconds'],
+    config['http_max_connections'],
+    config['http_max_page_bytes'],
+    config['http_min_links'],
+    config['http_min_content_chars'],
+) if config['http_fetch_enabled'] else None
+
+# 按域名限流：每个域名的并发数和请求速率有上限，被限流（429/5xx）或拿到空页面时自动退避
+host_limiter = HostLimiter(
+    config['host_max_concurrency'],
+    config['host_requests_per_second'],
+    config['host_burst'],
+    config['host_backoff_max_seconds'],
+)
+
+# 监控指标，通过 /metrics 暴露。按域名统计抓取耗时，用来发现慢的新闻源
+FETCH_SECONDS = metrics.REGISTRY.histogram(
+    'news_browser_fetch_seconds', 'Page load and scrape time, by kind (links/content), method (http/browser) and host.',
+    ('kind', 'method', 'host'))
+FETCH_BYTES = metrics.REGISTRY.counter(
+    'news_browser_fetch_bytes_total', 'Characters of HTML downloaded over HTTP, by host.', ('host',))
+FETCH_ERRORS = metrics.REGISTRY.counter(
+    'news_browser_fetch_errors_total', 'Failed page loads, by method and host.', ('method', 'host'))
+PAGE_CACHE = metrics.REGISTRY.gauge('news_page_cache', 'Page cache counters and size, by event.', ('event',))
+PAGE_CACHE_HIT_RATIO = metrics.REGISTRY.gauge('news_page_cache_hit_ratio', 'Share of page cache lookups served from memory or disk.')
+TABS = metrics.REGISTRY.gauge('news_browser_tabs', 'Browser tabs in the pool, by state (open/idle/max).', ('state',))
+EXTRACT_SECONDS = metrics.REGISTRY.histogram(
+    'news_browser_extract_seconds', 'Time to read links or page HTML out of a loaded browser tab, by kind.', ('kind',))
+HOST_WAIT_SECONDS = metrics.REGISTRY.histogram(
+    'news_browser_host_wait_seconds', 'Time page loads waited for their host\'s rate limit, by host.', ('host',))
+HOST_THROTTLED = metrics.REGISTRY.counter(
+    'news_browser_host_throttled_total', 'Backoffs after 429/5xx answers or empty pages, by host and reason.',
+    ('host', 'reason'))
+
+def collect_browser_metrics():
+    snapshot = page_cache.snapshot()
+    PAGE_CACHE_HIT_RATIO.set(snapshot.pop('hit_rate'))
+    for event, value in snapshot.items():
+        PAGE_CACHE.set(value, event=event)
+    TABS.set(tab_pool._created, state='open')
+    TABS.set(tab_pool._idle.qsize(), state='idle')
+    TABS.set(tab_pool.size, state='max')
+
+metrics.REGISTRY.add_collector(collect_browser_metrics)
+
+# 新闻源在 news_sources 表中配置的抓取方式（'auto'/'http'/'browser'），随每次工具调用传入。
+# get_news_links 返回的链接带上该新闻源的 fetch_mode（'auto' 时省略），读取文章时原样传回 get_news_content
+FETCH_MODES = ('auto', 'http', 'browser')
+
+async def _scrape_with_tab(scrape, url):
+    """借用一个标签页，在线程中执行同步的抓取函数。请求被取消时标签页等抓取线程结束后丢弃，不放回池中。"""
+    return await tab_pool.run(scrape, url)
+
+@asynccontextmanager
+async def _host_slot(url):
+    """等待该域名的并发名额和速率令牌。先拿到名额再借标签页，慢的或被限流的域名不会占住整个标签页池。"""
+    async with host_limiter.slot(url) as waited:
+        if waited:
+            HOST_WAIT_SECONDS.observe(waited, host=host_limiter.host_of(url))
+        yield
+
+def _throttled(url, reason, retry_after=None):
+    delay = host_limiter.throttled(url, retry_after)
+    HOST_THROTTLED.inc(host=host_limiter.host_of(url), reason=reason)
+    return delay
+
+async def _timed(kind, method, url, load):
+    """执行一次页面加载并按新闻源域名记录耗时和失败次数。"""
+    host = urlsplit(url).netloc.lower()
+    started = time.perf_counter()
+    try:
+        return await load
+    except Exception:
+        FETCH_ERRORS.inc(method=method, host=host)
+        raise
+    finally:
+        FETCH_SECONDS.observe(time.perf_counter() - started, kind=kind, method=method, host=host)
+
+async def _load(kind, url, scrape, mode='auto'):
+    """
+    按域名限流、按 mode 指定的抓取方式加载页面。站点返回 429/5xx 时该域名进入退避，等待后最多重试 host_max_retries 次；
+    空页面（常见的软封禁）只触发退避，不重试。
+    """
+    retries = config['host_max_retries']
+    for attempt in range(retries + 1):
+        try:
+            result = await _load_once(kind, url, scrape, mode)
+        except Throttled as e:
+            delay = _throttled(url, str(e.status), e.retry_after)
+            if attempt == retries:
+                raise
+            print(f"{url} 返回状态码 {e.status}，{delay:.1f} 秒后重试")
+            continue
+        if result:
+            host_limiter.succeeded(url)
+        else:
+            _throttled(url, 'empty')
+        return result
+
+async def _load_once(kind, url, scrape, mode):
+    """
+    'auto' 先尝试 HTTP 抓取，页面需要 JavaScript 渲染时再回退到浏览器；'http' 只用 HTTP 抓取，
+    抓取失败时返回空结果，不打开浏览器；'browser' 直接使用浏览器。
+    kind 为 'links' 或 'content'，scrape 为对应的浏览器抓取函数。links 返回链接列表，content 返回页面 HTML。
+    """
+    if mode not in FETCH_MODES:
+        mode = 'auto'
+    if mode == 'http' and http_fetcher is None:
+        print(f"警告：{url} 的新闻源配置为只用 HTTP 抓取，但 http_fetch_enabled 已关闭")
+        return [] if kind == 'links' else ''
+    if http_fetcher is not None and mode != 'browser' and not (mode == 'auto' and http_fetcher.is_js_host(kind, url)):
+        try:
+            async with _host_slot(url):
+                page = await _timed(kind, 'http', url, http_fetcher.fetch(url, keep_html=(kind == 'content')))
+            if page is not None and page.html:
+                FETCH_BYTES.inc(len(page.html), host=urlsplit(url).netloc.lower())
+        except Throttled:
+            raise
+        except Exception as e:
+            print(f"HTTP 抓取 {url} 失败：{e}")
+            page = None
+        if page is not None and (mode == 'http' or not http_fetcher.needs_browser(kind, page)):
+            if kind == 'links':
+                #减少token占用，将标题设置为8个字符以上
+                return [link for link in page.links if len(link['title']) > 8]
+            return page.html
+        if mode == 'http':
+            # 该新闻源配置为只用 HTTP 抓取（例如浏览器会被拦截），不回退到浏览器
+            return [] if kind == 'links' else ''
+        if mode == 'auto':
+            # 记住该域名需要浏览器，之后直接使用浏览器抓取
+            http_fetcher.mark_js_host(kind, url)
+    async with _host_slot(url):
+        return await _timed(kind, 'browser', url, _scrape_with_tab(scrape, url))
 
 # 初始化FastMCP服务器
 mcp = FastMCP(name="dariy_news")
@@ -20,57 +181,127 @@ mcp = FastMCP(name="dariy_news")
 
 @mcp.tool(
     name="get_news_links",
-    description="""从新闻网站中，获取所有新闻的链接。
+    description="""从新闻网站中，获取新闻的链接。
 
     该工具需要一个URLs列表作为输入。每个URL都应包含在一个字典中，字典的键为'url'。
+    如果新闻源给出了'fetch_mode'，请原样传入。
+    请把用户关心的关键词作为 keywords 传入，返回的链接会按相关度和时效性排序，导航栏、页脚和站外链接已被去掉。
 
     输入示例:
     [
-        {"url": "https://36kr.com/information/AI/"},
+        {"url": "https://36kr.com/information/AI/", "fetch_mode": "auto"},
         {"url": "https://news.yiche.com/"}
     ]
     """,
 )
-async def get_news_links(urls: list = None): 
+async def get_news_links(urls: list = None, keywords: str = None, max_tokens: int = None):
     
     if urls is None:
         return json.dumps({"error": "No news URLs provided."}, ensure_ascii=False, indent=2)
     print(f"获取新闻链接：{urls}")
-    # 构建链接数据列表
+    # 所有新闻源同时抓取，总耗时约等于最慢的那个页面
+    results = await asyncio.gather(*(_fetch_links(url_dict) for url_dict in urls))
+    fetch_modes = {url_dict.get('url') or '': url_dict.get('fetch_mode') for url_dict in urls}
+
+    # 按新闻源去重、去掉导航/站外链接并排序，再在 token 预算内轮流从各新闻源挑选，保证每个新闻源都有新闻
+    links_by_source = {}
+    for url_dict, page_links in zip(urls, results):
+        links_by_source.setdefault(url_dict.get('url') or '', []).extend(page_links)
+    budget = config['link_token_budget'] if max_tokens is None else max_tokens
+    selected = link_ranker.select_links(links_by_source, keywords or '', budget)
+
+    # 构建链接数据列表（保持输入顺序），紧凑 JSON 以减少 token 占用
     links_data = []
-    for url_dict in urls:
-        try:    
-            url = url_dict.get('url') 
-            if url: 
-                tab.get(url)
-                titles = tab.eles('tag:a')
-                for title in titles:
-                    #减少token占用，将标题设置为8个字符以上
-                    if(len(title.text) > 8):
-                        links_data.append({
-                            "title": title.text,
-                            "url": title.link
-                        })
-            else:
-                print(f"警告：字典中未找到'url'键：{url_dict}")
-        except Exception as e:
-            print(f"错误：获取新闻链接时发生错误：{e}")
-    
-    # 将列表转换为JSON格式
-    return json.dumps(links_data, ensure_ascii=False, indent=2)
+    for source, page_links in selected.items():
+        mode = fetch_modes.get(source)
+        if mode in FETCH_MODES and mode != 'auto':
+            page_links = [dict(link, fetch_mode=mode) for link in page_links]
+        links_data.extend(page_links)
+    return link_ranker.dumps_compact(links_data)
+
+async def _fetch_links(url_dict):
+    """借用一个标签页抓取单个新闻源的链接，出错时返回空列表。"""
+    try:    
+        url = url_dict.get('url') 
+        if url: 
+            mode = url_dict.get('fetch_mode') or 'auto'
+            return await page_cache.get_or_fetch('links', url, lambda: _load('links', url, _scrape_links, mode))
+        else:
+            print(f"警告：字典中未找到'url'键：{url_dict}")
+    except Exception as e:
+        print(f"错误：获取新闻链接时发生错误：{e}")
+    return []
+
+# 在页面内一次性收集所有链接，返回紧凑的 JSON 数组 [[标题, 绝对URL, 是否在导航/页眉/页脚/侧栏中], ...]。
+# 逐个读取元素的 text/link 时每次都是一次 CDP 往返，上千个链接要几秒；一次脚本调用只需几十毫秒。
+# 字段与 http_fetcher.PageParser 一致（nav 链接由 link_ranker 去掉），两种抓取方式的结果排序方式相同。
+LINKS_SCRIPT = """
+const nav = 'nav, header, footer, aside';
+const links = [];
+for (const a of document.querySelectorAll('a[href]')) {
+    const title = (a.textContent || '').replace(/\\s+/g, ' ').trim();
+    // 减少token占用，将标题设置为8个字符以上
+    if (title.length <= 8 || !/^https?:/i.test(a.href)) continue;
+    links.push(a.closest(nav) ? [title, a.href, 1] : [title, a.href]);
+}
+return JSON.stringify(links);
+"""
+
+# 正文页面：在页面内复制 DOM，去掉脚本、样式、SVG 等不含正文的节点后一次性返回 HTML，
+# 传输和 extract_article 解析的数据量都小得多。保留 ld+json，发布时间可能写在里面。
+CONTENT_SCRIPT = """
+const root = document.documentElement.cloneNode(true);
+for (const node of root.querySelectorAll('script:not([type="application/ld+json"]), style, noscript, template, svg, iframe, link')) {
+    node.remove();
+}
+return root.outerHTML;
+"""
+
+def _scrape_links(tab, url):
+    tab.get(url)
+    started = time.perf_counter()
+    rows = json.loads(tab.run_js(LINKS_SCRIPT) or '[]')
+    EXTRACT_SECONDS.observe(time.perf_counter() - started, kind='links')
+    links_data = []
+    for row in rows:
+        link = {"title": row[0], "url": row[1]}
+        if len(row) > 2:
+            link["nav"] = True
+        links_data.append(link)
+    return links_data
 
 # 获取新闻内容的mcp服务
 @mcp.tool(
     name="get_news_content",
-    description="获取输入新闻链接的新闻内容",
+    description="获取输入新闻链接的新闻内容。如果 get_news_links 返回的链接带有 fetch_mode，请原样传入。",
 )
-async def get_news_content(url: str):
+async def get_news_content(url: str, fetch_mode: str = None):
+    article = await page_cache.get_or_fetch('content', url, lambda: _load_article(url, fetch_mode or 'auto'))
+    return format_article(article) if article else ''
+
+async def _load_article(url, mode='auto'):
+    """下载页面并提取正文（标题、发布时间、去掉评论/推荐等内容的正文），没有正文时返回 None，不写入缓存。"""
+    html = await _load('content', url, _scrape_html, mode)
+    # 正文提取是 CPU 密集的解析，放到线程中执行，不阻塞 MCP 事件循环；缓存中只保存提取结果
+    article = await asyncio.to_thread(extract_article, html, config['content_max_chars'])
+    return article if article['text'] else None
+
+def _scrape_html(tab, url):
     tab.get(url)
-    news_text=''
-    contents = tab.eles('tag:p')
-    for content in contents:
-        news_text += content.text
-    return news_text
+    started = time.perf_counter()
+    html = tab.run_js(CONTENT_SCRIPT) or ''
+    EXTRACT_SECONDS.observe(time.perf_counter() - started, kind='content')
+    return html
+
+# 缓存命中/未命中/淘汰计数，供监控查看（不作为 MCP 工具暴露给模型）
+@mcp.custom_route("/cache_stats", methods=["GET"])
+async def cache_stats(request: Request):
+    return JSONResponse(dict(page_cache.snapshot(), hosts=host_limiter.snapshot()))
+
+# Prometheus 格式的监控指标：缓存命中率、标签页使用情况、各新闻源的抓取耗时
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request):
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
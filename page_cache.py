@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from single_flight import SingleFlight
+
+# Query parameters that only track where a click came from; they never change the page content.
+# Whole families by prefix, the rest by exact name (so e.g. from_date or fromId are kept).
+TRACKING_PREFIXES = ('utm_', 'share_')
+TRACKING_PARAMS = {'spm', 'from', 'fbclid', 'gclid'}
+
+
+def _is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url):
+    """
+    Normalizes a URL so trivially different spellings of the same page share a cache entry:
+    lower-cased scheme and host, no fragment, no tracking parameters, sorted query, no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not _is_tracking_param(k)]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ''))
+
+
+class PageCache:
+    """
+    Two-level cache for scraped pages, shared by every MCP tool call in news_browser.py.
+
+    Entries are keyed by a hash of (kind, normalized URL). Each kind ('links', 'content')
+    has its own TTL. The first level is an in-memory LRU; the second is a SQLite file, so the
+    cache survives restarts of the browser service. Concurrent misses for the same key are
+    merged, so a page is only fetched once even if several agents ask for it at the same time.
+    """
+
+    def __init__(self, path, max_entries, ttls, max_disk_entries=None):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.max_disk_entries = max_disk_entries or self.max_entries * 10
+        self.ttls = ttls # {kind: seconds}
+        self._memory = OrderedDict() # key -> (fetched_at, value)
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self._puts = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                value TEXT NOT NULL, -- JSON encoded
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_page_cache_fetched_at ON page_cache (fetched_at)')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def make_key(kind, url):
+        return hashlib.sha1(f"{kind}\n{normalize_url(url)}".encode('utf-8')).hexdigest()
+
+    def get(self, kind, url):
+        """Returns the cached value, or None on a miss or when the entry is older than the kind's TTL."""
+        key = self.make_key(kind, url)
+        value = self._get_memory(key, self.ttls[kind])
+        if value is not None:
+            return value
+        return self._get_disk(key, self.ttls[kind])
+
+    def _get_memory(self, key, ttl):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if time.time() - entry[0] <= ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self.stats["expired"] += 1
+        return None
+
+    def _get_disk(self, key, ttl):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute('SELECT value, fetched_at FROM page_cache WHERE key = ? AND fetched_at >= ?',
+                           (key, now - ttl)).fetchone()
+        conn.close()
+        if row is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        value = json.loads(row[0])
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, row[1], value)
+        return value
+
+    def put(self, kind, url, value):
+        """Stores a value in memory and on disk."""
+        key = self.make_key(kind, url)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self._puts += 1
+            prune = self._puts % 100 == 0
+
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO page_cache (key, kind, url, value, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                     (key, kind, normalize_url(url), json.dumps(value, ensure_ascii=False), now))
+        if prune:
+            self._prune_disk(conn, now)
+        conn.commit()
+        conn.close()
+
+    async def get_or_fetch(self, kind, url, fetch):
+        """
+        Returns the cached value for `url`, or awaits `fetch()` and caches its result.
+        Empty results are returned but not cached, so a failed scrape is retried next time.
+        """
+        # Memory hits are answered on the event loop; the SQLite lookup runs in a thread, like put()
+        key = self.make_key(kind, url)
+        value = self._get_memory(key, self.ttls[kind])
+        if value is None:
+            value = await asyncio.to_thread(self._get_disk, key, self.ttls[kind])
+        if value is not None:
+            return value
+
+        async def fetch_and_store():
+            value = await fetch()
+            if value:
+                await asyncio.to_thread(self.put, kind, url, value)
+            return value
+
+        value, _ = await self._single_flight.run(key, fetch_and_store)
+        return value
+
+    def snapshot(self):
+        """Counters plus current sizes, for the /cache_stats endpoint."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, fetched_at, value):
+        # Caller holds self._lock
+        self._memory[key] = (fetched_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _prune_disk(self, conn, now):
+        # Drop entries that every kind would consider expired, then cap the table size.
+        conn.execute('DELETE FROM page_cache WHERE fetched_at < ?', (now - max(self.ttls.values()),))
+        conn.execute('''
+            DELETE FROM page_cache WHERE key IN (
+                SELECT key FROM page_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_disk_entries,))
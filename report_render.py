@@ -0,0 +1,18 @@
+import hashlib
+
+from markdown_it import MarkdownIt
+
+# CommonMark plus GFM tables and strikethrough, which is what the model writes and what marked renders in the browser.
+# html=False escapes any raw HTML in the model output, and markdown-it refuses javascript:, vbscript: and
+# non-image data: links, so the result is safe to insert into the page as it is.
+_markdown = MarkdownIt('commonmark', {'html': False}).enable(['table', 'strikethrough'])
+
+
+def render_report(content):
+    """Sanitized HTML of a report's Markdown. Rendered once when the report is completed, see database.complete_job."""
+    return _markdown.render(content or '')
+
+
+def html_etag(html):
+    """Strong validator of a rendered report, stored next to it so a revalidation never has to load the HTML."""
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
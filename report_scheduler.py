@@ -0,0 +1,162 @@
+"""
+Scheduler role: enqueues the reports of due subscriptions and archives old reports.
+
+    python report_scheduler.py
+
+Several scheduler processes (e.g. one per machine, for failover) can run against the same database:
+they elect a leader through the 'scheduler' lease in the `leases` table and only the leader schedules.
+app.py runs a scheduler in the web process as well, unless started with --roles.
+"""
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import database as db
+import metrics
+from settings import config
+
+LEASE_NAME = 'scheduler'
+
+LEADER = metrics.REGISTRY.gauge('news_scheduler_leader', '1 if this process is the scheduler leader, else 0.')
+
+
+class ReportScheduler:
+    """
+    Wakes up when the earliest subscription is due and enqueues every due report (schedule_daily_tasks),
+    on an APScheduler background thread.
+
+    Every `lease_seconds / 3` it takes or renews the scheduler lease in the database. Only the holder
+    arms the report and archive jobs; a standby takes over at most `lease_seconds` after the leader
+    stops renewing (or at once, when the leader shuts down cleanly). The lease is checked again right
+    before enqueueing, so a leader that stalled past its lease does not schedule next to its successor.
+    `on_enqueued(enqueued)` is called after each batch, e.g. to wake the workers of the same process.
+    """
+
+    def __init__(self, lease_seconds, on_enqueued=None):
+        self.lease_seconds = lease_seconds
+        self.on_enqueued = on_enqueued
+        # Unique per process, like the worker IDs
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.scheduler = BackgroundScheduler()
+
+    def start(self):
+        self.scheduler.start()
+        # max_instances=1: a renewal stuck on a locked database is never overtaken by the next one
+        self.scheduler.add_job(self._keep_lease, trigger='interval', seconds=max(1.0, self.lease_seconds / 3),
+                               id='scheduler_lease', next_run_time=datetime.now(), max_instances=1,
+                               replace_existing=True)
+
+    def shutdown(self):
+        """Stops the scheduler thread and hands the lease over to a standby right away."""
+        self.scheduler.shutdown(wait=False)
+        if self.is_leader:
+            self.is_leader = False
+            LEADER.set(0)
+            db.release_lease(LEASE_NAME, self.holder)
+
+    def _try_lease(self):
+        try:
+            return db.acquire_lease(LEASE_NAME, self.holder, self.lease_seconds)
+        except sqlite3.OperationalError as e:
+            print(f"Scheduler {self.holder} could not renew its lease: {e}")
+            return False
+
+    def _keep_lease(self):
+        if self._try_lease():
+            if not self.is_leader:
+                self.is_leader = True
+                LEADER.set(1)
+                print(f"Scheduler {self.holder} is now the leader.")
+                self.arm()
+                self.scheduler.add_job(self.archive_reports, trigger='interval', hours=6, id='archive_reports',
+                                       next_run_time=datetime.now() + timedelta(minutes=1), replace_existing=True)
+        elif self.is_leader:
+            self._step_down()
+
+    def _step_down(self):
+        self.is_leader = False
+        LEADER.set(0)
+        print(f"Scheduler {self.holder} lost the lease and stopped scheduling.")
+        for job_id in ('daily_news_job', 'archive_reports'):
+            try:
+                self.scheduler.remove_job(job_id)
+            except JobLookupError:
+                pass
+
+    def schedule_daily_tasks(self):
+        """
+        Enqueues a report for every subscription whose next run time has arrived, then re-arms itself
+        for the next one. Only due subscriptions are read, so the cost does not grow with the total
+        number of subscriptions. Runs missed while the scheduler was down are handled by `missed_run_policy`.
+        """
+        if not self._try_lease():
+            if self.is_leader:
+                self._step_down()
+            return
+        enqueued = db.enqueue_due_subscriptions(
+            datetime.now(),
+            config['missed_run_policy'],
+            config['missed_run_grace_seconds'],
+            config['job_max_attempts'],
+            config['job_queue_max_depth'],
+        )
+        for report_id, name, news_urls in enqueued:
+            print(f"Scheduling task for subscription: {name} (report ID: {report_id})")
+        metrics.JOBS_ENQUEUED.inc(len(enqueued), priority='scheduled', result='queued')
+        if enqueued and self.on_enqueued is not None:
+            self.on_enqueued(enqueued)
+        self.arm(config['job_queue_retry_seconds'])
+
+    def arm(self, deferred_retry_seconds=0):
+        """
+        Schedules schedule_daily_tasks to run when the earliest subscription is due (leader only).
+        It also wakes up at least every `scheduler_max_sleep_seconds`, to pick up changes made by other processes.
+        Right after a run, subscriptions that are still due were deferred by admission control;
+        `deferred_retry_seconds` is then how long the queue gets to drain before they are tried again.
+        """
+        if not self.is_leader:
+            return
+        now = datetime.now()
+        wake_at = now + timedelta(seconds=config['scheduler_max_sleep_seconds'])
+        next_run_at = db.get_next_run_at()
+        if next_run_at is not None and next_run_at <= now:
+            next_run_at = now + timedelta(seconds=deferred_retry_seconds)
+        if next_run_at is not None and next_run_at < wake_at:
+            wake_at = max(next_run_at, now)
+        # misfire_grace_time=None: if the process was too busy to wake up on time, still run as soon as possible
+        self.scheduler.add_job(self.schedule_daily_tasks, trigger='date', run_date=wake_at, id='daily_news_job',
+                               replace_existing=True, misfire_grace_time=None)
+
+    def archive_reports(self):
+        """Moves the content of reports older than `report_retention_days` to the compressed archive table."""
+        if not self.is_leader:
+            return
+        archived = db.archive_old_reports(config['report_retention_days'])
+        if archived:
+            print(f"Archived {archived} reports older than {config['report_retention_days']} days.")
+
+
+def main():
+    db.init_db()
+    report_scheduler = ReportScheduler(config['scheduler_lease_seconds'])
+    report_scheduler.start()
+    if config['scheduler_metrics_port']:
+        metrics.serve(config['scheduler_metrics_port'])
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        report_scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli # Optional: pip install Brotli enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+# Responses of these types are worth compressing; images and fonts already are
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                      'application/json', 'application/manifest+json'}
+# Below this size the compression headers cost about as much as they save
+MIN_COMPRESS_BYTES = 1024
+
+
+def best_encoding(accept_encodings):
+    """The content coding to use for a request's Accept-Encoding (werkzeug MIMEAccept-like object), or None."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class ResponseCache:
+    """
+    LRU of response bodies by strong ETag: the uncompressed body (encoding None) and its compressed variants.
+    A body with a strong ETag never changes, so a page is rendered and compressed once per process and
+    repeated loads cost a dictionary lookup.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict() # (etag, encoding) -> bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, etag, encoding=None):
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end((etag, encoding))
+            self.stats['hits'] += 1
+            return body
+
+    def put(self, etag, encoding, body):
+        with self._lock:
+            self._entries[(etag, encoding)] = body
+            self._entries.move_to_end((etag, encoding))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,73 @@
+import json
+import os
+
+# Path to the JSON config file. Can be overridden with NEWS_AGENT_CONFIG,
+# e.g. to point a second deployment at a different LLM endpoint.
+CONFIG_PATH = os.environ.get('NEWS_AGENT_CONFIG', 'config.json')
+
+# Default values for the optional tuning keys.
+# config.json only needs to provide the LLM settings; anything listed here can be overridden there.
+DEFAULTS = {
+    "mcp_url": "http://127.0.0.1:9017/mcp", # news_browser.py MCP endpoint
+    "llm_timeout_seconds": 300,   # Per LLM request
+    "llm_max_connections": 20,    # Keep-alive connection pool shared by all reports
+    "worker_concurrency": 4,      # Max number of reports generated at the same time
+    "job_timeout_seconds": 900,   # A single report attempt is cancelled after this long
+    "job_max_attempts": 3,        # Attempts per report before it is marked 'failed'
+    "job_retry_base_seconds": 30, # Retry backoff: base * 2^(attempt-1)
+    "job_lease_seconds": 60,      # A running job is picked up again if its worker stops renewing the lease
+    "job_poll_interval_seconds": 2, # How often idle workers check the jobs table for new work
+    "job_queue_max_depth": 200,   # Admission control, per class: more queued manual runs are rejected, scheduled runs wait
+    "job_queue_retry_seconds": 30, # How often scheduled runs waiting for admission are retried
+    "report_progress_interval_seconds": 1, # Live progress of a running report is saved and pushed at most this often
+    "response_cache_max_entries": 500, # Rendered report pages and compressed responses kept in memory per web process
+    "dashboard_poll_interval_seconds": 10, # How often an open dashboard checks /api/dashboard for status changes
+    "report_retention_days": 90,  # Older report content is moved to a compressed archive table (still viewable and searchable)
+    "report_history_page_size": 20, # Reports per page of a subscription's history and of search results
+    "missed_run_policy": "once",  # A run missed while the app was down: 'once' = catch up once, 'skip' = drop it
+    "missed_run_grace_seconds": 300, # A run at most this late counts as on time, not as missed
+    "scheduler_max_sleep_seconds": 300, # The scheduler wakes up at least this often to notice changes from other processes
+    "scheduler_lease_seconds": 30, # Only one scheduler process is leader; a standby takes over this long after it stops
+    "scheduler_metrics_port": 0,  # report_scheduler.py: serve /metrics on this port (0 = off)
+    "worker_metrics_port": 0,     # worker.py: serve /metrics on this port (0 = off)
+    "link_harvest_enabled": True, # Fetch each source's links once, before the agents run, and share them
+    "link_harvest_ttl_seconds": 1800, # How long harvested links are reused by other reports
+    "link_harvest_max_links_per_source": 150,
+    "link_token_budget": 3000,    # Max estimated prompt tokens spent on news links per report (0 = no limit)
+    "incremental_reports_enabled": True, # Only news a subscription's earlier reports haven't covered go to the agent
+    "seen_articles_max_age_days": 7, # News seen longer ago than this count as new again
+    "summary_cache_enabled": True, # The agent reads cached article digests (get_news_digest) instead of full articles
+    "summary_cache_path": "summary_cache.db", # On-disk store of article digests, shared by all reports
+    "summary_cache_ttl_seconds": 172800,
+    "summary_cache_max_entries": 20000, # Least recently used digests are evicted beyond this
+    "summary_max_chars": 400,     # Target length of one article digest
+    "summary_min_chars": 800,     # Shorter articles are returned as they are, without a digest
+    "browser_tab_pool_size": 4,   # news_browser.py: max browser tabs scraping at the same time
+    "browser_tab_max_uses": 50,   # news_browser.py: a tab is closed and recreated after this many page loads
+    "page_cache_path": "page_cache.db", # news_browser.py: on-disk store of the page cache
+    "page_cache_max_entries": 2000,     # news_browser.py: pages kept in the in-memory LRU
+    "links_cache_ttl_seconds": 600,     # Link listings of a news source change often
+    "content_cache_ttl_seconds": 86400, # Article bodies rarely change once published
+    "content_max_chars": 6000,          # get_news_content: article text is cut after this many characters (0 = no cap)
+    "host_max_concurrency": 2,         # news_browser.py: page loads of one news site at the same time
+    "host_requests_per_second": 2,     # Sustained page loads per second per site (0 = no rate limit)
+    "host_burst": 4,                   # Page loads a site may get in a burst before the rate applies
+    "host_backoff_max_seconds": 60,    # Upper bound of the backoff after 429/5xx answers or empty pages
+    "host_max_retries": 2,             # Retries of a page after a 429/5xx answer, each after the backoff
+    "http_fetch_enabled": True,         # news_browser.py: try a plain HTTP GET before opening the browser
+    "http_timeout_seconds": 10,
+    "http_max_connections": 20,         # Size of the keep-alive connection pool
+    "http_max_page_bytes": 3000000,     # Stop reading a page after this many characters
+    "http_min_links": 10,               # Fewer links than this and the page is assumed to need JavaScript
+    "http_min_content_chars": 200,      # Same for article text
+}
+
+def load_config(path=CONFIG_PATH):
+    """Loads config.json and fills in defaults for any missing optional keys."""
+    with open(path, 'r', encoding='utf-8') as config_file:
+        loaded = json.load(config_file)
+    merged = dict(DEFAULTS)
+    merged.update(loaded)
+    return merged
+
+config = load_config()
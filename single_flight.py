@@ -0,0 +1,36 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Merges concurrent calls for the same key: while `create()` runs for a key, other callers with that
+    key wait for its result instead of starting their own. Used by the page and summary caches so a page
+    is scraped, or an article summarized, once even when several reports ask for it at the same time.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._inflight = {} # key -> asyncio.Future
+
+    async def run(self, key, create):
+        """Awaits `create()` for `key`, or the call already running for it. Returns (value, shared)."""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await create()
+            future.set_result(value)
+            return value, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved to avoid "never retrieved" warnings.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+class SummaryCache:
+    """
+    Cache of LLM-written article digests, shared by every report.
+
+    Entries are keyed by a hash of the article text returned by get_news_content, so the same article
+    reached through different URLs (or several subscriptions) is summarized once, and an article whose
+    text changed gets a fresh digest. Entries expire after `ttl_seconds`; beyond `max_entries` the
+    least recently used are evicted. Concurrent misses for the same article are merged into one LLM call.
+    """
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self._puts = 0
+        self.stats = {"hits": 0, "misses": 0, "shared": 0}
+
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS article_summaries (
+                content_hash TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_article_summaries_last_used ON article_summaries (last_used_at)')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the digest, or None on a miss or when it is older than the TTL."""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute('SELECT summary FROM article_summaries WHERE content_hash = ? AND created_at >= ?',
+                           (key, now - self.ttl_seconds)).fetchone()
+        if row is not None:
+            # Recency for LRU eviction
+            conn.execute('UPDATE article_summaries SET last_used_at = ? WHERE content_hash = ?', (now, key))
+            conn.commit()
+        conn.close()
+        return row[0] if row else None
+
+    def put(self, key, url, summary):
+        now = time.time()
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 100 == 0
+        conn = self._connect()
+        conn.execute('''
+            INSERT OR REPLACE INTO article_summaries (content_hash, url, summary, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (key, url, summary, now, now))
+        if prune:
+            self._prune(conn, now)
+        conn.commit()
+        conn.close()
+
+    async def get_or_create(self, url, text, summarize):
+        """
+        Returns the cached digest of `text`, or awaits `summarize(text)` and caches its result.
+        Returns a (digest, result) tuple, where result is 'hit', 'shared' (waited for a concurrent
+        summary of the same article) or 'miss'. Empty digests are not cached.
+        """
+        key = self.content_hash(text)
+        summary = await asyncio.to_thread(self.get, key)
+        if summary is not None:
+            self._count('hits')
+            return summary, 'hit'
+
+        async def summarize_and_store():
+            self._count('misses')
+            summary = await summarize(text)
+            if summary:
+                await asyncio.to_thread(self.put, key, url, summary)
+            return summary
+
+        summary, shared = await self._single_flight.run(key, summarize_and_store)
+        if shared:
+            self._count('shared')
+            return summary, 'shared'
+        return summary, 'miss'
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _prune(self, conn, now):
+        conn.execute('DELETE FROM article_summaries WHERE created_at < ?', (now - self.ttl_seconds,))
+        conn.execute('''
+            DELETE FROM article_summaries WHERE content_hash IN (
+                SELECT content_hash FROM article_summaries ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
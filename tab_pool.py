@@ -0,0 +1,92 @@
+import asyncio
+
+
+class TabPool:
+    """
+    标签页池。每个标签页同一时间只借给一个调用方，多个 MCP 工具调用可以并行抓取而不会互相干扰页面。
+
+    - 最多同时借出 `size` 个标签页，由信号量控制；池满时调用方排队，每次归还或丢弃标签页都会放行一个等待者。
+    - 标签页按需创建。出错或已失效的标签页会被关闭，下一个借用者会拿到新建的标签页；
+      使用超过 `max_uses` 次的标签页也会被回收，避免内存持续增长。
+    - DrissionPage 是同步库，所有浏览器操作都放到线程中执行，不阻塞 MCP 事件循环（见 run()）。
+      调用方被取消或超时时线程无法中止，它借用的标签页不会再放回池中，而是等线程结束后关闭。
+    """
+
+    def __init__(self, browser, size, max_uses):
+        self.browser = browser
+        self.size = max(1, int(size))
+        self.max_uses = max_uses
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle = asyncio.Queue()
+        self._created = 0
+        self._uses = {}
+        self._orphans = set() # 调用方已取消、等线程结束后再丢弃标签页的任务
+
+    async def acquire(self):
+        """借出一个健康的标签页，没有空闲名额时等待。"""
+        await self._slots.acquire()
+        try:
+            while not self._idle.empty():
+                tab = self._idle.get_nowait()
+                if await asyncio.to_thread(self._is_healthy, tab):
+                    return tab
+                await self._discard(tab)
+            tab = await asyncio.to_thread(self.browser.new_tab)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._created += 1
+        self._uses[tab] = 0
+        return tab
+
+    async def release(self, tab, healthy=True):
+        """归还标签页。不健康或使用次数过多的标签页会被关闭，下次借用时重建。"""
+        try:
+            self._uses[tab] = self._uses.get(tab, 0) + 1
+            if healthy and self._uses[tab] < self.max_uses:
+                self._idle.put_nowait(tab)
+            else:
+                await self._discard(tab)
+        finally:
+            self._slots.release()
+
+    async def run(self, func, *args):
+        """
+        借用一个标签页，在线程中执行同步函数 func(tab, *args) 并返回其结果，出现异常时回收该标签页。
+        调用方被取消（包括 asyncio.wait_for 超时）时线程仍在操作这个标签页：标签页和它的名额
+        一直保留到线程结束，然后丢弃标签页，保证同一个标签页不会同时被两个抓取使用。
+        """
+        tab = await self.acquire()
+        thread = asyncio.ensure_future(asyncio.to_thread(func, tab, *args))
+        try:
+            result = await asyncio.shield(thread)
+        except asyncio.CancelledError:
+            thread.add_done_callback(lambda _: self._discard_orphan(tab, thread))
+            raise
+        except BaseException:
+            await self.release(tab, healthy=False)
+            raise
+        await self.release(tab)
+        return result
+
+    def _discard_orphan(self, tab, thread):
+        if not thread.cancelled():
+            thread.exception() # 结果已经没有人需要，取出异常以免 asyncio 报告未处理
+        task = asyncio.ensure_future(self.release(tab, healthy=False))
+        self._orphans.add(task)
+        task.add_done_callback(self._orphans.discard)
+
+    async def _discard(self, tab):
+        self._uses.pop(tab, None)
+        self._created -= 1
+        try:
+            await asyncio.to_thread(tab.close)
+        except Exception as e:
+            print(f"警告：关闭标签页失败：{e}")
+
+    @staticmethod
+    def _is_healthy(tab):
+        try:
+            return tab.states.is_alive
+        except Exception:
+            return False
@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, ROOT)
+
+# Keep the databases and caches created at import time out of the working directory
+_tmp = tempfile.mkdtemp(prefix='news-agent-tests-')
+with open(os.path.join(ROOT, 'config.json'), encoding='utf-8') as config_file:
+    _config = json.load(config_file)
+_config.update(summary_cache_path=os.path.join(_tmp, 'summary_cache.db'),
+               page_cache_path=os.path.join(_tmp, 'page_cache.db'))
+with open(os.path.join(_tmp, 'config.json'), 'w', encoding='utf-8') as config_file:
+    json.dump(_config, config_file)
+os.environ['NEWS_AGENT_CONFIG'] = os.path.join(_tmp, 'config.json')
+os.environ.setdefault('NEWS_AGENT_DB', os.path.join(_tmp, 'news_app.db'))
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """An empty, initialized database for one test."""
+    import database as db
+    monkeypatch.setattr(db, 'DATABASE', str(tmp_path / 'news_app.db'))
+    db.init_db()
+    return db
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import metrics
+import news_agent_client
+from news_agent_client import AgentRuntime, _McpSession
+
+
+class FakeMCPServer:
+    def __init__(self, number):
+        self.number = number
+        self.entered = False
+        self.exited = False
+
+    async def __aenter__(self):
+        self.entered = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.exited = True
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    runtime = AgentRuntime()
+    servers = []
+
+    def new_session():
+        server = FakeMCPServer(len(servers) + 1)
+        servers.append(server)
+        return _McpSession(server, agent=f"agent-{server.number}")
+
+    monkeypatch.setattr(runtime, '_build_model', lambda: setattr(runtime, 'model', object()))
+    monkeypatch.setattr(runtime, '_new_session', new_session)
+    runtime.servers = servers
+    return runtime
+
+
+def test_session_is_reused(runtime):
+    async def scenario():
+        async with runtime.session() as (first, cold):
+            assert cold
+        async with runtime.session() as (second, cold):
+            assert not cold
+        assert first == second == 'agent-1'
+        await runtime.close()
+        assert runtime.servers[0].exited
+
+    asyncio.run(scenario())
+
+
+def test_failed_session_is_replaced_while_still_borrowed(runtime):
+    async def scenario():
+        release_long_run = asyncio.Event()
+
+        async def long_run():
+            async with runtime.session() as (agent, cold):
+                await release_long_run.wait()
+                return agent
+
+        long_task = asyncio.create_task(long_run())
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            async with runtime.mcp_session():
+                raise RuntimeError("session terminated")
+
+        # New callers get a fresh session at once, although the broken one is still borrowed
+        async with runtime.session() as (agent, cold):
+            assert agent == 'agent-2' and cold
+        old, new = runtime.servers
+        assert not old.exited and new.entered
+        assert runtime.stats()['mcp_sessions'] == 2
+
+        # The broken session is closed when its last borrower returns it
+        release_long_run.set()
+        assert await long_task == 'agent-1'
+        assert old.exited and not new.exited
+        assert runtime.stats()['mcp_sessions'] == 1
+        await runtime.close()
+
+    asyncio.run(scenario())
+
+
+def test_runtime_stats_are_exported_as_metrics(runtime, monkeypatch):
+    async def scenario():
+        async with runtime.session() as (agent, cold):
+            runtime.record_run(cold)
+
+    asyncio.run(scenario())
+    monkeypatch.setattr(news_agent_client, 'agent_runtime', runtime)
+    text = metrics.REGISTRY.render()
+    assert 'news_agent_runtime{stat="runs"} 1' in text
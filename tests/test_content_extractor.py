@@ -0,0 +1,71 @@
+from content_extractor import TRUNCATED_MARK, extract_article
+
+PARAGRAPHS = [
+    '今天上午，市政府召开新闻发布会，介绍了今年城市更新工作的总体安排，涉及老旧小区改造、道路整治和公共空间建设等多个方面。',
+    '发布会上，相关负责人表示，改造工作将优先安排居民意愿强烈、基础设施老化严重的小区，并在施工期间尽量减少对居民生活的影响。',
+    '据介绍，全年计划完成改造的小区超过一百个，新增停车位、充电桩和养老服务设施，改造资金由财政补助和社会资本共同承担。',
+    '市民代表在会上提出，希望改造方案在公示阶段充分听取居民意见，并公开施工进度和资金使用情况，接受社会监督。',
+]
+
+
+def _page(head='', before='', after='', paragraphs=PARAGRAPHS):
+    body = ''.join(f'<p>{text}</p>' for text in paragraphs)
+    return (f'<html><head>{head}</head><body>{before}'
+            f'<div class="article-content">{body}</div>{after}</body></html>')
+
+
+def test_title_prefers_meta_then_h1_then_title_tag():
+    title_tag = '<title>城市更新全面提速 - 示例新闻网</title>'
+    og = '<meta property="og:title" content="OG 标题">'
+    h1 = '<h1>正文大标题</h1>'
+
+    assert extract_article(_page(head=og + title_tag, before=h1))['title'] == 'OG 标题'
+    assert extract_article(_page(head=title_tag, before=h1))['title'] == '正文大标题'
+    # The <title> loses its site-name suffix, unless the remaining headline is too short to be one
+    assert extract_article(_page(head=title_tag))['title'] == '城市更新全面提速'
+    assert extract_article(_page(head='<title>快讯 | 示例新闻网</title>'))['title'] == '快讯 | 示例新闻网'
+
+
+def test_published_time_from_meta_json_ld_time_and_text():
+    meta = '<meta property="article:published_time" content="2024-05-01T08:00:00+08:00">'
+    json_ld = '<script type="application/ld+json">{"@type": "NewsArticle", "datePublished": "2024-05-02T09:30:00Z"}</script>'
+    time_tag = '<time datetime="2024-05-03T10:00">5月3日</time>'
+
+    assert extract_article(_page(head=meta + json_ld, before=time_tag))['published'] == '2024-05-01T08:00:00+08:00'
+    assert extract_article(_page(head=json_ld, before=time_tag))['published'] == '2024-05-02T09:30:00Z'
+    assert extract_article(_page(before=time_tag))['published'] == '2024-05-03T10:00'
+    dated = ['2024年5月4日 14:20 来源：示例新闻网'] + PARAGRAPHS
+    assert extract_article(_page(paragraphs=dated))['published'] == '2024-05-04 14:20'
+    assert extract_article(_page())['published'] == ''
+
+
+def test_link_heavy_blocks_are_left_out():
+    # Teasers long and comma-rich enough to outscore the article if links weren't discounted
+    teasers = ''.join(f'<div><a href="/news/{i}">城市更新第{i}期工作会议召开，部署老旧小区改造、道路整治、公共空间建设等下一阶段重点任务</a></div>'
+                      for i in range(20))
+    link_list = f'<div class="list">{teasers}</div>'
+    # Mostly links inside the article container: dropped as a paragraph
+    linked_paragraph = '<p><a href="/a">更多报道</a>，<a href="/b">专题页面</a>，<a href="/c">往期回顾请点击这里查看</a></p>'
+
+    text = extract_article(_page(before=link_list, paragraphs=PARAGRAPHS + [linked_paragraph]))['text']
+    assert text == '\n'.join(PARAGRAPHS)
+
+
+def test_nav_and_boilerplate_subtrees_are_skipped():
+    nav = '<nav><a href="/">首页</a><a href="/news">新闻</a></nav>'
+    comments = '<div class="comment-list"><p>网友评论：这个改造计划很好，希望早日落实到我们小区，大家都很期待。</p></div>'
+    text = extract_article(_page(before=nav, after=comments))['text']
+    assert text == '\n'.join(PARAGRAPHS)
+
+
+def test_text_is_capped_at_whole_paragraphs():
+    paragraphs = ['甲' * 100, '乙' * 100, '丙' * 100]
+    # Two paragraphs and their separator use 202 characters; 48 left is too little for a useful cut
+    text = extract_article(_page(paragraphs=paragraphs), max_chars=250)['text']
+    assert text == '甲' * 100 + '\n' + '乙' * 100 + TRUNCATED_MARK
+    # With more room left the last paragraph is cut to fit
+    text = extract_article(_page(paragraphs=paragraphs), max_chars=270)['text']
+    assert text == '甲' * 100 + '\n' + '乙' * 100 + '\n' + '丙' * 68 + TRUNCATED_MARK
+    # No cap, or a cap the article fits in: no mark
+    assert extract_article(_page(paragraphs=paragraphs), max_chars=302)['text'] == '\n'.join(paragraphs)
+    assert extract_article(_page(paragraphs=paragraphs))['text'] == '\n'.join(paragraphs)
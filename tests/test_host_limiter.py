@@ -0,0 +1,158 @@
+import asyncio
+import types
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import host_limiter
+from host_limiter import HostLimiter, parse_retry_after
+
+URL = 'https://news.example.com/article/1'
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Stands in for the time module and asyncio.sleep: sleeping advances the clock instead of waiting."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+        await _real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(host_limiter, 'time', clock)
+    monkeypatch.setattr(host_limiter, 'asyncio', types.SimpleNamespace(
+        Semaphore=asyncio.Semaphore, Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+
+def _limiter(**kwargs):
+    options = dict(max_concurrency=2, rate=4, burst=1, max_backoff_seconds=60)
+    options.update(kwargs)
+    return HostLimiter(**options)
+
+
+async def _load(limiter, url=URL):
+    async with limiter.slot(url) as waited:
+        return waited
+
+
+def test_throttling_doubles_backoff_and_halves_rate_down_to_a_floor(clock):
+    limiter = _limiter()
+    assert [limiter.throttled(URL) for _ in range(4)] == [1.0, 2.0, 4.0, 8.0]
+    state = limiter._hosts['news.example.com']
+    assert state.rate == 0.25 # 4 / 16: never slower than a sixteenth of the configured rate
+    limiter.throttled(URL)
+    assert state.rate == 0.25
+    # Backoff stops growing at max_backoff_seconds
+    for _ in range(5):
+        limiter.throttled(URL)
+    assert state.backoff == 60
+
+
+def test_successes_shrink_backoff_and_add_back_rate(clock):
+    limiter = _limiter()
+    for _ in range(3):
+        limiter.throttled(URL)
+    state = limiter._hosts['news.example.com']
+    assert (state.backoff, state.rate) == (4.0, 0.5)
+
+    limiter.succeeded(URL)
+    assert state.backoff == 2.0 and state.rate == pytest.approx(0.9)
+    limiter.succeeded(URL)
+    assert state.backoff == 1.0
+    limiter.succeeded(URL)
+    assert state.backoff == 0.0 # Below twice the minimum: cleared rather than halved
+    for _ in range(10):
+        limiter.succeeded(URL)
+    assert state.rate == 4.0
+    assert limiter.snapshot()['news.example.com']['blocked_for_seconds'] == 4.0
+    clock.now += 4
+    assert limiter.snapshot() == {}
+
+
+def test_throttled_host_is_blocked_for_the_backoff(clock):
+    limiter = _limiter()
+
+    async def scenario():
+        assert await _load(limiter) == 0
+        limiter.throttled(URL)
+        waited = await _load(limiter)
+        # Blocked for the 1s backoff, during which the halved rate of 2/s refills a token
+        assert waited == 1.0
+        assert await _load(limiter) == pytest.approx(0.5)
+        # Another host is not held up
+        assert await _load(limiter, 'https://other.example.org/a') == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_sets_the_minimum_block(clock):
+    limiter = _limiter()
+    assert limiter.throttled(URL, retry_after=30) == 30
+    assert limiter.snapshot()['news.example.com']['blocked_for_seconds'] == 30
+    # Capped at max_backoff_seconds
+    assert limiter.throttled(URL, retry_after=3600) == 60
+
+    async def scenario():
+        return await _load(limiter)
+
+    assert asyncio.run(scenario()) == 60
+
+
+def test_parse_retry_after_seconds_and_http_date(clock):
+    assert parse_retry_after('120') == 120
+    date = format_datetime(datetime.fromtimestamp(clock.now + 90, timezone.utc), usegmt=True)
+    assert parse_retry_after(date) == pytest.approx(90)
+    assert parse_retry_after(format_datetime(datetime.fromtimestamp(clock.now - 90, timezone.utc), usegmt=True)) == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_token_bucket_spaces_out_loads(clock):
+    limiter = _limiter(rate=2, burst=1)
+
+    async def scenario():
+        return [await _load(limiter) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [0, pytest.approx(0.5), pytest.approx(0.5)]
+
+
+def test_concurrency_is_capped_per_host(clock):
+    limiter = _limiter(max_concurrency=2, rate=0)
+
+    async def scenario():
+        release = asyncio.Event()
+        peak = 0
+
+        async def load(url):
+            nonlocal peak
+            async with limiter.slot(url):
+                peak = max(peak, limiter._hosts[limiter.host_of(url)].active)
+                await release.wait()
+
+        tasks = [asyncio.create_task(load(URL)) for _ in range(3)]
+        other = asyncio.create_task(load('https://other.example.org/a'))
+        for _ in range(5):
+            await _real_sleep(0)
+        assert limiter.snapshot()['news.example.com']['active'] == 2
+        assert limiter.snapshot()['other.example.org']['active'] == 1
+        release.set()
+        await asyncio.gather(*tasks, other)
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+    assert limiter.snapshot() == {}
@@ -0,0 +1,160 @@
+import time
+from datetime import datetime, timedelta
+
+import database as db
+
+
+def _expire_lease(job_id):
+    with db.transaction() as conn:
+        conn.execute('UPDATE jobs SET lease_expires_at = ? WHERE id = ?', (time.time() - 1, job_id))
+
+
+def _job(job_id):
+    with db.connection() as conn:
+        return dict(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+
+def _subscription(name):
+    db.add_subscription(name, 'prompt', '08:00', [])
+    with db.connection() as conn:
+        return conn.execute('SELECT id FROM subscriptions WHERE name = ?', (name,)).fetchone()['id']
+
+
+def _enqueue(max_attempts, name='Test'):
+    subscription_id = _subscription(name)
+    report_id, result = db.enqueue_report_job(subscription_id, 'prompt', [], max_attempts=max_attempts)
+    assert result == 'queued'
+    return report_id
+
+
+def test_expired_job_is_reclaimed_while_attempts_are_left(fresh_db):
+    report_id = _enqueue(max_attempts=2)
+    job = db.claim_job('worker-1', lease_seconds=60)
+    assert job['attempts'] == 1
+    _expire_lease(job['id'])
+
+    reclaimed = db.claim_job('worker-2', lease_seconds=60)
+    assert reclaimed['id'] == job['id'] and reclaimed['attempts'] == 2
+    assert db.get_report_by_id(report_id)['status'] == 'running'
+
+
+def test_expired_job_without_attempts_left_is_abandoned(fresh_db):
+    report_id = _enqueue(max_attempts=1)
+    job = db.claim_job('worker-1', lease_seconds=60)
+    _expire_lease(job['id']) # The worker died without calling fail_job
+
+    assert db.claim_job('worker-2', lease_seconds=60) is None
+    abandoned = _job(job['id'])
+    assert abandoned['status'] == 'failed' and abandoned['attempts'] == 1
+    report = db.get_report_by_id(report_id)
+    assert report['status'] == 'failed'
+    assert '1 次尝试后被放弃' in report['content']
+
+
+def test_abandoned_job_does_not_block_the_next_one(fresh_db):
+    stuck_report = _enqueue(max_attempts=1)
+    stuck = db.claim_job('worker-1', lease_seconds=60)
+    _expire_lease(stuck['id'])
+    other_report = _enqueue(max_attempts=1, name='Other')
+
+    job = db.claim_job('worker-2', lease_seconds=60)
+    assert job['report_id'] == other_report
+    assert db.get_report_by_id(stuck_report)['status'] == 'failed'
+
+
+def test_recovery_at_startup_abandons_exhausted_jobs(fresh_db):
+    report_id = _enqueue(max_attempts=1)
+    job = db.claim_job('worker-1', lease_seconds=60)
+    _expire_lease(job['id'])
+
+    assert db.recover_orphaned_jobs() == 0
+    assert _job(job['id'])['status'] == 'failed'
+    assert db.get_report_by_id(report_id)['status'] == 'failed'
+    assert db.claim_job('worker-2', lease_seconds=60) is None
+
+
+def _set_next_run(subscription_id, next_run_at):
+    with db.transaction() as conn:
+        conn.execute('UPDATE subscriptions SET next_run_at = ? WHERE id = ?', (next_run_at, subscription_id))
+
+
+def _subscription_row(subscription_id):
+    with db.connection() as conn:
+        return dict(conn.execute('SELECT * FROM subscriptions WHERE id = ?', (subscription_id,)).fetchone())
+
+
+def _report_row(report_id):
+    with db.connection() as conn:
+        return dict(conn.execute('SELECT * FROM reports WHERE id = ?', (report_id,)).fetchone())
+
+
+def test_claim_job_prefers_manual_runs_then_oldest(fresh_db):
+    scheduled_old = _enqueue(max_attempts=1, name='Scheduled old')
+    scheduled_new = _enqueue(max_attempts=1, name='Scheduled new')
+    manual, result = db.enqueue_report_job(_subscription('Manual'), 'prompt', [],
+                                           priority=db.JOB_PRIORITY_MANUAL)
+    assert result == 'queued'
+
+    claimed = [db.claim_job(f'worker-{i}', lease_seconds=60)['report_id'] for i in range(3)]
+    assert claimed == [manual, scheduled_old, scheduled_new]
+
+
+def test_manual_run_merges_into_queued_report_and_raises_its_priority(fresh_db):
+    scheduled = _enqueue(max_attempts=1, name='Busy')
+    other = _enqueue(max_attempts=1, name='Other')
+    with db.connection() as conn:
+        busy_id = conn.execute("SELECT id FROM subscriptions WHERE name = 'Busy'").fetchone()['id']
+
+    report_id, result = db.enqueue_report_job(busy_id, 'prompt', [], priority=db.JOB_PRIORITY_MANUAL)
+    assert (report_id, result) == (scheduled, 'merged')
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM reports WHERE subscription_id = ?', (busy_id,)).fetchone()[0] == 1
+    # The merged run now jumps ahead of an older scheduled job
+    assert db.claim_job('worker-1', lease_seconds=60)['report_id'] == scheduled
+    assert db.claim_job('worker-2', lease_seconds=60)['report_id'] == other
+
+
+def test_manual_run_is_rejected_when_its_class_is_full(fresh_db):
+    first, result = db.enqueue_report_job(_subscription('A'), 'prompt', [], priority=db.JOB_PRIORITY_MANUAL,
+                                          max_depth=1)
+    assert result == 'queued'
+    assert db.enqueue_report_job(_subscription('B'), 'prompt', [], priority=db.JOB_PRIORITY_MANUAL,
+                                 max_depth=1) == (None, 'rejected')
+    # Scheduled jobs are counted separately
+    assert db.enqueue_report_job(_subscription('C'), 'prompt', [], max_depth=1)[1] == 'queued'
+
+
+def test_scheduled_run_is_deferred_and_later_admitted_with_its_slot(fresh_db):
+    now = datetime(2024, 5, 1, 8, 0, 30)
+    blocker = _enqueue(max_attempts=1, name='Blocker')
+    waiting = _subscription('Waiting')
+    _set_next_run(waiting, '2024-05-01 08:00:00')
+
+    assert db.enqueue_due_subscriptions(now, max_depth=1) == []
+    deferred = _subscription_row(waiting)
+    assert deferred['next_run_at'] == '2024-05-01 08:00:30'
+    assert deferred['deferred_run_at'] == '2024-05-01 08:00:00'
+
+    # Still full much later: neither rewritten nor treated as a missed run
+    later = now + timedelta(hours=1)
+    assert db.enqueue_due_subscriptions(later, missed_run_policy='skip', max_depth=1) == []
+    assert _subscription_row(waiting) == deferred
+
+    db.claim_job('worker-1', lease_seconds=60)
+    assert db.get_report_by_id(blocker)['status'] == 'running'
+    enqueued = db.enqueue_due_subscriptions(later, missed_run_policy='skip', max_depth=1)
+    assert len(enqueued) == 1
+    assert _report_row(enqueued[0][0])['scheduled_for'] == '2024-05-01 08:00:00'
+    admitted = _subscription_row(waiting)
+    assert admitted['next_run_at'] == '2024-05-02 08:00:00' and admitted['deferred_run_at'] is None
+
+
+def test_run_of_busy_subscription_is_merged_even_when_the_queue_is_full(fresh_db):
+    _enqueue(max_attempts=1, name='Busy')
+    with db.connection() as conn:
+        busy_id = conn.execute("SELECT id FROM subscriptions WHERE name = 'Busy'").fetchone()['id']
+    _set_next_run(busy_id, '2024-05-01 08:00:00')
+
+    assert db.enqueue_due_subscriptions(datetime(2024, 5, 1, 8, 0, 30), max_depth=1) == []
+    merged = _subscription_row(busy_id)
+    assert merged['next_run_at'] == '2024-05-02 08:00:00' and merged['deferred_run_at'] is None
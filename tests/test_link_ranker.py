@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import link_ranker
+from link_ranker import dumps_compact, estimate_tokens, fit_budget, rank_links, select_links, tokenize
+
+NOW = datetime(2024, 5, 2, 12, 0)
+
+
+def _link(path, title='A news story of ordinary length', host='https://news.example.com'):
+    return {'title': title, 'url': host + path}
+
+
+def _cost(link):
+    return estimate_tokens(dumps_compact(link)) + 1
+
+
+def test_tokenize_uses_cjk_bigrams_and_latin_words():
+    assert tokenize('人工智能 AI chips') == {'人工', '工智', '智能', 'ai', 'chips'}
+    assert tokenize('美') == {'美'}
+
+
+def test_cjk_keywords_match_titles_by_bigram():
+    links = [
+        _link('/article/1', '央行宣布降准释放流动性'),
+        _link('/article/2', '人工智能芯片出口新规出台'),
+        _link('/article/3', '本地天气预报：明日小雨'),
+    ]
+    ranked = rank_links(links, 'https://news.example.com/', '人工智能 芯片', NOW)
+    # No word segmentation: '人工智能' shares the bigrams 人工/工智/智能 with the title
+    assert ranked[0]['url'].endswith('/article/2')
+    # Without overlap the remaining links keep page order
+    assert [link['url'][-1] for link in ranked[1:]] == ['1', '3']
+
+
+def test_rank_drops_nav_offsite_and_duplicate_links():
+    links = [
+        _link('/article/1?utm_source=home'),
+        _link('/article/1'),
+        _link('/login', '登录'),
+        _link('/', '首页'),
+        _link('/article/2', host='https://other.org'),
+        _link('/article/3', host='https://finance.example.com'),
+        {'title': 'mail', 'url': 'mailto:news@example.com'},
+    ]
+    ranked = rank_links(links, 'https://news.example.com/', now=NOW)
+    assert [link['url'] for link in ranked] == [
+        'https://news.example.com/article/1?utm_source=home',
+        'https://finance.example.com/article/3',
+    ]
+
+
+def test_dated_urls_rank_fresh_first():
+    links = [_link('/2024/04/01/old'), _link('/2024/05/02/today'), _link('/2024/04/30/recent')]
+    ranked = rank_links(links, 'https://news.example.com/', now=NOW)
+    assert [link['url'].rsplit('/', 1)[1] for link in ranked] == ['today', 'recent', 'old']
+
+
+def test_budget_stops_at_the_first_link_that_does_not_fit():
+    ranked = {'https://a.example.com/': [_link(f'/article/a{i}', host='https://a.example.com') for i in range(3)],
+              'https://b.example.com/': [_link(f'/article/b{i}', host='https://b.example.com') for i in range(3)]}
+    # Room for the brackets and exactly three links, picked round-robin: a0, b0, a1
+    budget = 2 + sum(_cost(link) for link in (ranked['https://a.example.com/'][:2] + ranked['https://b.example.com/'][:1]))
+
+    selected = fit_budget(ranked, budget)
+    assert [link['url'][-2:] for link in selected['https://a.example.com/']] == ['a0', 'a1']
+    assert [link['url'][-2:] for link in selected['https://b.example.com/']] == ['b0']
+
+    # One token short and a1 no longer fits
+    selected = fit_budget(ranked, budget - 1)
+    assert sum(len(links) for links in selected.values()) == 2
+    # A budget of 0 is no limit, max_per_source still applies
+    selected = fit_budget(ranked, 0, max_per_source=2)
+    assert [len(links) for links in selected.values()] == [2, 2]
+
+
+def test_budget_offers_a_link_listed_by_two_sources_once():
+    shared = [_link(f'/article/{i}') for i in range(2)]
+    ranked = {'https://news.example.com/': shared, 'https://news.example.com/world': list(shared)}
+    selected = fit_budget(ranked, 0)
+    # The same story is offered only once, under the first source that listed it
+    assert selected['https://news.example.com/'] == shared
+    assert selected['https://news.example.com/world'] == []
+
+
+def test_select_links_dedupes_canonical_urls_across_sources():
+    links_by_source = {
+        'https://news.example.com/': [_link('/article/1'), _link('/article/2')],
+        'https://news.example.com/tech': [_link('/article/1?utm_medium=rss'), _link('/article/3')],
+    }
+    selected = select_links(links_by_source, now=NOW)
+    urls = [link['url'] for links in selected.values() for link in links]
+    assert len(urls) == 3
+    assert len({link_ranker.normalize_url(url) for url in urls}) == 3
+    assert [link['url'] for link in selected['https://news.example.com/tech']] == ['https://news.example.com/article/3']
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from page_cache import PageCache, normalize_url
+
+
+def _cache(tmp_path):
+    return PageCache(str(tmp_path / 'page_cache.db'), max_entries=10, ttls={'links': 60, 'content': 60})
+
+
+def test_disk_lookup_runs_off_the_event_loop(tmp_path):
+    _cache(tmp_path).put('content', 'https://example.com/a', 'cached article')
+    cache = _cache(tmp_path) # Empty memory: the value has to come from disk
+    lookup_threads = []
+    get_disk = cache._get_disk
+
+    def recording_get_disk(key, ttl):
+        lookup_threads.append(threading.current_thread())
+        return get_disk(key, ttl)
+
+    cache._get_disk = recording_get_disk
+
+    async def fetch():
+        raise AssertionError("should be served from the cache")
+
+    async def scenario():
+        first = await cache.get_or_fetch('content', 'https://example.com/a', fetch)
+        second = await cache.get_or_fetch('content', 'https://example.com/a', fetch)
+        return first, second
+
+    assert asyncio.run(scenario()) == ('cached article', 'cached article')
+    assert len(lookup_threads) == 1 # The second call is a memory hit
+    assert lookup_threads[0] is not threading.main_thread()
+    assert cache.stats['disk_hits'] == 1 and cache.stats['hits'] == 1
+
+
+def test_normalize_url_strips_only_tracking_params():
+    assert (normalize_url('HTTPS://News.Example.com/list/?page=2&utm_source=x&from=timeline&spm=a.b&fbclid=1#top')
+            == 'https://news.example.com/list?page=2')
+    assert normalize_url('https://example.com/a?share_token=abc&id=7') == 'https://example.com/a?id=7'
+    # Parameters that merely start like a tracking name select different pages
+    assert (normalize_url('https://example.com/list?from_date=2024-01-01&fromId=5')
+            == 'https://example.com/list?fromId=5&from_date=2024-01-01')
+    assert normalize_url('https://example.com/list?spmode=1') == 'https://example.com/list?spmode=1'
@@ -0,0 +1,121 @@
+import gzip
+
+import pytest
+
+import app as web
+from report_render import html_etag, render_report
+from response_cache import ResponseCache
+
+REPORT = "# 今日新闻\n\n**重要**：芯片产能提升。\n\n<script>alert('x')</script>\n\n[链接](javascript:alert(1))"
+
+
+@pytest.fixture
+def db(fresh_db, monkeypatch):
+    monkeypatch.setattr(web, 'page_cache', ResponseCache(50))
+    return fresh_db
+
+
+def get(path, **headers):
+    """Runs a request through the app, including after_request hooks."""
+    with web.app.test_request_context(path, headers=headers):
+        return web.app.full_dispatch_request()
+
+
+def _completed_report(db, content=REPORT):
+    db.add_subscription('Test', 'prompt', '08:00', [])
+    with db.connection() as conn:
+        subscription_id = conn.execute("SELECT id FROM subscriptions WHERE name = 'Test'").fetchone()['id']
+    report_id, _ = db.enqueue_report_job(subscription_id, 'prompt', [])
+    job = db.claim_job('worker-1', lease_seconds=60)
+    db.complete_job(job['id'], 'worker-1', content)
+    return report_id
+
+
+def test_markdown_is_rendered_without_raw_html_or_script_links():
+    html = render_report(REPORT)
+    assert '<h1>今日新闻</h1>' in html and '<strong>重要</strong>' in html
+    assert '<script>' not in html
+    assert '&lt;script&gt;' in html
+    assert 'href="javascript' not in html
+
+
+def test_tables_and_strikethrough_are_rendered():
+    html = render_report("| a | b |\n|---|---|\n| 1 | 2 |\n\n~~旧闻~~")
+    assert '<table>' in html and '<s>旧闻</s>' in html
+
+
+def test_completed_report_is_rendered_once_and_revalidated_with_304(db):
+    report_id = _completed_report(db)
+    status, content_etag = db.get_report_etag(report_id)
+    assert status == 'completed' and content_etag == html_etag(render_report(REPORT))
+
+    response = get(f'/report/{report_id}')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert not weak and etag.startswith(content_etag)
+    assert response.headers['Cache-Control'] == f'public, max-age={web.REPORT_MAX_AGE}'
+    body = response.get_data(as_text=True)
+    assert '<strong>重要</strong>' in body and "<script>alert('x')</script>" not in body
+
+    revalidated = get(f'/report/{report_id}', **{'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304 and revalidated.get_data() == b''
+    assert revalidated.get_etag() == (etag, False)
+
+
+def test_compressed_variant_has_its_own_etag(db):
+    report_id = _completed_report(db)
+    identity = get(f'/report/{report_id}')
+    etag = identity.get_etag()[0]
+
+    compressed = get(f'/report/{report_id}', **{'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.get_etag() == (f'{etag}-gzip', False)
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == identity.get_data()
+
+    revalidated = get(f'/report/{report_id}', **{'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}-gzip"'})
+    assert revalidated.status_code == 304
+    assert revalidated.get_etag() == (f'{etag}-gzip', False)
+
+
+def test_unfinished_report_is_not_cached(db):
+    db.add_subscription('Test', 'prompt', '08:00', [])
+    with db.connection() as conn:
+        subscription_id = conn.execute("SELECT id FROM subscriptions").fetchone()['id']
+    report_id, _ = db.enqueue_report_job(subscription_id, 'prompt', [])
+
+    response = get(f'/report/{report_id}')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert response.get_etag() == (None, None)
+
+
+def test_report_without_stored_html_is_rendered_on_first_view(db):
+    report_id = _completed_report(db)
+    expected = get(f'/report/{report_id}').get_data()
+    with db.transaction() as conn: # As saved before reports were rendered on completion
+        conn.execute('UPDATE reports SET content_html = NULL, content_etag = NULL WHERE id = ?', (report_id,))
+    web.page_cache = ResponseCache(50)
+
+    response = get(f'/report/{report_id}')
+    assert response.status_code == 200 and response.get_data() == expected
+    assert db.get_report_by_id(report_id)['content_html'] == render_report(REPORT)
+    assert db.get_report_etag(report_id)[1] == html_etag(render_report(REPORT))
+
+
+def test_archived_report_is_rendered_on_first_view_without_storing_html(db):
+    report_id = _completed_report(db)
+    etag = get(f'/report/{report_id}').get_etag()[0]
+    with db.transaction() as conn:
+        conn.execute("UPDATE reports SET created_at = '2000-01-01 00:00:00' WHERE id = ?", (report_id,))
+    assert db.archive_old_reports(retention_days=30) == 1
+    web.page_cache = ResponseCache(50)
+
+    # The ETag survives archiving, so a browser that has the page still gets a 304
+    assert get(f'/report/{report_id}', **{'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    response = get(f'/report/{report_id}')
+    assert response.status_code == 200 and response.get_etag() == (etag, False)
+    assert '<strong>重要</strong>' in response.get_data(as_text=True)
+    report = db.get_report_by_id(report_id)
+    assert report['archived'] and report['content_html'] is None
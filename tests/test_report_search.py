@@ -0,0 +1,124 @@
+import zlib
+
+import pytest
+
+from database import search_terms
+
+
+def test_search_terms_splits_chinese_into_bigrams_and_keeps_latin_words():
+    assert search_terms('芯片产业 AI') == '芯片 片产 产业 ai'
+    assert search_terms('OpenAI发布GPT-5') == 'openai 发布 gpt 5'
+    assert search_terms('中') == '中'
+    assert search_terms('') == ''
+    assert search_terms(None) == ''
+
+
+@pytest.fixture
+def subscription(fresh_db):
+    db = fresh_db
+    db.add_subscription('Test', 'prompt', '08:00', [])
+    with db.connection() as conn:
+        return conn.execute("SELECT id FROM subscriptions WHERE name = 'Test'").fetchone()['id']
+
+
+def _report(db, subscription_id, content, created_at=None):
+    with db.transaction() as conn:
+        cursor = conn.execute("INSERT INTO reports (subscription_id, status, content) VALUES (?, 'completed', ?)",
+                              (subscription_id, content))
+        if created_at:
+            conn.execute('UPDATE reports SET created_at = ? WHERE id = ?', (created_at, cursor.lastrowid))
+        return cursor.lastrowid
+
+
+def _found(db, query, **kwargs):
+    return [result['id'] for result in db.search_reports(query, **kwargs)[0]]
+
+
+def test_search_matches_chinese_words_prefixes_and_all_terms(fresh_db, subscription):
+    db = fresh_db
+    chips = _report(db, subscription, '今日要闻：国产芯片产业加速，OpenAI 发布新模型。')
+    cars = _report(db, subscription, '新能源汽车销量创新高。')
+
+    assert _found(db, '芯片') == [chips]
+    assert _found(db, '芯片产业') == [chips]
+    assert _found(db, 'open') == [chips] # Prefix of the last term
+    assert _found(db, '芯片 汽车') == []  # Every word must match
+    assert _found(db, '汽车') == [cars]
+    assert _found(db, '片汽') == []
+    result = db.search_reports('芯片')[0][0]
+    assert '芯片' in result['snippet'] and result['name'] == 'Test'
+
+
+def test_index_follows_content_updates_and_deletes(fresh_db, subscription):
+    db = fresh_db
+    report_id = _report(db, subscription, '芯片产业加速')
+    with db.transaction() as conn:
+        conn.execute("UPDATE reports SET content = '汽车销量创新高' WHERE id = ?", (report_id,))
+    assert _found(db, '芯片') == []
+    assert _found(db, '汽车') == [report_id]
+
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM reports WHERE id = ?', (report_id,))
+    assert _found(db, '汽车') == []
+
+
+def test_archived_report_stays_viewable_and_searchable(fresh_db, subscription):
+    db = fresh_db
+    content = '芯片产业加速。' * 50
+    old = _report(db, subscription, content, created_at='2000-01-01 00:00:00')
+    recent = _report(db, subscription, '芯片价格回落')
+
+    assert db.archive_old_reports(retention_days=30) == 1
+    with db.connection() as conn:
+        row = conn.execute('SELECT content FROM reports WHERE id = ?', (old,)).fetchone()
+        archived = conn.execute('SELECT content FROM report_archive WHERE report_id = ?', (old,)).fetchone()
+    assert row['content'] is None
+    assert len(archived['content']) < len(content.encode('utf-8'))
+    assert zlib.decompress(archived['content']).decode('utf-8') == content
+
+    report = db.get_report_by_id(old)
+    assert report['archived'] and report['content'] == content
+    assert not db.get_report_by_id(recent)['archived']
+    assert _found(db, '芯片') == [recent, old]
+    assert '芯片产业' in db.search_reports('产业')[0][0]['snippet']
+    assert db.archive_old_reports(retention_days=30) == 0
+
+
+def test_deleted_archived_report_is_no_longer_found(fresh_db, subscription):
+    db = fresh_db
+    old = _report(db, subscription, '芯片产业加速', created_at='2000-01-01 00:00:00')
+    db.archive_old_reports(retention_days=30)
+    assert _found(db, '芯片') == [old]
+
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM report_archive WHERE report_id = ?', (old,))
+        conn.execute('DELETE FROM reports WHERE id = ?', (old,))
+    assert _found(db, '芯片') == []
+
+
+def test_keyset_pagination_walks_the_history_newest_first(fresh_db, subscription):
+    db = fresh_db
+    ids = [_report(db, subscription, f'第 {i} 期 芯片新闻') for i in range(5)]
+
+    pages, before = [], None
+    while True:
+        reports, before = db.get_report_history(subscription, before, limit=2)
+        pages.append([report['id'] for report in reports])
+        if before is None:
+            break
+    assert pages == [ids[4:2:-1], ids[2:0:-1], ids[:1]]
+
+    results, before = db.search_reports('芯片', subscription, None, limit=3)
+    assert [result['id'] for result in results] == ids[4:1:-1]
+    results, before = db.search_reports('芯片', subscription, before, limit=3)
+    assert [result['id'] for result in results] == ids[1::-1] and before is None
+
+
+def test_report_history_index_replaces_the_created_at_index(fresh_db):
+    db = fresh_db
+    with db.connection() as conn:
+        indexes = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = ' '.join(row['detail'] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM reports WHERE subscription_id = 1 AND id < 10 ORDER BY id DESC LIMIT 3'))
+    assert 'idx_reports_subscription_created' not in indexes
+    assert 'idx_reports_subscription_id' in plan
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import database as db
+
+
+def _subscription(next_run_at, name='Daily'):
+    db.add_subscription(name, 'prompt', '08:00', [])
+    with db.transaction() as conn:
+        subscription_id = conn.execute('SELECT id FROM subscriptions WHERE name = ?', (name,)).fetchone()['id']
+        conn.execute('UPDATE subscriptions SET next_run_at = ? WHERE id = ?', (next_run_at, subscription_id))
+    return subscription_id
+
+
+def _next_run_at(subscription_id):
+    with db.connection() as conn:
+        return conn.execute('SELECT next_run_at FROM subscriptions WHERE id = ?', (subscription_id,)).fetchone()[0]
+
+
+def _scheduled_reports(subscription_id):
+    with db.connection() as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT scheduled_for FROM reports WHERE subscription_id = ? ORDER BY id', (subscription_id,))]
+
+
+def test_next_occurrence_is_strictly_after():
+    assert db.next_occurrence('08:00', datetime(2024, 5, 1, 7, 59, 59)) == '2024-05-01 08:00:00'
+    assert db.next_occurrence('08:00', datetime(2024, 5, 1, 8, 0)) == '2024-05-02 08:00:00'
+    assert db.next_occurrence('08:00', datetime(2024, 5, 1, 8, 0, 0, 1)) == '2024-05-02 08:00:00'
+    assert db.next_occurrence('23:30', datetime(2024, 12, 31, 23, 45)) == '2025-01-01 23:30:00'
+    assert db.next_occurrence('00:05', datetime(2024, 2, 28, 12, 0)) == '2024-02-29 00:05:00'
+
+
+def test_run_within_grace_window_keeps_its_slot(fresh_db):
+    subscription_id = _subscription('2024-05-01 08:00:00')
+    # Exactly grace_seconds late still counts as on time, whatever the missed-run policy
+    enqueued = db.enqueue_due_subscriptions(datetime(2024, 5, 1, 8, 5), 'skip', grace_seconds=300)
+    assert [name for _, name, _ in enqueued] == ['Daily']
+    assert _scheduled_reports(subscription_id) == ['2024-05-01 08:00:00']
+    assert _next_run_at(subscription_id) == '2024-05-02 08:00:00'
+
+
+def test_subscription_not_yet_due_is_left_alone(fresh_db):
+    subscription_id = _subscription('2024-05-01 08:00:00')
+    assert db.enqueue_due_subscriptions(datetime(2024, 5, 1, 7, 59, 59)) == []
+    assert _next_run_at(subscription_id) == '2024-05-01 08:00:00'
+
+
+def test_missed_runs_are_caught_up_once_for_the_latest_slot(fresh_db):
+    # Down for three days, back before today's run time: one catch-up for yesterday's run
+    subscription_id = _subscription('2024-04-28 08:00:00')
+    enqueued = db.enqueue_due_subscriptions(datetime(2024, 5, 1, 7, 0), 'once', grace_seconds=300)
+    assert len(enqueued) == 1
+    assert _scheduled_reports(subscription_id) == ['2024-04-30 08:00:00']
+    assert _next_run_at(subscription_id) == '2024-05-01 08:00:00'
+
+    # Back after today's run time: the catch-up is today's run
+    other = _subscription('2024-04-28 08:00:00', name='Other')
+    db.enqueue_due_subscriptions(datetime(2024, 5, 1, 9, 0), 'once', grace_seconds=300)
+    assert _scheduled_reports(other) == ['2024-05-01 08:00:00']
+    assert _next_run_at(other) == '2024-05-02 08:00:00'
+
+
+def test_missed_run_is_skipped_past_the_grace_window(fresh_db):
+    subscription_id = _subscription('2024-05-01 08:00:00')
+    assert db.enqueue_due_subscriptions(datetime(2024, 5, 1, 8, 5, 1), 'skip', grace_seconds=300) == []
+    assert _scheduled_reports(subscription_id) == []
+    assert _next_run_at(subscription_id) == '2024-05-02 08:00:00'
+
+
+def test_repeat_enqueue_of_the_same_run_is_a_no_op(fresh_db):
+    subscription_id = _subscription('2024-05-01 08:00:00')
+    now = datetime(2024, 5, 1, 8, 0, 30)
+    assert len(db.enqueue_due_subscriptions(now)) == 1
+    job = db.claim_job('worker-1', lease_seconds=60)
+    db.complete_job(job['id'], 'worker-1', 'report')
+
+    # A scheduler working from a stale next_run_at fires the same run again
+    with db.transaction() as conn:
+        conn.execute('UPDATE subscriptions SET next_run_at = ? WHERE id = ?', ('2024-05-01 08:00:00', subscription_id))
+    assert db.enqueue_due_subscriptions(now) == []
+    assert _scheduled_reports(subscription_id) == ['2024-05-01 08:00:00']
+    assert _next_run_at(subscription_id) == '2024-05-02 08:00:00'
+    # Manual runs have no scheduled_for and are never deduplicated this way
+    assert db.enqueue_report_job(subscription_id, 'prompt', [])[1] == 'queued'
+    assert _scheduled_reports(subscription_id) == ['2024-05-01 08:00:00', None]
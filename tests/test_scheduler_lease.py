@@ -0,0 +1,74 @@
+import pytest
+
+import database as db
+import report_scheduler
+from report_scheduler import LEASE_NAME, ReportScheduler
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(fresh_db, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db.time, 'time', clock.time)
+    return clock
+
+
+def _job_ids(scheduler):
+    return {job.id for job in scheduler.scheduler.get_jobs()}
+
+
+def test_lease_is_exclusive_until_it_expires(clock):
+    assert db.acquire_lease(LEASE_NAME, 'a', lease_seconds=30)
+    assert not db.acquire_lease(LEASE_NAME, 'b', lease_seconds=30)
+    clock.now += 20
+    assert db.acquire_lease(LEASE_NAME, 'a', lease_seconds=30) # Renewal moves the expiry
+    clock.now += 20
+    assert not db.acquire_lease(LEASE_NAME, 'b', lease_seconds=30)
+    clock.now += 11
+    assert db.acquire_lease(LEASE_NAME, 'b', lease_seconds=30)
+    assert not db.acquire_lease(LEASE_NAME, 'a', lease_seconds=30)
+
+
+def test_released_lease_is_taken_over_at_once(clock):
+    assert db.acquire_lease(LEASE_NAME, 'a', lease_seconds=30)
+    db.release_lease(LEASE_NAME, 'b') # Not the holder: no effect
+    assert not db.acquire_lease(LEASE_NAME, 'b', lease_seconds=30)
+    db.release_lease(LEASE_NAME, 'a')
+    assert db.acquire_lease(LEASE_NAME, 'b', lease_seconds=30)
+
+
+def test_standby_scheduler_takes_over_after_lease_seconds(clock, monkeypatch):
+    monkeypatch.setitem(report_scheduler.config, 'scheduler_max_sleep_seconds', 300)
+    leader = ReportScheduler(lease_seconds=30)
+    standby = ReportScheduler(lease_seconds=30)
+
+    leader._keep_lease()
+    standby._keep_lease()
+    assert leader.is_leader and not standby.is_leader
+    assert _job_ids(leader) == {'daily_news_job', 'archive_reports'}
+    assert _job_ids(standby) == set()
+
+    # The leader stalls and stops renewing; the standby waits for the lease to run out
+    clock.now += 29
+    standby._keep_lease()
+    assert not standby.is_leader
+    clock.now += 2
+    standby._keep_lease()
+    assert standby.is_leader
+    assert _job_ids(standby) == {'daily_news_job', 'archive_reports'}
+
+    # The old leader notices on its next renewal and stops scheduling
+    leader._keep_lease()
+    assert not leader.is_leader
+    assert _job_ids(leader) == set()
+    # A stale leader that wakes up to schedule re-checks the lease first and enqueues nothing
+    leader.is_leader = True
+    leader.schedule_daily_tasks()
+    assert not leader.is_leader
@@ -0,0 +1,89 @@
+import database as db
+from news_agent_client import SeenArticles
+
+
+def _links(*urls):
+    return [{'url': url, 'title': url} for url in urls]
+
+
+def _complete(subscription_id, content, seen, max_age=None):
+    report_id, _ = db.enqueue_report_job(subscription_id, 'prompt', [])
+    job = db.claim_job('worker-1', lease_seconds=60)
+    assert db.complete_job(job['id'], 'worker-1', content, seen.entries(content), max_age, seen.nothing_new)
+    return report_id
+
+
+def _subscription():
+    db.add_subscription('Test', 'prompt', '08:00', [])
+    with db.connection() as conn:
+        return conn.execute("SELECT id FROM subscriptions WHERE name = 'Test'").fetchone()['id']
+
+
+def test_filter_drops_known_links_and_refreshes_them():
+    known_key = SeenArticles.url_key('https://example.com/old')
+    seen = SeenArticles({known_key: 'hash'})
+
+    new = seen.filter(_links('https://example.com/old', 'https://example.com/new'))
+
+    assert [link['url'] for link in new] == ['https://example.com/new']
+    # The old link is still on the source page, so its row is refreshed without touching the content hash
+    assert seen.entries() == [(known_key, None)]
+
+
+def test_filter_matches_normalized_urls():
+    seen = SeenArticles({SeenArticles.url_key('https://example.com/a?utm_source=x'): None})
+    assert seen.filter(_links('https://example.com/a')) == []
+
+
+def test_offered_links_are_only_recorded_when_read_or_cited():
+    seen = SeenArticles()
+    seen.offer(_links('https://example.com/read', 'https://example.com/cited', 'https://example.com/unused'))
+    seen.read('https://example.com/read', 'body')
+
+    entries = dict(seen.entries('见 [报道](https://example.com/cited)'))
+
+    assert entries == {
+        SeenArticles.url_key('https://example.com/read'): SeenArticles.content_hash('body'),
+        SeenArticles.url_key('https://example.com/cited'): None,
+    }
+    assert dict(seen.entries()) == {SeenArticles.url_key('https://example.com/read'): SeenArticles.content_hash('body')}
+
+
+def test_completed_report_records_entries_and_prunes_old_rows(fresh_db, monkeypatch):
+    subscription_id = _subscription()
+    now = [1_000_000.0]
+    monkeypatch.setattr(db.time, 'time', lambda: now[0])
+
+    first = SeenArticles()
+    first.read('https://example.com/a', 'a')
+    first.read('https://example.com/b', 'b')
+    _complete(subscription_id, 'report', first, max_age=100)
+
+    now[0] += 60
+    second = SeenArticles(db.get_seen_articles(subscription_id, 100))
+    assert second.filter(_links('https://example.com/a')) == []
+    _complete(subscription_id, 'report', second, max_age=100)
+
+    # The next report prunes b, last seen 120s ago; a was refreshed by the second report
+    now[0] += 60
+    third = SeenArticles(db.get_seen_articles(subscription_id, 100))
+    assert third.filter(_links('https://example.com/a', 'https://example.com/b')) == _links('https://example.com/b')
+    _complete(subscription_id, 'report', third, max_age=100)
+    with db.connection() as conn:
+        rows = conn.execute('SELECT url_key FROM seen_articles WHERE subscription_id = ?', (subscription_id,)).fetchall()
+    assert [row['url_key'] for row in rows] == [SeenArticles.url_key('https://example.com/a')]
+
+    now[0] += 150
+    assert db.get_seen_articles(subscription_id, 100) == {}
+
+
+def test_report_without_new_news_is_flagged(fresh_db):
+    subscription_id = _subscription()
+    seen = SeenArticles()
+    seen.nothing_new = True
+    report_id = _complete(subscription_id, '没有新的新闻', seen)
+
+    report = db.get_report_by_id(report_id)
+    assert report['status'] == 'completed' and report['no_new_news'] == 1
+    history, _ = db.get_report_history(subscription_id)
+    assert history[0]['no_new_news'] == 1
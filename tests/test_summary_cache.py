@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import summary_cache
+from summary_cache import SummaryCache
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(summary_cache.time, 'time', clock.time)
+    return clock
+
+
+def _cache(tmp_path, ttl_seconds=3600, max_entries=100):
+    return SummaryCache(str(tmp_path / 'summary_cache.db'), ttl_seconds, max_entries)
+
+
+def _digest(cache, text, summarize=None):
+    calls = []
+
+    async def default_summarize(body):
+        calls.append(body)
+        return f"digest of {body}"
+
+    result = asyncio.run(cache.get_or_create('https://example.com/a', text, summarize or default_summarize))
+    return result, calls
+
+
+def test_miss_then_hit_across_urls(tmp_path, clock):
+    cache = _cache(tmp_path)
+    (summary, result), calls = _digest(cache, 'article body')
+    assert (summary, result, calls) == ('digest of article body', 'miss', ['article body'])
+
+    # Same text reached through another URL, from a fresh process
+    cache = _cache(tmp_path)
+    (summary, result), calls = _digest(cache, 'article body')
+    assert (summary, result, calls) == ('digest of article body', 'hit', [])
+    assert cache.stats == {"hits": 1, "misses": 0, "shared": 0}
+
+
+def test_empty_digest_is_not_cached(tmp_path, clock):
+    cache = _cache(tmp_path)
+
+    async def fail(body):
+        return ''
+
+    assert _digest(cache, 'article body', fail)[0] == ('', 'miss')
+    assert cache.get(cache.content_hash('article body')) is None
+
+
+def test_digest_expires_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_seconds=60)
+    _digest(cache, 'article body')
+    clock.now += 59
+    assert _digest(cache, 'article body')[0][1] == 'hit'
+    clock.now += 2
+    (summary, result), calls = _digest(cache, 'article body')
+    assert result == 'miss' and calls == ['article body']
+
+
+def test_least_recently_used_digests_are_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=3)
+    keys = [cache.content_hash(f'article {i}') for i in range(100)]
+    for i, key in enumerate(keys[:99]):
+        clock.now += 1
+        cache.put(key, f'https://example.com/{i}', f'digest {i}')
+    clock.now += 1
+    assert cache.get(keys[0]) == 'digest 0' # Oldest entry, but just used
+
+    clock.now += 1
+    cache.put(keys[99], 'https://example.com/99', 'digest 99') # The 100th put prunes to max_entries
+    kept = [i for i, key in enumerate(keys) if cache.get(key) is not None]
+    assert kept == [0, 98, 99]
+
+
+def test_concurrent_misses_share_one_summary(tmp_path, clock):
+    cache = _cache(tmp_path)
+    calls = []
+
+    async def summarize(body):
+        calls.append(body)
+        await asyncio.sleep(0.05)
+        return f"digest of {body}"
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_create('https://example.com/a', 'article body', summarize),
+            cache.get_or_create('https://example.com/b', 'article body', summarize),
+        )
+
+    results = asyncio.run(scenario())
+    assert sorted(result for _, result in results) == ['miss', 'shared']
+    assert {summary for summary, _ in results} == {'digest of article body'}
+    assert calls == ['article body']
+    assert cache.stats == {"hits": 0, "misses": 1, "shared": 1}
+
+
+def test_failed_summary_is_raised_to_every_waiter_and_not_cached(tmp_path, clock):
+    cache = _cache(tmp_path)
+
+    async def summarize(body):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("model unavailable")
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_create('https://example.com/a', 'article body', summarize),
+            cache.get_or_create('https://example.com/b', 'article body', summarize),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+    assert cache.get(cache.content_hash('article body')) is None
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+from tab_pool import TabPool
+
+
+class FakeTab:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+        self.states = self
+
+    @property
+    def is_alive(self):
+        return self.alive and not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.tabs = []
+
+    def new_tab(self):
+        tab = FakeTab(len(self.tabs) + 1)
+        self.tabs.append(tab)
+        return tab
+
+
+def test_waiter_gets_new_tab_after_failed_tab_is_discarded():
+    async def scenario():
+        browser = FakeBrowser()
+        pool = TabPool(browser, size=1, max_uses=100)
+        first = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        await pool.release(first, healthy=False)
+        second = await asyncio.wait_for(waiter, timeout=1)
+        assert first.closed
+        assert second is not first and second.is_alive
+        assert pool._created == 1
+        await pool.release(second)
+
+    asyncio.run(scenario())
+
+
+def test_failing_scrape_does_not_stall_queued_callers():
+    async def scenario():
+        pool = TabPool(FakeBrowser(), size=1, max_uses=100)
+
+        def scrape(tab, fail):
+            time.sleep(0.01)
+            if fail:
+                raise RuntimeError("page crashed")
+            return tab.number
+
+        results = await asyncio.wait_for(
+            asyncio.gather(pool.run(scrape, True), pool.run(scrape, False), pool.run(scrape, False),
+                           return_exceptions=True), timeout=1)
+        assert isinstance(results[0], RuntimeError)
+        assert results[1:] == [2, 2]
+
+    asyncio.run(scenario())
+
+
+def test_tab_of_a_cancelled_scrape_is_discarded_once_its_thread_ends():
+    async def scenario():
+        browser = FakeBrowser()
+        pool = TabPool(browser, size=1, max_uses=100)
+        unblock = threading.Event()
+
+        def scrape(tab):
+            unblock.wait(timeout=5)
+            return tab.number
+
+        try:
+            await asyncio.wait_for(pool.run(scrape), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("the scrape should have timed out")
+
+        # The thread still drives the tab: it is neither closed nor lent to the next caller
+        waiter = asyncio.create_task(pool.run(lambda tab: tab.number))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        assert not browser.tabs[0].closed
+
+        unblock.set()
+        assert await asyncio.wait_for(waiter, timeout=1) == 2
+        assert browser.tabs[0].closed
+        assert pool._created == 1 and not pool._orphans
+
+    asyncio.run(scenario())
+
+
+def test_dead_idle_tab_is_replaced_and_failed_new_tab_frees_its_slot():
+    async def scenario():
+        browser = FakeBrowser()
+        pool = TabPool(browser, size=1, max_uses=100)
+        tab = await pool.acquire()
+        await pool.release(tab)
+        tab.alive = False
+
+        replacement = await pool.acquire()
+        assert replacement is not tab and tab.closed
+        await pool.release(replacement, healthy=False)
+
+        browser.new_tab = lambda: (_ for _ in ()).throw(RuntimeError("browser gone"))
+        for _ in range(2):
+            try:
+                await pool.acquire()
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("acquire should fail while the browser is gone")
+        assert pool._created == 0
+
+    asyncio.run(scenario())
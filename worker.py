@@ -0,0 +1,273 @@
+"""
+Worker role: runs the agent for queued report jobs. Any number of worker processes, on one or several
+machines, can share the database; each claims jobs from the `jobs` table with a lease (see database.py).
+
+    python worker.py
+
+app.py runs a worker pool in the web process as well, unless started with --roles.
+"""
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import database as db
+import metrics
+from news_agent_client import SeenArticles, link_harvester, mcprun
+from settings import config
+
+# --- Metrics ---
+JOB_SECONDS = metrics.REGISTRY.histogram('news_job_seconds', 'Duration of report attempts, by outcome.', ('outcome',))
+WORKERS = metrics.REGISTRY.gauge('news_workers', 'Agent workers in this process.')
+WORKERS_BUSY = metrics.REGISTRY.gauge('news_workers_busy', 'Agent workers currently running a report.')
+WORKER_BUSY_SECONDS = metrics.REGISTRY.counter(
+    'news_worker_busy_seconds_total', 'Time workers spent running reports; divide its rate by news_workers for utilization.')
+
+# --- Live report progress ---
+class ReportProgress:
+    """
+    Collects the live progress of one report attempt (current stage and the model output streamed
+    so far) and writes it to the reports table at most once per `interval` seconds, so streaming
+    token by token costs a few small UPDATEs per report instead of one per token.
+    Passed to mcprun as its `progress` argument; must be used on the worker pool's event loop.
+    """
+
+    def __init__(self, job_id, worker_id, interval):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stage = None
+        self._text = []
+        self._dirty = False
+        self._flushed_at = 0.0
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    def stage(self, message):
+        self._stage = message
+        self._mark_dirty()
+
+    def start_text(self):
+        self._text = []
+        self._mark_dirty()
+
+    def append_text(self, delta):
+        if delta:
+            self._text.append(delta)
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._flush_task is None:
+            loop = asyncio.get_running_loop()
+            delay = max(0.0, self._flushed_at + self.interval - loop.time())
+            self._flush_task = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        # The lock keeps writes in order if one UPDATE takes longer than the interval
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._flushed_at = asyncio.get_running_loop().time()
+            partial = ''.join(self._text)
+            self._text = [partial] if partial else []
+            try:
+                with metrics.span('db_write', op='report_progress'):
+                    await asyncio.to_thread(db.update_report_progress, self.job_id, self.worker_id,
+                                            self._stage, partial or None)
+            except Exception as e:
+                print(f"Failed to store progress for job {self.job_id}: {e}")
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+# --- Background Worker Pool ---
+class AgentWorkerPool:
+    """
+    Runs up to `concurrency` agent tasks at the same time on a single long-lived event loop.
+    Tasks live in the `jobs` table (see database.py), so a backlog survives restarts and
+    several processes can share the same database file. The loop lives in its own daemon
+    thread, so Flask request threads and the scheduler never wait for an agent run to finish
+    when they run in the same process.
+    """
+
+    def __init__(self, concurrency, job_timeout, lease_seconds, retry_base_seconds, poll_interval):
+        self.concurrency = max(1, int(concurrency))
+        self.job_timeout = job_timeout
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_interval = poll_interval
+        # Unique per process, so leases taken by a previous (crashed) run are never mistaken for ours
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.loop = asyncio.new_event_loop()
+        self._wakeup = None # asyncio.Event, created on the pool's own loop
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name='agent-worker-pool', daemon=True)
+        WORKERS.set(self.concurrency)
+
+    def start(self):
+        """Requeues orphaned jobs, then starts the event loop thread and waits until it is running."""
+        recovered = db.recover_orphaned_jobs(config['job_max_attempts'])
+        if recovered:
+            print(f"Recovered {recovered} orphaned report job(s).")
+        self._thread.start()
+        self._ready.wait()
+
+    def notify(self):
+        """Thread-safe: wakes idle workers after a job has been enqueued, instead of waiting for the next poll."""
+        self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def prefetch_links(self, sources):
+        """Thread-safe: starts harvesting the links of `sources` on the pool's loop, where the agents will reuse them."""
+        asyncio.run_coroutine_threadsafe(link_harvester.harvest(sources), self.loop)
+
+    def jobs_enqueued(self, enqueued):
+        """
+        Thread-safe: called by a scheduler in the same process with the (report_id, name, news_urls)
+        it just enqueued. Harvests their sources once, ahead of the agents, and wakes idle workers.
+        """
+        if config['link_harvest_enabled']:
+            # Harvest every distinct source of this batch once, before the workers get to the reports
+            self.prefetch_links([source for _, _, news_urls in enqueued for source in news_urls])
+        self.notify()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._wakeup = asyncio.Event()
+        for i in range(self.concurrency):
+            self.loop.create_task(self._worker(i))
+        print(f"Agent worker pool {self.worker_id} started with {self.concurrency} workers.")
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _worker(self, worker_no):
+        while True:
+            try:
+                # Database calls are blocking, keep them off the event loop
+                job = await asyncio.to_thread(db.claim_job, self.worker_id, self.lease_seconds)
+            except sqlite3.OperationalError as e:
+                print(f"Worker {worker_no} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                # Nothing to do: sleep until notified or until the next poll
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            print(f"Worker {worker_no} picked up task for report ID: {job['report_id']} (attempt {job['attempts']})")
+            await self._run_job(job)
+
+    async def _keep_lease(self, job_id):
+        """Renews the job lease while the agent is running, so other workers don't take it over."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(db.renew_job_lease, job_id, self.worker_id, self.lease_seconds):
+                print(f"Lost lease on job {job_id}.")
+                return
+
+    async def _run_job(self, job):
+        report_id = job['report_id']
+        prompt = job['payload']['prompt']
+        news_urls = job['payload']['news_urls']
+        # Every stage of this attempt (here, in mcprun and in the MCP calls) is recorded as a span
+        # and saved with the report when the attempt ends
+        spans = metrics.SpanRecorder()
+        spans_token = metrics.current_spans.set(spans)
+        started, started_at = time.perf_counter(), time.time()
+        metrics.record_span('queue_wait', job['available_at'], max(0.0, started_at - job['available_at']))
+        WORKERS_BUSY.inc()
+        outcome = 'failed'
+        lease_keeper = asyncio.create_task(self._keep_lease(job['id']))
+        # Stage and streamed output are written to the report as they arrive, for the report page's live view
+        progress = ReportProgress(job['id'], self.worker_id, config['report_progress_interval_seconds'])
+        seen_max_age = config['seen_articles_max_age_days'] * 86400
+        try:
+            # Incremental mode: only news the subscription's earlier reports haven't covered goes to the agent
+            seen = None
+            if config['incremental_reports_enabled'] and job.get('subscription_id') is not None:
+                with metrics.span('db_read', op='get_seen_articles') as attrs:
+                    seen = SeenArticles(await asyncio.to_thread(db.get_seen_articles, job['subscription_id'], seen_max_age))
+                    attrs['entries'] = len(seen.known)
+
+            # Run the agent, cancelling it if it takes longer than the configured timeout
+            response = await asyncio.wait_for(mcprun(prompt, news_urls, progress, seen), timeout=self.job_timeout)
+
+            # Update status to 'completed' with the generated content; the news it covered are now seen
+            with metrics.span('db_write', op='complete_job'):
+                await asyncio.to_thread(db.complete_job, job['id'], self.worker_id, response,
+                                        seen.entries(response) if seen is not None else None, seen_max_age,
+                                        seen is not None and seen.nothing_new)
+            outcome = 'completed'
+            print(f"Task for report ID: {report_id} completed successfully.")
+
+        except Exception as e:
+            # A timeout or agent error: retry with backoff, or mark the report 'failed' after the last attempt
+            if isinstance(e, asyncio.TimeoutError):
+                error_message = f"Agent execution timed out after {self.job_timeout}s for report ID {report_id}"
+            else:
+                error_message = f"Agent execution failed for report ID {report_id}: {str(e)}"
+            print(error_message)
+            if isinstance(e, asyncio.TimeoutError):
+                outcome = 'timeout'
+            with metrics.span('db_write', op='fail_job'):
+                will_retry = await asyncio.to_thread(db.fail_job, job['id'], self.worker_id, error_message,
+                                                     self.retry_base_seconds)
+            if will_retry:
+                print(f"Report ID {report_id} will be retried.")
+        finally:
+            progress.close()
+            lease_keeper.cancel()
+            elapsed = time.perf_counter() - started
+            metrics.record_span('job', started_at, elapsed, outcome=outcome)
+            JOB_SECONDS.observe(elapsed, outcome=outcome)
+            WORKER_BUSY_SECONDS.inc(elapsed)
+            WORKERS_BUSY.dec()
+            metrics.current_spans.reset(spans_token)
+            try:
+                await asyncio.to_thread(db.save_report_spans, report_id, job['attempts'], spans.spans)
+            except Exception as e:
+                print(f"Failed to save spans for report ID {report_id}: {e}")
+
+
+def create_worker_pool():
+    """An AgentWorkerPool configured from settings; call start() to run it."""
+    return AgentWorkerPool(
+        config['worker_concurrency'],
+        config['job_timeout_seconds'],
+        config['job_lease_seconds'],
+        config['job_retry_base_seconds'],
+        config['job_poll_interval_seconds'],
+    )
+
+
+def main():
+    db.init_db()
+    worker_pool = create_worker_pool()
+    worker_pool.start()
+    if config['worker_metrics_port']:
+        metrics.serve(config['worker_metrics_port'])
+    try:
+        # The pool runs on a daemon thread; keep the main thread alive until the process is stopped
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()